@@ -0,0 +1,469 @@
+'''
+Serialization and parsing benchmarks using synthetic catalogs
+
+Generates CKAN dataset dicts and DCAT graphs of different sizes and times the
+main operations of the extension, recording the peak memory used by each one.
+It does not require a running CKAN instance (only the ckan package needs to be
+importable).
+
+Results are written as JSON so they can be stored and compared between
+releases, eg:
+
+    python ckanext/dcat/benchmark.py --sizes 100 1000 -o results.json
+
+'''
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import datetime
+import platform
+import resource
+import multiprocessing
+
+from pylons import config
+
+import rdflib
+from rdflib import URIRef, BNode
+from rdflib.namespace import RDF
+
+from ckanext.dcat import converters
+from ckanext.dcat import cache
+from ckanext.dcat.processors import RDFSerializer, RDFParser, DCAT
+from ckanext.dcat.stores import RDF_STORE_CONFIG, DEFAULT_STORE
+from ckanext.dcat.subgraph import dataset_subgraph
+from ckanext.dcat.writers import WRITE_ONLY_GRAPHS
+from ckanext.dcat.utils import url_to_rdflib_format
+
+
+DEFAULT_SIZES = [100, 1000, 10000, 100000]
+
+SERIALIZE_FORMATS = ['xml', 'ttl', 'n3', 'nt', 'jsonld']
+PARSE_FORMATS = ['xml', 'ttl', 'nt', 'jsonld']
+
+TASKS = ['serialize_catalog', 'serialize_catalog_write_only', 'parse',
+         'parse_examples', 'ckan_to_dcat', 'dcat_to_ckan']
+
+# Tasks run once for each of the RDF stores (see `ckanext.dcat.stores`)
+STORE_TASKS = ['parse', 'parse_examples']
+STORES = [DEFAULT_STORE, 'compact', 'sqlite']
+
+# Files of the `examples` directory used by the `parse_examples` task
+EXAMPLES = ['catalog.rdf', 'dataset.rdf', 'dataset_afs.ttl',
+            'dataset_deri.ttl', 'dataset_sweden.rdf']
+EXAMPLES_PATH = os.path.join(os.path.dirname(__file__), '..', '..',
+                             'examples')
+
+FORMATS = ['CSV', 'XLS', 'JSON', 'ZIP', 'PDF', 'WMS', 'Shapefile', 'HTML']
+THEMES = ['agriculture', 'economy', 'education', 'energy', 'environment',
+          'health', 'transport']
+LANGUAGES = ['en', 'es', 'fr', 'de', 'ca']
+
+SYNTHETIC_SITE_URL = 'http://catalog.example.com'
+SYNTHETIC_CATALOG_MODIFIED = '2016-01-01T00:00:00'
+
+
+def synthetic_dataset(index, rnd=None):
+    '''
+    Returns a CKAN dataset dict with realistic contents
+
+    It has between 1 and 10 resources, tags, the extras used by the
+    `euro_dcat_ap` profile (including a GeoJSON geometry) and organization
+    details. `rnd` is a `random.Random` instance, used to make the output
+    reproducible.
+    '''
+    rnd = rnd or random.Random(index)
+
+    dataset_id = 'dataset-{0:07d}'.format(index)
+    modified = datetime.datetime(2015, 1, 1) + \
+        datetime.timedelta(minutes=rnd.randint(0, 500000))
+
+    west = rnd.uniform(-180, 170)
+    south = rnd.uniform(-90, 80)
+    east = west + rnd.uniform(0.1, 10)
+    north = south + rnd.uniform(0.1, 10)
+    geometry = {
+        'type': 'Polygon',
+        'coordinates': [[[west, south], [east, south], [east, north],
+                         [west, north], [west, south]]],
+    }
+
+    extras = [
+        ('issued', '2014-06-01T10:00:00'),
+        ('modified', modified.isoformat()),
+        ('language', json.dumps(rnd.sample(LANGUAGES, 2))),
+        ('theme', json.dumps(['http://example.com/themes/{0}'.format(t)
+                              for t in rnd.sample(THEMES, 2)])),
+        ('frequency', 'http://purl.org/cld/freq/monthly'),
+        ('conforms_to', json.dumps(['Standard 1', 'Standard 2'])),
+        ('publisher_uri', 'http://example.com/publishers/{0}'.format(
+            index % 50)),
+        ('publisher_name', 'Publisher {0}'.format(index % 50)),
+        ('publisher_email', 'publisher{0}@example.com'.format(index % 50)),
+        ('contact_name', 'Contact {0}'.format(index)),
+        ('contact_email', 'contact{0}@example.com'.format(index)),
+        ('spatial', json.dumps(geometry)),
+        ('spatial_text', 'Region {0}'.format(index % 100)),
+        ('temporal_start', '2010-01-01'),
+        ('temporal_end', '2015-12-31'),
+        ('access_rights', 'public'),
+    ]
+
+    resources = []
+    for i in xrange(rnd.randint(1, 10)):
+        _format = rnd.choice(FORMATS)
+        resources.append({
+            'id': '{0}-resource-{1}'.format(dataset_id, i),
+            'package_id': dataset_id,
+            'name': 'Resource {0}'.format(i),
+            'description': 'Description of resource {0}. '.format(i) * 3,
+            'format': _format,
+            'url': 'http://example.com/data/{0}/{1}.{2}'.format(
+                dataset_id, i, _format.lower()),
+            'size': rnd.randint(1000, 100000000),
+            'created': '2014-06-01T10:00:00',
+            'last_modified': modified.isoformat(),
+            'rights': 'Some rights statement',
+            'license': 'http://example.com/license',
+        })
+
+    return {
+        'id': dataset_id,
+        'name': 'test-dataset-{0}'.format(index),
+        'title': 'Synthetic dataset {0}'.format(index),
+        'notes': u'Lorem ipsum dolor sit amet, consectetur adipiscing elit. '
+                 u'Sed non risus \xe0 \xf1 \u20ac. ' * 5,
+        'url': 'http://example.com/datasets/{0}'.format(index),
+        'version': '1.0',
+        'maintainer': 'Maintainer {0}'.format(index % 20),
+        'maintainer_email': 'maintainer{0}@example.com'.format(index % 20),
+        'metadata_created': '2014-06-01T10:00:00.000000',
+        'metadata_modified': modified.isoformat() + '.000000',
+        'tags': [{'name': 'tag-{0}'.format(rnd.randint(0, 500))}
+                 for i in xrange(rnd.randint(2, 8))],
+        'extras': [{'key': key, 'value': value} for key, value in extras],
+        'organization': {'title': 'Organization {0}'.format(index % 50)},
+        'resources': resources,
+    }
+
+
+def synthetic_datasets(size, seed=0):
+    '''
+    Returns a list of `size` synthetic CKAN dataset dicts
+    '''
+    rnd = random.Random(seed)
+    return [synthetic_dataset(i, rnd) for i in xrange(size)]
+
+
+def synthetic_graph(size, _format, seed=0):
+    '''
+    Returns a serialized DCAT catalog with `size` datasets, to be used as
+    parser input
+    '''
+    serializer = RDFSerializer()
+    serializer.fragment_cache = None
+    serializer.write_only_graph = False
+    return serializer.serialize_catalog({}, synthetic_datasets(size, seed),
+                                        _format=_format)
+
+
+def scaled_examples(size, _format):
+    '''
+    Returns a serialized graph with `size` datasets, taken in turns from the
+    files on the `examples` directory
+
+    Each copy of a dataset gets its own URIs (for all the subjects on its
+    graph) and blank nodes.
+    '''
+    datasets = []
+    for name in EXAMPLES:
+        g = rdflib.Graph()
+        g.parse(os.path.join(EXAMPLES_PATH, name),
+                format='turtle' if name.endswith('.ttl') else 'xml')
+        for dataset_ref in g.subjects(RDF.type, DCAT.Dataset):
+            subgraph = dataset_subgraph(g, dataset_ref)
+            datasets.append((list(subgraph), set(subgraph.subjects())))
+
+    out = rdflib.Graph()
+    for index in xrange(size):
+        triples, subjects = datasets[index % len(datasets)]
+        copies = {}
+
+        def copy(term):
+            if term not in subjects:
+                return term
+            if term not in copies:
+                copies[term] = (BNode() if isinstance(term, BNode) else
+                                URIRef(u'{0}/copy/{1}'.format(term, index)))
+            return copies[term]
+
+        for subject, predicate, _object in triples:
+            out.add((copy(subject), predicate, copy(_object)))
+
+    return out.serialize(format=url_to_rdflib_format(_format))
+
+
+def _synthetic_graph_process(size, _format):
+    setup_environment()
+    return synthetic_graph(size, _format)
+
+
+def _scaled_examples_process(size, _format):
+    setup_environment()
+    return scaled_examples(size, _format)
+
+
+def setup_environment():
+    '''
+    Provides the configuration needed to run the serializers outside CKAN
+
+    The catalog modification date, which would otherwise be queried from the
+    search index, gets a fixed value.
+    '''
+    config.setdefault('ckan.site_url', SYNTHETIC_SITE_URL)
+    config[cache.CATALOG_MODIFIED_TTL_CONFIG] = sys.maxint
+    cache._catalog_modified.get(lambda: SYNTHETIC_CATALOG_MODIFIED,
+                                sys.maxint)
+
+
+def _max_rss():
+    # Kilobytes on Linux, bytes on OS X
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _prepare(task, size, _format):
+    '''
+    Builds the input for a task, returning a function that runs it
+    '''
+    if task in ('serialize_catalog', 'serialize_catalog_write_only'):
+        datasets = synthetic_datasets(size)
+
+        def run():
+            serializer = RDFSerializer()
+            serializer.fragment_cache = None
+            serializer.write_only_graph = \
+                task == 'serialize_catalog_write_only'
+            serializer.serialize_catalog({}, datasets, _format=_format)
+
+    elif task in ('parse', 'parse_examples'):
+        # Generated on a separate process so building the graph does not
+        # count towards the peak memory of the parser
+        pool = multiprocessing.Pool(1)
+        try:
+            data = pool.apply(_synthetic_graph_process
+                              if task == 'parse'
+                              else _scaled_examples_process,
+                              (size, _format))
+        finally:
+            pool.terminate()
+
+        def run():
+            parser = RDFParser()
+            parser.parse(data, _format=_format)
+            for dataset in parser.datasets():
+                pass
+
+    elif task == 'ckan_to_dcat':
+        datasets = synthetic_datasets(size)
+
+        def run():
+            for dataset in datasets:
+                converters.ckan_to_dcat(dataset)
+
+    elif task == 'dcat_to_ckan':
+        dcat_datasets = [converters.ckan_to_dcat(dataset)
+                         for dataset in synthetic_datasets(size)]
+
+        def run():
+            for dcat_dataset in dcat_datasets:
+                converters.dcat_to_ckan(dcat_dataset)
+
+    else:
+        raise ValueError('Unknown task: {0}'.format(task))
+
+    return run
+
+
+def run_case(task, size, _format=None, repeat=1, store=None):
+    '''
+    Runs a single benchmark case in the current process
+
+    `store` is the RDF store used by the parsers and serializers (see
+    `ckanext.dcat.stores`), which defaults to the rdflib one.
+
+    Returns a dict with the best time of `repeat` runs, the datasets
+    processed per second and the peak memory (resident set size in
+    kilobytes), both the absolute value and the increase over the memory used
+    once the input was generated.
+    '''
+    setup_environment()
+
+    # The input is always generated with the default store
+    config[RDF_STORE_CONFIG] = DEFAULT_STORE
+    run = _prepare(task, size, _format)
+    config[RDF_STORE_CONFIG] = store or DEFAULT_STORE
+
+    rss_before = _max_rss()
+    timings = []
+    for i in xrange(repeat):
+        start = time.time()
+        run()
+        timings.append(time.time() - start)
+    rss_after = _max_rss()
+
+    seconds = min(timings)
+    return {
+        'task': task,
+        'format': _format,
+        'store': store,
+        'datasets': size,
+        'seconds': seconds,
+        'datasets_per_second': size / seconds if seconds else None,
+        'peak_rss_kb': rss_after,
+        'peak_rss_increase_kb': rss_after - rss_before,
+    }
+
+
+def _run_case_process(queue, task, size, _format, repeat, store):
+    try:
+        queue.put(run_case(task, size, _format, repeat, store))
+    except Exception, e:
+        queue.put({
+            'task': task,
+            'format': _format,
+            'store': store,
+            'datasets': size,
+            'error': '{0}: {1}'.format(e.__class__.__name__, e),
+        })
+
+
+def run_case_isolated(task, size, _format=None, repeat=1, store=None):
+    '''
+    Runs a benchmark case on a separate process, so the peak memory recorded
+    is not affected by the previous cases
+    '''
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_run_case_process,
+                                      args=(queue, task, size, _format,
+                                            repeat, store))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def cases(tasks, sizes, formats, stores=None):
+    '''
+    Returns the list of (task, size, format, store) combinations to run
+
+    Only the `STORE_TASKS` are run for each of the `stores` (defaults to
+    the rdflib one), the store is None for the rest.
+    '''
+    stores = stores or [DEFAULT_STORE]
+    out = []
+    for size in sizes:
+        for task in tasks:
+            if task == 'serialize_catalog':
+                task_formats = [f for f in formats
+                                if f in SERIALIZE_FORMATS]
+            elif task == 'serialize_catalog_write_only':
+                task_formats = [f for f in formats
+                                if url_to_rdflib_format(f)
+                                in WRITE_ONLY_GRAPHS]
+            elif task in ('parse', 'parse_examples'):
+                task_formats = [f for f in formats if f in PARSE_FORMATS]
+            else:
+                task_formats = [None]
+            task_stores = stores if task in STORE_TASKS else [None]
+            for _format in task_formats:
+                for store in task_stores:
+                    out.append((task, size, _format, store))
+    return out
+
+
+def run(tasks=None, sizes=None, formats=None, repeat=1, isolate=True,
+        log=None, stores=None):
+    '''
+    Runs the benchmarks and returns the results as a dict
+
+    Each case is run on a separate process unless `isolate` is False. Cases
+    that fail (eg because an rdflib plugin is not installed) include an
+    `error` key instead of the timings.
+    '''
+    tasks = tasks or TASKS
+    sizes = sizes or DEFAULT_SIZES
+    formats = formats or SERIALIZE_FORMATS
+
+    results = []
+    for task, size, _format, store in cases(tasks, sizes, formats, stores):
+        if isolate:
+            result = run_case_isolated(task, size, _format, repeat, store)
+        else:
+            try:
+                result = run_case(task, size, _format, repeat, store)
+            except Exception, e:
+                result = {
+                    'task': task,
+                    'format': _format,
+                    'store': store,
+                    'datasets': size,
+                    'error': '{0}: {1}'.format(e.__class__.__name__, e),
+                }
+        if log:
+            log(result)
+        results.append(result)
+
+    return {
+        'generated': datetime.datetime.utcnow().isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'rdflib': rdflib.__version__,
+        },
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def _log(result):
+    if 'error' in result:
+        line = '{task} {format} {store} {datasets}: {error}'
+    else:
+        line = ('{task} {format} {store} {datasets}: {seconds:.3f}s, '
+                '{peak_rss_increase_kb} KB')
+    sys.stderr.write(line.format(**result) + '\n')
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description='DCAT RDF - Serialization and parsing benchmarks')
+    parser.add_argument('-s', '--sizes', nargs='*', type=int,
+                        default=DEFAULT_SIZES,
+                        help='Number of datasets on the synthetic catalogs')
+    parser.add_argument('-t', '--tasks', nargs='*', choices=TASKS,
+                        default=TASKS,
+                        help='Tasks to run, defaults to all')
+    parser.add_argument('-f', '--formats', nargs='*',
+                        default=SERIALIZE_FORMATS,
+                        help='Formats to serialize and parse')
+    parser.add_argument('--stores', nargs='*', choices=STORES,
+                        default=STORES,
+                        help='RDF stores used on the parse tasks, defaults '
+                             'to all')
+    parser.add_argument('-r', '--repeat', type=int, default=1,
+                        help='Number of times each case is run, the best '
+                             'time is recorded')
+    parser.add_argument('-o', '--output', type=argparse.FileType('w'),
+                        default=sys.stdout,
+                        help='Output file. If omitted will write to stdout')
+
+    args = parser.parse_args()
+
+    results = run(args.tasks, args.sizes, args.formats, args.repeat,
+                  log=_log, stores=args.stores)
+
+    json.dump(results, args.output, indent=2)
+    args.output.write('\n')
@@ -0,0 +1,470 @@
+import os
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+from pylons import config
+
+from ckan.plugins import toolkit
+
+log = logging.getLogger(__name__)
+
+
+FRAGMENT_CACHE_CONFIG = 'ckanext.dcat.fragment_cache'
+FRAGMENT_CACHE_MAX_ITEMS_CONFIG = 'ckanext.dcat.fragment_cache.max_items'
+FRAGMENT_CACHE_PATH_CONFIG = 'ckanext.dcat.fragment_cache.path'
+FRAGMENT_CACHE_REDIS_URL_CONFIG = 'ckanext.dcat.fragment_cache.redis_url'
+FRAGMENT_CACHE_TTL_CONFIG = 'ckanext.dcat.fragment_cache.ttl'
+CATALOG_MODIFIED_TTL_CONFIG = 'ckanext.dcat.catalog_modified_cache.ttl'
+
+DEFAULT_FRAGMENT_CACHE_MAX_ITEMS = 10000
+DEFAULT_CATALOG_MODIFIED_TTL = 300
+
+
+class LRUCacheBackend(object):
+    '''
+    In-process cache backend that evicts the least recently used items
+
+    It holds at most `max_items` values and, if `max_size` is set, at most
+    `max_size` bytes of (string) values. Values larger than `max_size` are
+    not stored. It is thread safe, but not shared between processes.
+    '''
+
+    def __init__(self, max_items=DEFAULT_FRAGMENT_CACHE_MAX_ITEMS,
+                 max_size=None):
+        self.max_items = max_items
+        self.max_size = max_size
+        self.size = 0
+        self.evictions = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.pop(key, None)
+            if value is not None:
+                # Move it to the most recently used end
+                self._items[key] = value
+            return value
+
+    def set(self, key, value):
+        if self.max_size is not None and len(value) > self.max_size:
+            self.delete(key)
+            return
+        with self._lock:
+            self._pop(key)
+            self._items[key] = value
+            self.size += len(value)
+            while (len(self._items) > self.max_items or
+                   (self.max_size is not None and self.size > self.max_size)):
+                self._pop(next(iter(self._items)))
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.size = 0
+
+    def _pop(self, key):
+        value = self._items.pop(key, None)
+        if value is not None:
+            self.size -= len(value)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class FileSystemCacheBackend(object):
+    '''
+    Cache backend that stores each value in a file on a local directory
+
+    Values are written atomically, so the directory can be shared between
+    processes on the same host. When there are more than `max_items` files,
+    the least recently accessed ones are removed until the directory is back
+    to 90% of the limit.
+    '''
+
+    def __init__(self, path, max_items=DEFAULT_FRAGMENT_CACHE_MAX_ITEMS):
+        self.path = path
+        self.max_items = max_items
+        self.evictions = 0
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        self._count = len(self._files())
+        self._lock = threading.Lock()
+
+    def _files(self):
+        return [f for f in os.listdir(self.path) if f.endswith('.cache')]
+
+    def _file_path(self, key):
+        return os.path.join(self.path,
+                            hashlib.sha1(key).hexdigest() + '.cache')
+
+    def get(self, key):
+        file_path = self._file_path(key)
+        try:
+            with open(file_path, 'rb') as f:
+                value = f.read()
+        except IOError:
+            return None
+
+        # Flag the file as recently used for the eviction
+        try:
+            os.utime(file_path, None)
+        except OSError:
+            pass
+
+        return value
+
+    def set(self, key, value):
+        file_path = self._file_path(key)
+        exists = os.path.exists(file_path)
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(value)
+        os.rename(tmp_path, file_path)
+
+        if not exists:
+            with self._lock:
+                self._count += 1
+                if self._count > self.max_items:
+                    self._evict()
+
+    def _evict(self):
+        files = []
+        for file_name in self._files():
+            file_path = os.path.join(self.path, file_name)
+            try:
+                files.append((os.path.getmtime(file_path), file_path))
+            except OSError:
+                # Removed by another process
+                pass
+        files.sort()
+
+        to_remove = len(files) - int(self.max_items * 0.9)
+        for mtime, file_path in files[:max(to_remove, 0)]:
+            try:
+                os.remove(file_path)
+                self.evictions += 1
+            except OSError:
+                pass
+
+        self._count = len(self._files())
+
+    def delete(self, key):
+        try:
+            os.remove(self._file_path(key))
+            with self._lock:
+                self._count -= 1
+        except OSError:
+            pass
+
+    def clear(self):
+        for file_name in self._files():
+            try:
+                os.remove(os.path.join(self.path, file_name))
+            except OSError:
+                pass
+        with self._lock:
+            self._count = 0
+
+    def __len__(self):
+        return self._count
+
+
+class RedisCacheBackend(object):
+    '''
+    Cache backend that stores values on a Redis server
+
+    Keys are namespaced with `prefix`. If `ttl` (in seconds) is provided,
+    values expire after that time, otherwise eviction is left to the Redis
+    server `maxmemory-policy` setting.
+
+    An already configured client (or a compatible object implementing `get`,
+    `set`, `delete` and `keys`) can be passed via the `client` parameter,
+    otherwise one will be created from `url`, which requires the `redis`
+    package.
+    '''
+
+    def __init__(self, url=None, client=None, ttl=None,
+                 prefix='ckanext-dcat:fragment:'):
+        if client is None:
+            import redis
+            client = redis.StrictRedis.from_url(url or
+                                                'redis://localhost:6379/0')
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.evictions = 0
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value):
+        if self.ttl:
+            self.client.set(self.prefix + key, value, ex=self.ttl)
+        else:
+            self.client.set(self.prefix + key, value)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        keys = self.client.keys(self.prefix + '*')
+        if keys:
+            self.client.delete(*keys)
+
+    def __len__(self):
+        return len(self.client.keys(self.prefix + '*'))
+
+
+class FragmentCache(object):
+    '''
+    Cache of serialized dataset fragments
+
+    Fragments are the serialized triples generated by the profiles for a
+    single dataset. They are keyed on the dataset id and `metadata_modified`
+    value, the profiles used and the serialization format, so an updated
+    dataset or a change on the profiles will never return a stale fragment.
+
+    The actual storage is delegated to a backend object (see
+    `LRUCacheBackend`, `FileSystemCacheBackend` and `RedisCacheBackend`).
+
+    Keeps hit and miss counters that can be checked with `stats()`.
+    '''
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, dataset_dict, profiles, _format):
+        '''
+        Returns the cache key for a dataset, or None if the dataset dict
+        does not have an `id` or `metadata_modified` value
+        '''
+        if not dataset_dict.get('id') or \
+                not dataset_dict.get('metadata_modified'):
+            return None
+
+        key = u'{0}:{1}:{2}:{3}'.format(dataset_dict['id'],
+                                        dataset_dict['metadata_modified'],
+                                        ','.join(profiles),
+                                        _format)
+        return key.encode('utf8')
+
+    def get(self, dataset_dict, profiles, _format):
+        '''
+        Returns the cached fragment for a dataset, or None if not found
+        '''
+        key = self.key(dataset_dict, profiles, _format)
+        if not key:
+            return None
+
+        try:
+            value = self.backend.get(key)
+        except Exception, e:
+            log.warning('Error reading from the fragment cache: {0}'.format(e))
+            value = None
+
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+        return value
+
+    def set(self, dataset_dict, profiles, _format, fragment):
+        '''
+        Stores the serialized fragment for a dataset
+        '''
+        key = self.key(dataset_dict, profiles, _format)
+        if not key:
+            return
+
+        try:
+            self.backend.set(key, fragment)
+        except Exception, e:
+            log.warning('Error writing to the fragment cache: {0}'.format(e))
+
+    def delete(self, dataset_dict, profiles, _format):
+        '''
+        Removes the stored fragment for a dataset
+        '''
+        key = self.key(dataset_dict, profiles, _format)
+        if key:
+            self.backend.delete(key)
+
+    def clear(self):
+        self.backend.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        '''
+        Returns a dict with the hits, misses and evictions on this cache
+        '''
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': getattr(self.backend, 'evictions', 0),
+        }
+
+
+_fragment_cache = None
+_fragment_cache_config = None
+
+
+def get_fragment_cache():
+    '''
+    Returns the process-wide fragment cache defined in the configuration
+
+    The backend is chosen with the `ckanext.dcat.fragment_cache` option, one
+    of `memory`, `filesystem` or `redis`.
+
+    Returns None if the cache is not enabled.
+    '''
+    global _fragment_cache, _fragment_cache_config
+
+    backend_type = config.get(FRAGMENT_CACHE_CONFIG)
+    if not backend_type:
+        return None
+
+    max_items = int(config.get(FRAGMENT_CACHE_MAX_ITEMS_CONFIG,
+                               DEFAULT_FRAGMENT_CACHE_MAX_ITEMS))
+    current_config = (
+        backend_type,
+        max_items,
+        config.get(FRAGMENT_CACHE_PATH_CONFIG),
+        config.get(FRAGMENT_CACHE_REDIS_URL_CONFIG),
+        config.get(FRAGMENT_CACHE_TTL_CONFIG),
+    )
+    if _fragment_cache and _fragment_cache_config == current_config:
+        return _fragment_cache
+
+    if backend_type == 'memory':
+        backend = LRUCacheBackend(max_items)
+    elif backend_type == 'filesystem':
+        path = config.get(FRAGMENT_CACHE_PATH_CONFIG)
+        if not path:
+            path = os.path.join(config.get('ckan.storage_path') or
+                                tempfile.gettempdir(),
+                                'dcat_fragments')
+        backend = FileSystemCacheBackend(path, max_items)
+    elif backend_type == 'redis':
+        ttl = config.get(FRAGMENT_CACHE_TTL_CONFIG)
+        backend = RedisCacheBackend(
+            url=(config.get(FRAGMENT_CACHE_REDIS_URL_CONFIG) or
+                 config.get('ckan.redis.url')),
+            ttl=int(ttl) if ttl else None)
+    else:
+        raise ValueError('Unknown fragment cache backend: {0}'.format(
+            backend_type))
+
+    _fragment_cache = FragmentCache(backend)
+    _fragment_cache_config = current_config
+
+    return _fragment_cache
+
+
+class ValueCache(object):
+    '''
+    Holds a single value that is expensive to compute
+
+    The value is computed on the first call to `get` and reused until it is
+    older than `ttl` seconds or `invalidate` is called. A `ttl` of 0 disables
+    the cache. It is thread safe, but not shared between processes.
+
+    Values are computed without holding the lock, so values whose
+    computation started before the last call to `invalidate` are returned
+    but not cached, as they may be outdated.
+    '''
+
+    def __init__(self):
+        self._value = None
+        self._timestamp = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, compute, ttl):
+        '''
+        Returns the cached value, calling `compute` to get a new one if
+        needed
+        '''
+        with self._lock:
+            if (self._timestamp is not None and
+                    time.time() - self._timestamp < ttl):
+                return self._value
+            generation = self._generation
+
+        value = compute()
+
+        with self._lock:
+            if self._generation == generation:
+                self._value = value
+                self._timestamp = time.time()
+
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._value = None
+            self._timestamp = None
+            self._generation += 1
+
+
+_catalog_modified = ValueCache()
+
+
+def last_catalog_modification():
+    '''
+    Returns the date and time the catalog was last modified
+
+    To be more precise, the most recent value for `metadata_modified` on a
+    dataset, including deleted ones (the `dcat` plugin updates it when a
+    dataset is deleted).
+
+    The value is cached for `ckanext.dcat.catalog_modified_cache.ttl`
+    seconds (defaults to 300), and invalidated by the `dcat` plugin whenever
+    a dataset is created, updated or deleted, once the change has been
+    committed and indexed. Other processes will pick the change once the TTL
+    expires.
+
+    Returns a dateTime string in ISO format, or None if it could not be
+    found.
+    '''
+    ttl = int(config.get(CATALOG_MODIFIED_TTL_CONFIG,
+                         DEFAULT_CATALOG_MODIFIED_TTL))
+    return _catalog_modified.get(_search_last_catalog_modification, ttl)
+
+
+def invalidate_last_catalog_modification():
+    _catalog_modified.invalidate()
+
+
+def _search_last_catalog_modification():
+
+    context = {
+        'user': toolkit.get_action('get_site_user')(
+            {'ignore_auth': True})['name']
+    }
+    result = toolkit.get_action('package_search')(context, {
+        'sort': 'metadata_modified desc',
+        'rows': 1,
+        # Deleted datasets are included, as removing them modifies the
+        # catalog too
+        'fq': '+state:(active OR deleted)',
+    })
+    if result and result.get('results'):
+        return result['results'][0]['metadata_modified']
+    return None
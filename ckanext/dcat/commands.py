@@ -1,24 +1,61 @@
+import os
+import sys
+import copy
+import gzip
 import json
 import logging
+import datetime
 
 from pylons import config
 from ckan import plugins as p
 
+# Maps the dump file extensions to rdflib formats. RDF/XML is not pretty
+# printed as it's prohibitively slow on large graphs.
+DUMP_FORMATS = {
+    'rdf': 'xml',
+    'ttl': 'turtle',
+    'jsonld': 'json-ld',
+    'nt': 'nt',
+}
+
+# Formats that can be written out one dataset at a time. The rest need the
+# whole catalog graph in memory before being serialized.
+STREAMED_DUMP_FORMATS = ('ttl', 'nt')
+
+MANIFEST_FILE = 'catalog.manifest.json'
+FRAGMENTS_DIR = '.fragments'
+
 
 class GenerateStaticDCATCommand(p.toolkit.CkanCommand):
     """
-    Generates static JSON files containing all datasets.
+    Generates static files containing all datasets.
 
-    The generate command will generate a static file containing all of the
+    The json command will generate a static file containing all of the
     datasets in the catalog in JSON format.
 
     paster generate_static json <OUTPUT_FILE> -c <PATH_TO_CONFIG>
+
+    The catalog command will generate gzipped dumps of the whole catalog in
+    the provided RDF formats (rdf, ttl, jsonld or nt, defaults to all) on
+    the output directory, eg catalog.ttl.gz. Subsequent runs will only
+    serialize the datasets modified since the previous dump.
+
+    paster generate_static catalog <OUTPUT_DIR> [FORMAT ...] -c <PATH_TO_CONFIG>
+
+    Datasets are serialized on the number of worker processes set with
+    the --workers option (defaults to `ckanext.dcat.serializer.workers`).
     """
     summary = __doc__.split('\n')[0]
     usage = __doc__
-    max_args = 2
+    max_args = None
     min_args = 2
 
+    # Copied so the option is not added to all the other paster commands
+    parser = copy.deepcopy(p.toolkit.CkanCommand.parser)
+    parser.add_option('-w', '--workers', dest='workers', type='int',
+                      default=None,
+                      help='Number of processes used to serialize datasets')
+
     def __init__(self, name):
         super(GenerateStaticDCATCommand, self).__init__(name)
 
@@ -26,14 +63,23 @@ class GenerateStaticDCATCommand(p.toolkit.CkanCommand):
         self._load_config()
         self.log = logging.getLogger(__name__)
 
-        if len(self.args) != 2:
+        if len(self.args) < 2:
             self.log.error("You must specify the command and the output file")
             return
 
-        cmd, output = self.args
+        cmd, output = self.args[:2]
 
         if cmd == 'json':
             self.generate(output)
+        elif cmd == 'catalog':
+            formats = self.args[2:] or sorted(DUMP_FORMATS.keys())
+            unknown_formats = set(formats) - set(DUMP_FORMATS.keys())
+            if unknown_formats:
+                self.log.error("Unknown formats: {0}".format(
+                    ', '.join(sorted(unknown_formats))))
+                return
+            self.generate_catalog(output, formats,
+                                  workers=self.options.workers)
         else:
             self.log.error("Unknown command {0}".format(cmd))
 
@@ -64,3 +110,166 @@ class GenerateStaticDCATCommand(p.toolkit.CkanCommand):
                     f.write(json.dumps(dataset))
 
             f.write(u"]")
+
+    def _datasets(self):
+        """
+        Generator that returns all the datasets exposed on the catalog
+        endpoint
+        """
+        from ckanext.dcat.logic import _search_ckan_datasets, CURSOR_START
+        from ckanext.dcat.utils import prefetch_dataset_ids
+
+        data_dict = {'cursor': CURSOR_START}
+        while data_dict['cursor']:
+            query = _search_ckan_datasets({}, data_dict)
+            prefetch_dataset_ids(query['results'])
+
+            for dataset in query['results']:
+                yield dataset
+
+            data_dict['cursor'] = query['next_cursor']
+
+    def generate_catalog(self, output_dir, formats, workers=None):
+        """
+        Writes full catalog dumps in the provided formats
+
+        The serialized triples of each dataset are stored on a fragments
+        directory, keyed on the dataset `metadata_modified` value, and a
+        manifest listing the datasets included on the dump is written next to
+        the dumps. On subsequent runs only new or modified datasets are
+        serialized, and the fragments of modified or deleted datasets are
+        removed.
+
+        Dumps are written to a temporary file and moved into place once
+        complete, so clients never get a partial file.
+
+        `workers` is the number of processes used to serialize the datasets
+        (see `RDFSerializer`), and defaults to the
+        `ckanext.dcat.serializer.workers` configuration option.
+        """
+        from ckanext.dcat.cache import FragmentCache, FileSystemCacheBackend
+        from ckanext.dcat.processors import (RDFSerializer, DCAT,
+                                             SERIALIZER_WORKERS_CONFIG_OPTION)
+        from ckanext.dcat.stores import new_graph
+
+        if not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+
+        manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+        previous_datasets = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r') as f:
+                previous_datasets = json.load(f).get('datasets', {})
+
+        cache = FragmentCache(FileSystemCacheBackend(
+            os.path.join(output_dir, FRAGMENTS_DIR), max_items=sys.maxint))
+        if workers is None:
+            workers = config.get(SERIALIZER_WORKERS_CONFIG_OPTION, 0)
+        serializer = RDFSerializer(fragment_cache=cache, workers=workers)
+        profile_names = serializer._profile_names()
+
+        catalog_ref = serializer.graph_from_catalog({})
+        catalog_graph = serializer.g
+
+        streamed_formats = [fmt for fmt in formats
+                            if fmt in STREAMED_DUMP_FORMATS]
+        graph_formats = [fmt for fmt in formats
+                         if fmt not in STREAMED_DUMP_FORMATS]
+        # Datasets for the formats that need a full graph are read from the
+        # N-Triples fragments
+        fragment_formats = set([DUMP_FORMATS[fmt] for fmt in streamed_formats])
+        if graph_formats:
+            fragment_formats.add('nt')
+        fragment_formats = sorted(fragment_formats)
+
+        files = {}
+        full_graph = None
+        current_datasets = {}
+        modified = 0
+        try:
+            for _format in streamed_formats:
+                files[_format] = gzip.open(
+                    self._dump_path(output_dir, _format) + '.tmp', 'wb')
+                files[_format].write(
+                    catalog_graph.serialize(format=DUMP_FORMATS[_format]))
+
+            if graph_formats:
+                # Uses the store set in `ckanext.dcat.rdf.store`, as it holds
+                # the whole catalog
+                full_graph = new_graph()
+                for prefix, namespace in catalog_graph.namespaces():
+                    full_graph.bind(prefix, namespace)
+                full_graph += catalog_graph
+
+            for dataset_dict, dataset_ref, fragments in \
+                    serializer.serialize_datasets_fragments(self._datasets(),
+                                                            fragment_formats):
+                current_datasets[dataset_dict['id']] = \
+                    dataset_dict['metadata_modified']
+                if (previous_datasets.get(dataset_dict['id']) !=
+                        dataset_dict['metadata_modified']):
+                    modified += 1
+
+                catalog_triple = u'{0} {1} {2} .\n'.format(
+                    catalog_ref.n3(), DCAT.dataset.n3(),
+                    dataset_ref.n3()).encode('utf8')
+
+                for _format in streamed_formats:
+                    files[_format].write(fragments[DUMP_FORMATS[_format]])
+                    files[_format].write(catalog_triple)
+
+                if graph_formats:
+                    full_graph.parse(data=fragments['nt'], format='nt')
+                    full_graph.add((catalog_ref, DCAT.dataset, dataset_ref))
+
+            for _format in streamed_formats:
+                files[_format].close()
+
+            for _format in graph_formats:
+                with gzip.open(self._dump_path(output_dir, _format) + '.tmp',
+                               'wb') as f:
+                    full_graph.serialize(f, format=DUMP_FORMATS[_format])
+
+            for _format in formats:
+                dump_path = self._dump_path(output_dir, _format)
+                os.rename(dump_path + '.tmp', dump_path)
+        except Exception:
+            # Do not leave partial dumps behind
+            for dump_file in files.values():
+                dump_file.close()
+            for _format in formats:
+                tmp_path = self._dump_path(output_dir, _format) + '.tmp'
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            raise
+        finally:
+            if full_graph is not None:
+                # Removes the database of disk-backed stores
+                full_graph.close()
+
+        # Remove the fragments for modified and deleted datasets
+        for dataset_id, metadata_modified in previous_datasets.iteritems():
+            if current_datasets.get(dataset_id) != metadata_modified:
+                old_dataset_dict = {'id': dataset_id,
+                                    'metadata_modified': metadata_modified}
+                for _format in fragment_formats:
+                    cache.delete(old_dataset_dict, profile_names, _format)
+
+        manifest = {
+            'generated': datetime.datetime.utcnow().isoformat(),
+            'formats': formats,
+            'profiles': profile_names,
+            'datasets': current_datasets,
+        }
+        with open(manifest_path + '.tmp', 'w') as f:
+            json.dump(manifest, f)
+        os.rename(manifest_path + '.tmp', manifest_path)
+
+        self.log.info(
+            'Catalog dump generated with {0} datasets ({1} new or modified, '
+            '{2} removed)'.format(
+                len(current_datasets), modified,
+                len(set(previous_datasets) - set(current_datasets))))
+
+    def _dump_path(self, output_dir, _format):
+        return os.path.join(output_dir, 'catalog.{0}.gz'.format(_format))
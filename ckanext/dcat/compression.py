@@ -0,0 +1,278 @@
+import zlib
+import logging
+
+from pylons import config
+
+from ckan.plugins import toolkit
+
+from ckanext.dcat.cache import LRUCacheBackend, get_fragment_cache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+log = logging.getLogger(__name__)
+
+COMPRESSION_CONFIG = 'ckanext.dcat.compression'
+COMPRESSION_LEVEL_CONFIG = 'ckanext.dcat.compression.level'
+COMPRESSION_CACHE_MAX_SIZE_CONFIG = 'ckanext.dcat.compression.cache_max_size'
+COMPRESSION_CACHE_MAX_ITEM_SIZE_CONFIG = \
+    'ckanext.dcat.compression.cache_max_item_size'
+
+DEFAULT_COMPRESSION_LEVEL = 6
+# In bytes
+DEFAULT_COMPRESSION_CACHE_MAX_SIZE = 20 * 1024 * 1024
+DEFAULT_COMPRESSION_CACHE_MAX_ITEMS = 1000
+# In bytes
+DEFAULT_COMPRESSION_CACHE_MAX_ITEM_SIZE = 5 * 1024 * 1024
+
+GZIP = 'gzip'
+BROTLI = 'br'
+
+
+def compression_enabled():
+    '''
+    Returns whether responses should be compressed, as defined in the
+    `ckanext.dcat.compression` option (defaults to True)
+    '''
+    return toolkit.asbool(config.get(COMPRESSION_CONFIG, True))
+
+
+def supported_encodings():
+    '''
+    Returns the supported content codings, by order of preference
+
+    Brotli is only supported if the `brotli` package is installed.
+    '''
+    if brotli is not None:
+        return [BROTLI, GZIP]
+    return [GZIP]
+
+
+def negotiate_encoding(accept_encoding):
+    '''
+    Returns the content coding that should be used for a response, given
+    the value of the request Accept-Encoding header
+
+    Codings are chosen by their quality value, and on ties by the order of
+    `supported_encodings`. Returns None if the response should not be
+    compressed.
+    '''
+    if not accept_encoding:
+        return None
+
+    qualities = {}
+    for value in accept_encoding.split(','):
+        parts = value.split(';')
+        coding = parts[0].strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in parts[1:]:
+            name, _, param_value = param.strip().partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(param_value)
+                except ValueError:
+                    quality = 0.0
+        if coding == 'x-gzip':
+            coding = GZIP
+        qualities[coding] = quality
+
+    best, best_quality = None, 0.0
+    for coding in supported_encodings():
+        quality = qualities.get(coding, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+
+    return best
+
+
+def encoded_etag(etag, encoding):
+    '''
+    Returns the ETag of the representation compressed with `encoding`
+
+    Each content coding is a different representation, so it needs a
+    different strong ETag.
+    '''
+    if not encoding:
+        return etag
+    return '{0}-{1}"'.format(etag[:-1], encoding)
+
+
+class Compressor(object):
+    '''
+    Incremental compressor for the supported content codings
+
+    Chunks passed to `compress` return the compressed data available so
+    far, and `flush` returns the rest. The gzip output does not include a
+    timestamp, so the same content is always compressed to the same bytes.
+    '''
+
+    def __init__(self, encoding, level=None):
+        if level is None:
+            level = int(config.get(COMPRESSION_LEVEL_CONFIG,
+                                   DEFAULT_COMPRESSION_LEVEL))
+        self.encoding = encoding
+        if encoding == GZIP:
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED,
+                                                16 + zlib.MAX_WBITS)
+        elif encoding == BROTLI and brotli is not None:
+            # Brotli quality goes from 0 to 11
+            self._compressor = brotli.Compressor(
+                quality=min(11, max(0, level + 2)))
+        else:
+            raise ValueError('Unsupported content coding: {0}'.format(
+                encoding))
+
+    def compress(self, data):
+        if isinstance(data, unicode):
+            data = data.encode('utf8')
+        if self.encoding == GZIP:
+            return self._compressor.compress(data)
+        return self._compressor.process(data)
+
+    def flush(self):
+        if self.encoding == GZIP:
+            return self._compressor.flush()
+        return self._compressor.finish()
+
+
+def compress(content, encoding, level=None):
+    '''
+    Returns `content` compressed with the provided content coding
+    '''
+    compressor = Compressor(encoding, level)
+    return compressor.compress(content) + compressor.flush()
+
+
+_compression_cache = None
+_compression_cache_max_size = None
+
+
+def get_compression_cache():
+    '''
+    Returns the cache used to store the compressed responses
+
+    If the fragment cache is enabled (see `get_fragment_cache`), compressed
+    responses are stored on its backend, next to the serialized dataset
+    fragments. Otherwise a process-wide cache is used, limited in bytes by
+    the `ckanext.dcat.compression.cache_max_size` option (defaults to
+    20 MB). A value of 0 disables it.
+
+    Returns an object with `get` and `set` methods, or None if the cache is
+    not enabled. Errors from the backend are not handled by it, use
+    `get_compressed` and `compress_response` instead.
+    '''
+    global _compression_cache, _compression_cache_max_size
+
+    fragment_cache = get_fragment_cache()
+    if fragment_cache is not None:
+        return fragment_cache.backend
+
+    max_size = int(config.get(COMPRESSION_CACHE_MAX_SIZE_CONFIG,
+                              DEFAULT_COMPRESSION_CACHE_MAX_SIZE))
+    if not max_size:
+        return None
+
+    if (_compression_cache is None or
+            _compression_cache_max_size != max_size):
+        _compression_cache = LRUCacheBackend(
+            DEFAULT_COMPRESSION_CACHE_MAX_ITEMS, max_size)
+        _compression_cache_max_size = max_size
+
+    return _compression_cache
+
+
+def _cache_max_item_size():
+    return int(config.get(COMPRESSION_CACHE_MAX_ITEM_SIZE_CONFIG,
+                          DEFAULT_COMPRESSION_CACHE_MAX_ITEM_SIZE))
+
+
+def _cache_key(etag, encoding):
+    return 'compressed:{0}:{1}'.format(etag.strip('"'), encoding)
+
+
+def _cache_get(cache, key):
+    try:
+        return cache.get(key)
+    except Exception, e:
+        # Responses are compressed again if the cache is not available
+        log.warning('Error reading from the compression cache: {0}'.format(e))
+        return None
+
+
+def _cache_set(cache, key, value):
+    try:
+        cache.set(key, value)
+    except Exception, e:
+        log.warning('Error writing to the compression cache: {0}'.format(e))
+
+
+def get_compressed(etag, encoding):
+    '''
+    Returns a previously stored compressed response for the representation
+    identified by `etag`, or None if not found
+    '''
+    cache = get_compression_cache()
+    if cache is None:
+        return None
+    return _cache_get(cache, _cache_key(etag, encoding))
+
+
+def compress_response(content, etag, encoding):
+    '''
+    Compresses a response body and stores it for subsequent requests for
+    the same representation
+
+    `content` can be a string or an iterable of strings (eg a streamed
+    catalog). In the latter case a generator is returned, that yields the
+    compressed data as the content is generated and stores it once it has
+    been fully consumed.
+
+    Compressed responses larger than the
+    `ckanext.dcat.compression.cache_max_item_size` option (in bytes,
+    defaults to 5 MB) are not stored. Streamed responses stop being kept
+    in memory as soon as they go over it.
+    '''
+    cache = get_compression_cache()
+    key = _cache_key(etag, encoding)
+
+    if isinstance(content, basestring):
+        compressed = compress(content, encoding)
+        if cache is not None and len(compressed) <= _cache_max_item_size():
+            _cache_set(cache, key, compressed)
+        return compressed
+
+    return _compress_stream(content, encoding, cache, key)
+
+
+def _compress_chunks(chunks, encoding):
+    compressor = Compressor(encoding)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _compress_stream(chunks, encoding, cache, key):
+    # Compressed data is only kept while it can be stored on the cache
+    keep = cache is not None
+    compressed = []
+    compressed_size = 0
+    max_size = _cache_max_item_size()
+
+    for data in _compress_chunks(chunks, encoding):
+        if keep:
+            compressed_size += len(data)
+            if compressed_size > max_size:
+                keep = False
+                compressed = []
+            else:
+                compressed.append(data)
+        yield data
+
+    if keep:
+        _cache_set(cache, key, ''.join(compressed))
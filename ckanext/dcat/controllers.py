@@ -1,5 +1,7 @@
 import json
 
+from pylons import config
+
 from ckan.plugins import toolkit
 
 if toolkit.check_ckan_version(min_version='2.1'):
@@ -9,7 +11,21 @@ else:
 from ckan.controllers.package import PackageController
 from ckan.controllers.home import HomeController
 
-from ckanext.dcat.utils import CONTENT_TYPES, parse_accept_header
+from ckanext.dcat.utils import (CONTENT_TYPES, parse_accept_header,
+                                make_etag, http_date, parse_http_date,
+                                parse_iso_datetime, etag_matches)
+from ckanext.dcat.logic import catalog_page_modified, DATASETS_PER_PAGE
+from ckanext.dcat.processors import (RDF_PROFILES_CONFIG_OPTION,
+                                     COMPAT_MODE_CONFIG_OPTION)
+from ckanext.dcat.geometry import (GEOMETRY_DECIMALS_CONFIG,
+                                   GEOMETRY_WKT_CONFIG)
+from ckanext.dcat.jsonld import (context_document, JSONLD_FRAME_CONFIG,
+                                 JSONLD_CONTEXT_URL_CONFIG)
+from ckanext.dcat.compression import (compression_enabled,
+                                      negotiate_encoding, encoded_etag,
+                                      get_compressed, compress_response)
+
+STREAM_CATALOG_CONFIG = 'ckanext.dcat.stream_catalog'
 
 
 def check_access_header():
@@ -22,6 +38,130 @@ def check_access_header():
     return _format
 
 
+def _serializer_settings():
+    '''
+    Returns the settings that affect the RDF output, to be included on the
+    ETags
+    '''
+    return (config.get(RDF_PROFILES_CONFIG_OPTION, ''),
+            config.get(COMPAT_MODE_CONFIG_OPTION, ''),
+            config.get(GEOMETRY_DECIMALS_CONFIG, ''),
+            config.get(GEOMETRY_WKT_CONFIG, ''),
+            config.get(JSONLD_FRAME_CONFIG, ''),
+            config.get(JSONLD_CONTEXT_URL_CONFIG, ''))
+
+
+def check_conditional_request(etag, last_modified=None):
+    '''
+    Sets the ETag and Last-Modified headers on the response and checks them
+    against the If-None-Match and If-Modified-Since request headers
+
+    `last_modified` is an ISO-8601 string like the ones on CKAN's
+    `metadata_modified`.
+
+    If the client copy is still valid the response status is set to 304 and
+    True is returned, in which case no body should be sent.
+    '''
+    toolkit.response.headers['ETag'] = etag
+    if last_modified:
+        toolkit.response.headers['Last-Modified'] = http_date(last_modified)
+
+    if_none_match = toolkit.request.headers.get('If-None-Match')
+    if if_none_match:
+        # If-Modified-Since is ignored if If-None-Match is present
+        not_modified = etag_matches(etag, if_none_match)
+    else:
+        if_modified_since = parse_http_date(
+            toolkit.request.headers.get('If-Modified-Since'))
+        not_modified = bool(
+            if_modified_since and last_modified and
+            parse_iso_datetime(last_modified).replace(microsecond=0) <=
+            if_modified_since)
+
+    if not_modified:
+        toolkit.response.status_int = 304
+        # Entity headers should not be sent on 304 responses
+        for header in ('Content-Type', 'Content-Length'):
+            if header in toolkit.response.headers:
+                del toolkit.response.headers[header]
+
+    return not_modified
+
+
+def check_action_access(action, context, data_dict):
+    '''
+    Checks the auth function of the action that generates the response,
+    aborting with a 403 if the user is not authorized
+
+    This needs to be done before checking conditional requests or looking
+    up cached compressed responses, as neither of them call the action.
+    '''
+    try:
+        toolkit.check_access(action, context, data_dict)
+    except toolkit.NotAuthorized:
+        toolkit.abort(403)
+
+
+def negotiate_response_encoding():
+    '''
+    Returns the content coding that should be used to compress the
+    response, based on the request Accept-Encoding header, or None
+
+    If compression is enabled the Vary header is set on the response, as
+    its content depends on the Accept-Encoding header.
+    '''
+    if not compression_enabled():
+        return None
+
+    vary = toolkit.response.headers.get('Vary')
+    if not vary:
+        toolkit.response.headers['Vary'] = 'Accept-Encoding'
+    elif 'accept-encoding' not in vary.lower():
+        toolkit.response.headers['Vary'] = vary + ', Accept-Encoding'
+
+    return negotiate_encoding(
+        toolkit.request.headers.get('Accept-Encoding'))
+
+
+def response_body(etag, encoding, get_content):
+    '''
+    Returns the response body, compressed with `encoding` if provided
+
+    `get_content` is a function that returns the uncompressed content,
+    either a string or an iterable of strings. Compressed responses are
+    stored keyed on the ETag, so if the same representation was already
+    compressed `get_content` is not called at all. Access to the content
+    must be checked before calling this function (see
+    `check_action_access`).
+    '''
+    if encoding:
+        body = get_compressed(etag, encoding)
+        if body is None:
+            body = compress_response(get_content(), etag, encoding)
+        toolkit.response.headers['Content-Encoding'] = encoding
+    else:
+        body = get_content()
+
+    if isinstance(body, basestring):
+        toolkit.response.headers['Content-Length'] = len(body)
+
+    return body
+
+
+def _catalog_etag(data_dict, modified, *extra):
+
+    return make_etag(
+        modified['count'],
+        modified['page_modified'],
+        modified['catalog_modified'],
+        data_dict.get('page') or 1,
+        data_dict.get('cursor'),
+        data_dict.get('modified_since'),
+        config.get('ckanext.dcat.datasets_per_page', DATASETS_PER_PAGE),
+        *extra
+    )
+
+
 class DCATController(BaseController):
 
     def read_catalog(self, _format=None):
@@ -34,18 +174,48 @@ class DCATController(BaseController):
 
         data_dict = {
             'page': toolkit.request.params.get('page'),
+            'cursor': toolkit.request.params.get('cursor'),
             'modified_since': toolkit.request.params.get('modified_since'),
             'format': _format,
             'validation_mode': toolkit.request.params.get('validation_mode'),
+            'wkt': toolkit.request.params.get('wkt'),
         }
 
-        toolkit.response.headers.update(
-            {'Content-type': CONTENT_TYPES[_format]})
+        context = {
+            'user': toolkit.c.user,
+            'stream': toolkit.asbool(config.get(STREAM_CATALOG_CONFIG, False)),
+        }
+
+        check_action_access('dcat_catalog_show', context, data_dict)
+
         try:
-            return toolkit.get_action('dcat_catalog_show')({}, data_dict)
+            modified = catalog_page_modified({}, data_dict)
         except toolkit.ValidationError, e:
             toolkit.abort(409, str(e))
 
+        encoding = negotiate_response_encoding()
+
+        etag = encoded_etag(
+            _catalog_etag(data_dict, modified, _format,
+                          data_dict['validation_mode'],
+                          toolkit.request.url,
+                          *_serializer_settings()),
+            encoding)
+        if check_conditional_request(etag, modified['catalog_modified']):
+            return ''
+
+        toolkit.response.headers.update(
+            {'Content-type': CONTENT_TYPES[_format]})
+
+        def get_content():
+            try:
+                return toolkit.get_action('dcat_catalog_show')(context,
+                                                               data_dict)
+            except toolkit.ValidationError, e:
+                toolkit.abort(409, str(e))
+
+        return response_body(etag, encoding, get_content)
+
     def read_dataset(self, _id, _format=None):
 
         if not _format:
@@ -54,16 +224,45 @@ class DCATController(BaseController):
         if not _format:
             return PackageController().read(_id)
 
-        toolkit.response.headers.update(
-            {'Content-type': CONTENT_TYPES[_format]})
+        check_action_access('dcat_dataset_show', {'user': toolkit.c.user},
+                            {'id': _id, 'format': _format})
 
         try:
-            result = toolkit.get_action('dcat_dataset_show')({}, {'id': _id,
-                'format': _format})
+            dataset_dict = toolkit.get_action('package_show')({}, {'id': _id})
         except toolkit.ObjectNotFound:
             toolkit.abort(404)
 
-        return result
+        wkt = toolkit.request.params.get('wkt')
+
+        encoding = negotiate_response_encoding()
+
+        etag = encoded_etag(
+            make_etag(dataset_dict['id'], dataset_dict['metadata_modified'],
+                      _format, wkt, *_serializer_settings()),
+            encoding)
+        if check_conditional_request(etag,
+                                     dataset_dict['metadata_modified']):
+            return ''
+
+        toolkit.response.headers.update(
+            {'Content-type': CONTENT_TYPES[_format]})
+
+        def get_content():
+            try:
+                # The dataset has already been retrieved to check the ETag
+                return toolkit.get_action('dcat_dataset_show')(
+                    {'dataset_dict': dataset_dict},
+                    {'id': _id, 'format': _format, 'wkt': wkt})
+            except toolkit.ObjectNotFound:
+                toolkit.abort(404)
+
+        return response_body(etag, encoding, get_content)
+
+    def jsonld_context(self):
+
+        toolkit.response.headers['Content-Type'] = CONTENT_TYPES['jsonld']
+
+        return context_document()
 
     def dcat_json(self):
 
@@ -72,18 +271,37 @@ class DCATController(BaseController):
             'modified_since': toolkit.request.params.get('modified_since'),
         }
 
+        check_action_access('dcat_datasets_list', {'user': toolkit.c.user},
+                            data_dict)
+
         try:
-            datasets = toolkit.get_action('dcat_datasets_list')({},
-                                                                data_dict)
+            modified = catalog_page_modified({}, data_dict)
         except toolkit.ValidationError, e:
             toolkit.abort(409, str(e))
 
-        content = json.dumps(datasets)
+        encoding = negotiate_response_encoding()
+
+        etag = encoded_etag(_catalog_etag(data_dict, modified, 'json'),
+                            encoding)
+        # The page modification date does not change when one of its
+        # datasets is deleted, the catalog one does
+        if check_conditional_request(etag, modified['catalog_modified']):
+            return ''
+
+        def get_content():
+            try:
+                datasets = toolkit.get_action('dcat_datasets_list')(
+                    {}, data_dict)
+            except toolkit.ValidationError, e:
+                toolkit.abort(409, str(e))
+
+            return json.dumps(datasets)
+
+        body = response_body(etag, encoding, get_content)
 
         toolkit.response.headers['Content-Type'] = 'application/json'
-        toolkit.response.headers['Content-Length'] = len(content)
 
-        return content
+        return body
 
 
 
@@ -0,0 +1,93 @@
+import threading
+
+from ckan import plugins as p
+from ckan.plugins import toolkit
+
+from ckanext.dcat.interfaces import IDCATFormatMappings
+
+# Format URIs whose last component is a media type or format code
+FORMAT_URI_PREFIXES = [
+    'http://publications.europa.eu/resource/authority/file-type/',
+    'https://www.iana.org/assignments/media-types/',
+    'http://www.iana.org/assignments/media-types/',
+]
+
+# EU file type codes that do not match the CKAN formats, mapped to keys of
+# the CKAN formats registry
+EU_FILE_TYPES = {
+    'rdf_xml': 'application/rdf+xml',
+    'rdf_turtle': 'text/turtle',
+    'rdf_n_triples': 'application/n-triples',
+    'json_ld': 'application/ld+json',
+    'xls': 'application/vnd.ms-excel',
+    'tab_separated_values': 'text/tab-separated-values',
+}
+
+
+class FormatIndex(object):
+    '''
+    Maps media types, format labels and format URIs to CKAN formats
+
+    The index is built on first use from the formats registry included with
+    CKAN core (CKAN>=2.3 only) and the mappings provided by plugins
+    implementing `IDCATFormatMappings`. Lookups are case insensitive.
+    '''
+
+    def __init__(self):
+        self._index = None
+        self._lock = threading.Lock()
+
+    def normalize(self, value):
+        '''
+        Returns the CKAN format for the provided value, or None if it is not
+        known
+        '''
+        if not value:
+            return None
+
+        index = self._index
+        if index is None:
+            index = self._get_index()
+
+        key = value.strip().lower()
+        ckan_format = index.get(key)
+        if ckan_format is None:
+            for prefix in FORMAT_URI_PREFIXES:
+                if key.startswith(prefix):
+                    ckan_format = index.get(key[len(prefix):])
+                    break
+        return ckan_format
+
+    def reset(self):
+        with self._lock:
+            self._index = None
+
+    def _get_index(self):
+        with self._lock:
+            if self._index is None:
+                self._index = self._build_index()
+            return self._index
+
+    def _build_index(self):
+        index = {}
+
+        if toolkit.check_ckan_version(min_version='2.3'):
+            from ckan.lib import helpers
+
+            for key, line in helpers.resource_formats().iteritems():
+                index[key.lower()] = line[1]
+
+            for code, key in EU_FILE_TYPES.iteritems():
+                if key in index and code not in index:
+                    index[code] = index[key]
+
+        mappings = {}
+        for plugin in p.PluginImplementations(IDCATFormatMappings):
+            mappings = plugin.update_format_mappings(mappings)
+        for key, ckan_format in mappings.iteritems():
+            index[key.strip().lower()] = ckan_format
+
+        return index
+
+
+format_index = FormatIndex()
@@ -0,0 +1,168 @@
+import json
+import hashlib
+import numbers
+
+from pylons import config
+
+from geomet import wkt, InvalidGeoJSONException
+
+from ckanext.dcat.cache import LRUCacheBackend
+
+GEOMETRY_CACHE_MAX_SIZE_CONFIG = 'ckanext.dcat.geometry_cache.max_size'
+GEOMETRY_DECIMALS_CONFIG = 'ckanext.dcat.geometry.decimals'
+GEOMETRY_WKT_CONFIG = 'ckanext.dcat.geometry.wkt'
+
+# In bytes
+DEFAULT_GEOMETRY_CACHE_MAX_SIZE = 10 * 1024 * 1024
+DEFAULT_GEOMETRY_CACHE_MAX_ITEMS = 10000
+
+# Decimals used on the WKT serializations
+WKT_DECIMALS = 4
+
+# Stored on the cache for values that could not be converted
+INVALID = ''
+
+
+_geometry_cache = None
+_geometry_cache_max_size = None
+
+
+def get_geometry_cache():
+    '''
+    Returns the process-wide geometry conversion cache
+
+    Its size in bytes is limited by the `ckanext.dcat.geometry_cache.max_size`
+    option (defaults to 10 MB). A value of 0 disables the cache.
+
+    Returns None if the cache is not enabled.
+    '''
+    global _geometry_cache, _geometry_cache_max_size
+
+    max_size = int(config.get(GEOMETRY_CACHE_MAX_SIZE_CONFIG,
+                              DEFAULT_GEOMETRY_CACHE_MAX_SIZE))
+    if not max_size:
+        return None
+
+    if _geometry_cache is None or _geometry_cache_max_size != max_size:
+        _geometry_cache = LRUCacheBackend(DEFAULT_GEOMETRY_CACHE_MAX_ITEMS,
+                                          max_size)
+        _geometry_cache_max_size = max_size
+
+    return _geometry_cache
+
+
+def geometry_decimals():
+    '''
+    Returns the maximum number of decimals for the coordinates of the
+    serialized geometries, as defined in `ckanext.dcat.geometry.decimals`,
+    or None if the coordinates should be left untouched
+    '''
+    decimals = config.get(GEOMETRY_DECIMALS_CONFIG)
+    if decimals in (None, ''):
+        return None
+    return int(decimals)
+
+
+def _cached(operation, value, convert):
+    '''
+    Returns the result of calling `convert` with the geometry `value`
+
+    Results are cached using a hash of the value contents, so geometries
+    shared by several datasets are only converted once. `convert` must
+    return a string, or None if the value is not valid.
+    '''
+    cache = get_geometry_cache()
+    if cache is None:
+        return convert(value)
+
+    if isinstance(value, unicode):
+        encoded = value.encode('utf8')
+    else:
+        encoded = value
+    key = '{0}:{1}'.format(operation, hashlib.sha1(encoded).hexdigest())
+
+    result = cache.get(key)
+    if result is None:
+        result = convert(value)
+        cache.set(key, INVALID if result is None else result)
+    elif result == INVALID:
+        result = None
+
+    return result
+
+
+def _round_coordinates(coordinates, decimals):
+    if isinstance(coordinates, numbers.Number):
+        return round(coordinates, decimals)
+    return [_round_coordinates(c, decimals) for c in coordinates]
+
+
+def _round_geometry(geometry, decimals):
+    if geometry.get('type') == 'GeometryCollection':
+        geometry['geometries'] = [_round_geometry(g, decimals)
+                                  for g in geometry.get('geometries', [])]
+    elif 'coordinates' in geometry:
+        geometry['coordinates'] = _round_coordinates(geometry['coordinates'],
+                                                     decimals)
+    return geometry
+
+
+def valid_geojson(value):
+    '''
+    Checks if a string is a valid JSON document, as it is done by the
+    parsers when importing GeoJSON geometries
+    '''
+    def convert(value):
+        try:
+            json.loads(value)
+            return 'true'
+        except (ValueError, TypeError):
+            return None
+
+    return _cached('valid', value, convert) is not None
+
+
+def geojson_to_wkt(value, decimals=WKT_DECIMALS):
+    '''
+    Transforms a GeoJSON geometry string into WKT
+
+    Returns None if the GeoJSON is not valid
+    '''
+    def convert(value):
+        try:
+            return wkt.dumps(json.loads(value), decimals=decimals)
+        except (TypeError, ValueError, InvalidGeoJSONException):
+            return None
+
+    return _cached('wkt{0}'.format(decimals), value, convert)
+
+
+def wkt_to_geojson(value):
+    '''
+    Transforms a WKT geometry string into GeoJSON
+
+    Returns None if the WKT is not valid
+    '''
+    def convert(value):
+        try:
+            return json.dumps(wkt.loads(value))
+        except (ValueError, TypeError):
+            return None
+
+    return _cached('geojson', value, convert)
+
+
+def cap_precision(value, decimals):
+    '''
+    Rounds the coordinates of a GeoJSON geometry string to `decimals`
+    decimals, to keep the size of large geometries bounded
+
+    Returns the value unchanged if it is not valid GeoJSON
+    '''
+    def convert(value):
+        try:
+            return json.dumps(_round_geometry(json.loads(value), decimals))
+        except (ValueError, TypeError, AttributeError):
+            return None
+
+    return _cached('round{0}'.format(decimals), value, convert) or value
@@ -1,9 +1,17 @@
 import os
+import json
 import uuid
 import logging
 
 import requests
+from requests.adapters import HTTPAdapter
+try:
+    from requests.packages.urllib3.util.retry import Retry
+except ImportError:
+    # requests < 2.4, which only supports retrying failed connections
+    Retry = None
 import rdflib
+from pylons import config
 
 from ckan import plugins as p
 from ckan import logic
@@ -16,16 +24,133 @@ from ckanext.harvest.model import HarvestObject, HarvestObjectExtra
 
 log = logging.getLogger(__name__)
 
+TIMEOUT_CONFIG_OPTION = 'ckanext.dcat.harvester.timeout'
+RETRIES_CONFIG_OPTION = 'ckanext.dcat.harvester.retries'
+BACKOFF_FACTOR_CONFIG_OPTION = 'ckanext.dcat.harvester.backoff_factor'
+POOL_MAXSIZE_CONFIG_OPTION = 'ckanext.dcat.harvester.pool_maxsize'
+
+DEFAULT_TIMEOUT = 60
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+DEFAULT_POOL_MAXSIZE = 10
+
+# Responses that are retried, as they usually mean a temporary error
+RETRY_STATUSES = (500, 502, 503, 504)
+
 
 class DCATHarvester(HarvesterBase):
 
     MAX_FILE_SIZE = 1024 * 1024 * 50  # 50 Mb
-    CHUNK_SIZE = 1024
+    CHUNK_SIZE = 1024 * 64  # 64 Kb
 
     force_import = False
 
     _user_name = None
 
+    _session = None
+    _session_job_id = None
+
+    def validate_config(self, source_config):
+        if not source_config:
+            return source_config
+
+        source_config_obj = json.loads(source_config)
+        for key in ('max_file_size', 'download_chunk_size'):
+            if key in source_config_obj:
+                value = source_config_obj[key]
+                if (not isinstance(value, int) or isinstance(value, bool) or
+                        value <= 0):
+                    raise ValueError('{0} must be a positive integer'.format(key))
+        if 'timeout' in source_config_obj:
+            timeout = source_config_obj['timeout']
+            if (not isinstance(timeout, (int, float)) or
+                    isinstance(timeout, bool) or timeout <= 0):
+                raise ValueError('timeout must be a positive number')
+        if 'head_request' in source_config_obj:
+            if not isinstance(source_config_obj['head_request'], bool):
+                raise ValueError('head_request must be true or false')
+
+        return source_config
+
+    def _get_source_config(self, harvest_job):
+        source = getattr(harvest_job, 'source', None)
+        if source is not None and source.config:
+            return json.loads(source.config)
+        return {}
+
+    def _get_download_sizes(self, harvest_job):
+        '''
+        Returns the maximum file size and the chunk size used when
+        downloading remote files, which can be set for each source with the
+        `max_file_size` and `download_chunk_size` config options
+        '''
+        source_config = self._get_source_config(harvest_job)
+        max_file_size = source_config.get('max_file_size', self.MAX_FILE_SIZE)
+        chunk_size = source_config.get('download_chunk_size', self.CHUNK_SIZE)
+
+        return max_file_size, chunk_size
+
+    def _get_timeout(self, harvest_job):
+        '''
+        Returns the timeout in seconds of the requests to the source, which
+        defaults to the `ckanext.dcat.harvester.timeout` option and can be set
+        for each source with the `timeout` config option
+        '''
+        return self._get_source_config(harvest_job).get(
+            'timeout',
+            float(config.get(TIMEOUT_CONFIG_OPTION, DEFAULT_TIMEOUT)))
+
+    def _get_session(self, harvest_job):
+        '''
+        Returns the HTTP session used to download the files of a harvest job
+
+        Connections are pooled and kept alive between the requests of the
+        same job (eg each page of a paginated source), and failed requests
+        are retried with an exponential backoff. A new session is created
+        for each job.
+        '''
+        job_id = getattr(harvest_job, 'id', None)
+        if self._session is not None and self._session_job_id == job_id:
+            return self._session
+
+        self._close_session()
+
+        retries = int(config.get(RETRIES_CONFIG_OPTION, DEFAULT_RETRIES))
+        if Retry is not None:
+            retries = Retry(
+                total=retries,
+                backoff_factor=float(config.get(BACKOFF_FACTOR_CONFIG_OPTION,
+                                                DEFAULT_BACKOFF_FACTOR)),
+                status_forcelist=RETRY_STATUSES)
+        adapter = HTTPAdapter(
+            pool_maxsize=int(config.get(POOL_MAXSIZE_CONFIG_OPTION,
+                                        DEFAULT_POOL_MAXSIZE)),
+            max_retries=retries)
+
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        self._session = session
+        self._session_job_id = job_id
+
+        return session
+
+    def _close_session(self):
+        if self._session is not None:
+            self._session.close()
+        self._session = None
+        self._session_job_id = None
+
+    def _check_content_length(self, response, max_file_size, harvest_job):
+        cl = response.headers.get('content-length')
+        if cl and int(cl) > max_file_size:
+            msg = '''Remote file is too big. Allowed
+                file size: {allowed}, Content-Length: {actual}.'''.format(
+                allowed=max_file_size, actual=cl)
+            self._save_gather_error(msg, harvest_job)
+            return False
+        return True
 
     def _get_content_and_type(self, url, harvest_job, page=1, content_type=None):
         '''
@@ -57,35 +182,43 @@ class DCATHarvester(HarvesterBase):
 
             log.debug('Getting file %s', url)
 
-            # first we try a HEAD request which may not be supported
-            did_get = False
-            r = requests.head(url)
-            if r.status_code == 405 or r.status_code == 400 or r.status_code == 406 :
-                r = requests.get(url, stream=True)
-                did_get = True
+            max_file_size, chunk_size = self._get_download_sizes(harvest_job)
+            session = self._get_session(harvest_job)
+            timeout = self._get_timeout(harvest_job)
+
+            # The size of the file is checked on the headers of the GET
+            # response before reading its body, so HEAD requests (which may
+            # not be supported) are only done if the source asks for them
+            if self._get_source_config(harvest_job).get('head_request'):
+                r = session.head(url, timeout=timeout)
+                if r.status_code not in (405, 400, 406):
+                    r.raise_for_status()
+                    if not self._check_content_length(r, max_file_size,
+                                                      harvest_job):
+                        return None, None, None
+
+            r = session.get(url, stream=True, timeout=timeout)
             r.raise_for_status()
 
-            cl = r.headers.get('content-length')
-            if cl and int(cl) > self.MAX_FILE_SIZE:
-                msg = '''Remote file is too big. Allowed
-                    file size: {allowed}, Content-Length: {actual}.'''.format(
-                    allowed=self.MAX_FILE_SIZE, actual=cl)
-                self._save_gather_error(msg, harvest_job)
+            if not self._check_content_length(r, max_file_size, harvest_job):
+                r.close()
                 return None, None, None
 
-            if not did_get:
-                r = requests.get(url, stream=True)
-
+            # Chunks are joined once at the end, as concatenating them as they
+            # arrive copies the whole content on each one
             length = 0
-            content = ''
-            for chunk in r.iter_content(chunk_size=self.CHUNK_SIZE):
-                content = content + chunk
+            chunks = []
+            for chunk in r.iter_content(chunk_size=chunk_size):
+                chunks.append(chunk)
                 length += len(chunk)
 
-                if length >= self.MAX_FILE_SIZE:
+                if length >= max_file_size:
+                    r.close()
                     self._save_gather_error('Remote file is too big.', harvest_job)
                     return None, None, None
 
+            content = ''.join(chunks)
+
             if content_type is None and r.headers.get('content-type'):
                 content_type = r.headers.get('content-type').split(";", 1)[0]
 
@@ -109,6 +242,11 @@ class DCATHarvester(HarvesterBase):
             msg = 'Could not get content because the connection timed out.'
             self._save_gather_error(msg, harvest_job)
             return None, None, None
+        except requests.exceptions.RequestException, error:
+            # eg the retries on server errors were exhausted
+            msg = 'Could not get content. %s' % error
+            self._save_gather_error(msg, harvest_job)
+            return None, None, None
 
     def _get_user_name(self):
         if self._user_name:
@@ -162,7 +300,14 @@ class DCATHarvester(HarvesterBase):
 
     ## End hooks
 
-    def gather_stage(self,harvest_job):
+    def gather_stage(self, harvest_job):
+        # All pages are requested on the same pooled session
+        try:
+            return self._gather_stage(harvest_job)
+        finally:
+            self._close_session()
+
+    def _gather_stage(self, harvest_job):
         log.debug('In DCATHarvester gather_stage')
 
 
@@ -2,6 +2,8 @@ import json
 import uuid
 import logging
 
+from pylons import config
+
 import ckan.plugins as p
 import ckan.model as model
 import ckan.logic as logic
@@ -10,7 +12,10 @@ from ckanext.harvest.model import HarvestObject, HarvestObjectExtra
 
 from ckanext.dcat.harvesters.base import DCATHarvester
 
-from ckanext.dcat.processors import RDFParserException, RDFParser
+from ckanext.dcat.processors import (RDFParserException, RDFParser,
+                                     PARSER_WORKERS_CONFIG_OPTION)
+from ckanext.dcat.utils import url_to_rdflib_format
+from ckanext.dcat.streaming import use_streaming_parse
 
 from ckanext.dcat.interfaces import IDCATRDFHarvester
 
@@ -126,6 +131,8 @@ class DCATRDFHarvester(DCATHarvester):
         return object_ids
 
     def validate_config(self, source_config):
+        source_config = super(DCATRDFHarvester, self).validate_config(
+            source_config)
         if not source_config:
             return source_config
 
@@ -137,6 +144,15 @@ class DCATRDFHarvester(DCATHarvester):
             supported_formats = RDFParser().supported_formats()
             if rdf_format not in supported_formats:
                 raise ValueError('rdf_format should be one of: ' + ", ".join(supported_formats))
+        if 'parser_workers' in source_config_obj:
+            parser_workers = source_config_obj['parser_workers']
+            if (not isinstance(parser_workers, int) or
+                    isinstance(parser_workers, bool) or parser_workers < 0):
+                raise ValueError(
+                    'parser_workers must be a non-negative integer')
+        if 'streaming_parse' in source_config_obj:
+            if not isinstance(source_config_obj['streaming_parse'], bool):
+                raise ValueError('streaming_parse must be a boolean')
 
         return source_config
 
@@ -163,11 +179,15 @@ class DCATRDFHarvester(DCATHarvester):
         if harvest_job.source.config:
             rdf_format = json.loads(harvest_job.source.config).get("rdf_format")
 
-        while url:
-            content, rdf_format, links = self._get_content_and_type(url, harvest_job, 1, content_type=rdf_format)
-            self.parse_chunk(harvest_job, content, rdf_format, guids_in_source, object_ids)
+        # All pages are requested on the same pooled session
+        try:
+            while url:
+                content, rdf_format, links = self._get_content_and_type(url, harvest_job, 1, content_type=rdf_format)
+                self.parse_chunk(harvest_job, content, rdf_format, guids_in_source, object_ids)
 
-            url = links and ('http://www.w3.org/ns/hydra/core#nextPage' in links) and links['http://www.w3.org/ns/hydra/core#nextPage']['url']
+                url = links and ('http://www.w3.org/ns/hydra/core#nextPage' in links) and links['http://www.w3.org/ns/hydra/core#nextPage']['url']
+        finally:
+            self._close_session()
 
         # Check if some datasets need to be deleted
         object_ids_to_delete = self._mark_datasets_for_deletion(guids_in_source, harvest_job)
@@ -187,11 +207,26 @@ class DCATRDFHarvester(DCATHarvester):
         if not content:
             return False
 
+        # Number of processes used to parse the datasets, defaults to the
+        # `ckanext.dcat.parser.workers` option
+        workers = config.get(PARSER_WORKERS_CONFIG_OPTION, 0)
+        streaming_enabled = None
+        if harvest_job.source.config:
+            source_config = json.loads(harvest_job.source.config)
+            workers = source_config.get('parser_workers', workers)
+            streaming_enabled = source_config.get('streaming_parse')
+
         # TODO: profiles conf
-        parser = RDFParser()
+        parser = RDFParser(workers=workers)
+
+        # Large N-Triples and N-Quads sources can be parsed with bounded
+        # memory, if enabled for the source or site-wide
+        streaming = use_streaming_parse(url_to_rdflib_format(rdf_format),
+                                        len(content),
+                                        enabled=streaming_enabled)
 
         try:
-            parser.parse(content, _format=rdf_format)
+            parser.parse(content, _format=rdf_format, streaming=streaming)
         except RDFParserException, e:
             self._save_gather_error('Error parsing the RDF file: {0}'.format(e), harvest_job)
             return False
@@ -59,3 +59,25 @@ class IDCATRDFHarvester(Interface):
         :rtype: tuple
         '''
         return content, []
+
+
+class IDCATFormatMappings(Interface):
+
+    def update_format_mappings(self, mappings):
+        '''
+        Allows to add site-specific mappings to the CKAN resource formats
+
+        The parsers use these mappings to normalize the media types and
+        format labels found on the distributions (see
+        ``ckanext.dcat.formats.FormatIndex``). They are read once per
+        process, and take precedence over the standard CKAN formats.
+
+        :param mappings: A dict mapping media types, format labels or format
+                         URIs (case insensitive) to CKAN formats, with the
+                         mappings added by other plugins
+        :type mappings: dict
+
+        :returns: The updated mappings dict
+        :rtype: dict
+        '''
+        return mappings
@@ -0,0 +1,226 @@
+import json
+
+from pylons import config
+
+from rdflib import URIRef, BNode, Literal
+from rdflib.namespace import RDF, RDFS, XSD
+
+from ckan.plugins import toolkit
+
+from ckanext.dcat.profiles import namespaces
+
+JSONLD_CONTEXT_URL_CONFIG = 'ckanext.dcat.jsonld.context_url'
+JSONLD_FRAME_CONFIG = 'ckanext.dcat.jsonld.frame'
+
+# Fragment formats, as stored on the fragment cache
+JSONLD_FRAGMENT = 'json-ld'
+JSONLD_FLAT_FRAGMENT = 'json-ld-flat'
+
+# Fixed context used to compact the JSON-LD output, with the prefixes used
+# by the default profiles
+CONTEXT = dict((prefix, unicode(namespace))
+               for prefix, namespace in namespaces.iteritems())
+CONTEXT.update({
+    'rdf': unicode(RDF),
+    'rdfs': unicode(RDFS),
+    'xsd': unicode(XSD),
+    'hydra': u'http://www.w3.org/ns/hydra/core#',
+})
+
+
+def context_document():
+    '''
+    Returns the JSON-LD context document, as published when the context
+    is served by reference
+    '''
+    return json.dumps({'@context': CONTEXT}, sort_keys=True, indent=2)
+
+
+class JSONLDWriter(object):
+    '''
+    Writes compacted JSON-LD from rdflib graphs using a fixed context
+
+    The output is compacted against `CONTEXT`, without the cost of the
+    generic compaction algorithm. Properties and types are written as
+    compact IRIs (eg `dct:title`), and IRIs not covered by the context are
+    left expanded.
+
+    If `frame` is True, nodes are nested following the links between them
+    (eg dcat:Catalog -> dcat:dataset -> dcat:distribution). Otherwise a flat
+    list of nodes is written.
+
+    The context is written inline, unless `context_url` is provided, in
+    which case it is referenced.
+    '''
+
+    def __init__(self, frame=True, context_url=None):
+        self.frame = frame
+        self.context_url = context_url
+        self._prefixes = sorted(CONTEXT.iteritems(),
+                                key=lambda item: len(item[1]), reverse=True)
+        self._iris = {}
+        self._context = None
+
+    @property
+    def context(self):
+        return self.context_url or CONTEXT
+
+    @property
+    def fragment_format(self):
+        '''
+        Name used for the dataset fragments written with this writer (see
+        `fragment`)
+        '''
+        return JSONLD_FRAGMENT if self.frame else JSONLD_FLAT_FRAGMENT
+
+    def compact_iri(self, iri):
+        '''
+        Returns the compact form of an IRI, using the longest matching
+        namespace on the context
+        '''
+        value = self._iris.get(iri)
+        if value is None:
+            value = unicode(iri)
+            for prefix, namespace in self._prefixes:
+                if value.startswith(namespace) and len(value) > len(namespace):
+                    value = u'{0}:{1}'.format(prefix, value[len(namespace):])
+                    break
+            if len(self._iris) < 10000:
+                self._iris[iri] = value
+        return value
+
+    def nodes(self, graph, roots=None):
+        '''
+        Returns a list of node objects for all the triples on the graph
+
+        When framing, the `roots` nodes are returned first, with all the
+        nodes they link to embedded. Nodes not linked from any of them are
+        returned afterwards.
+        '''
+        if not self.frame:
+            return [self._node(graph, subject, frozenset([subject]), False)
+                    for subject in self._subjects(graph)]
+
+        nodes = []
+        visited = set()
+        for root in roots or []:
+            if (root, None, None) in graph:
+                nodes.append(self._node(graph, root, frozenset([root]), True,
+                                        visited))
+        for subject in self._subjects(graph):
+            if subject not in visited:
+                nodes.append(self._node(graph, subject, frozenset([subject]),
+                                        True, visited))
+        return nodes
+
+    def document(self, graph, roots=None):
+        '''
+        Returns a JSON-LD document with the contents of the graph
+
+        If there is a single top level node, the document is that node,
+        otherwise it is a list of nodes. The context is added to each of the
+        top level nodes rather than using `@graph`, which older versions of
+        rdflib-jsonld (including the one used by the parsers) load into a
+        named graph.
+        '''
+        nodes = [self.with_context(self.dumps(node))
+                 for node in self.nodes(graph, roots)]
+        if len(nodes) == 1:
+            return nodes[0]
+        return '[' + ', '.join(nodes) + ']'
+
+    def with_context(self, node):
+        '''
+        Adds the context to a serialized node object
+        '''
+        context = self._context
+        if context is None:
+            context = self._context = '{{"@context": {0}'.format(
+                self.dumps(self.context))
+        if node == '{}':
+            return context + '}'
+        return context + ', ' + node[1:]
+
+    def fragment(self, graph, root):
+        '''
+        Returns the node objects for a dataset graph, one per line
+
+        When framing, the first line is the dataset node.
+        '''
+        return '\n'.join(self.dumps(node)
+                         for node in self.nodes(graph, [root]))
+
+    def dumps(self, value):
+        return json.dumps(value, sort_keys=True)
+
+    def _subjects(self, graph):
+        seen = set()
+        for subject in graph.subjects():
+            if subject not in seen:
+                seen.add(subject)
+                yield subject
+
+    def _node(self, graph, subject, ancestors, embed, visited=None):
+        if visited is not None:
+            visited.add(subject)
+
+        node = {}
+        if isinstance(subject, URIRef):
+            node['@id'] = unicode(subject)
+        elif not embed or len(ancestors) == 1 or \
+                self._references(graph, subject) > 1:
+            node['@id'] = subject.n3()
+
+        for predicate, _object in graph.predicate_objects(subject):
+            if predicate == RDF.type and isinstance(_object, URIRef):
+                key = '@type'
+                value = self.compact_iri(_object)
+            else:
+                key = self.compact_iri(predicate)
+                if (embed and not isinstance(_object, Literal) and
+                        _object not in ancestors and
+                        (_object, None, None) in graph):
+                    value = self._node(graph, _object,
+                                       ancestors | frozenset([_object]),
+                                       True, visited)
+                else:
+                    value = self._value(_object)
+
+            if key in node:
+                if not isinstance(node[key], list):
+                    node[key] = [node[key]]
+                node[key].append(value)
+            else:
+                node[key] = value
+
+        return node
+
+    def _references(self, graph, node):
+        count = 0
+        for triple in graph.triples((None, None, node)):
+            count += 1
+            if count > 1:
+                break
+        return count
+
+    def _value(self, value):
+        if isinstance(value, URIRef):
+            return {'@id': unicode(value)}
+        elif isinstance(value, BNode):
+            return {'@id': value.n3()}
+        elif value.language:
+            return {'@value': unicode(value), '@language': value.language}
+        elif value.datatype:
+            return {'@value': unicode(value),
+                    '@type': self.compact_iri(value.datatype)}
+        return unicode(value)
+
+
+def get_jsonld_writer():
+    '''
+    Returns a JSON-LD writer configured with the `ckanext.dcat.jsonld.frame`
+    (defaults to True) and `ckanext.dcat.jsonld.context_url` options
+    '''
+    return JSONLDWriter(
+        frame=toolkit.asbool(config.get(JSONLD_FRAME_CONFIG, True)),
+        context_url=config.get(JSONLD_CONTEXT_URL_CONFIG) or None)
@@ -1,5 +1,8 @@
 from __future__ import division
+import re
+import json
 import math
+import base64
 
 from pylons import config
 from dateutil.parser import parse as dateutil_parse
@@ -8,22 +11,46 @@ from ckan.plugins import toolkit
 
 import ckanext.dcat.converters as converters
 
-from ckanext.dcat.processors import RDFSerializer
+from ckanext.dcat.processors import (RDFSerializer,
+                                     SERIALIZER_ENDPOINT_WORKERS_CONFIG_OPTION)
+from ckanext.dcat.utils import prefetch_dataset_ids
+from ckanext.dcat.cache import last_catalog_modification
 
 
 DATASETS_PER_PAGE = 100
 
+# Value of the `cursor` param that requests the first page in cursor mode
+CURSOR_START = '*'
+
 wrong_page_exception = toolkit.ValidationError(
     'Page param must be a positive integer starting in 1')
 
+wrong_cursor_exception = toolkit.ValidationError(
+    'Wrong cursor param. Use "*" for the first page and the values returned '
+    'on hydra:nextPage for the following ones')
+
+iso_datetime_re = re.compile(
+    r'^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d+)?$')
+
 
 def dcat_dataset_show(context, data_dict):
+    '''
+    Returns an RDF serialization of a dataset
+
+    Internal callers that already retrieved the dataset (like the DCAT
+    controller) can pass it in the `dataset_dict` context key to avoid
+    calling `package_show` again.
+    '''
 
     toolkit.check_access('dcat_dataset_show', context, data_dict)
 
-    dataset_dict = toolkit.get_action('package_show')(context, data_dict)
+    dataset_dict = context.get('dataset_dict')
+    if dataset_dict is None:
+        dataset_dict = toolkit.get_action('package_show')(context, data_dict)
 
     serializer = RDFSerializer()
+    if data_dict.get('wkt') in ['false', 'False']:
+        serializer.include_wkt = False
 
     output = serializer.serialize_dataset(dataset_dict,
                                           _format=data_dict.get('format'))
@@ -40,14 +67,13 @@ def dcat_catalog_show(context, data_dict):
     dataset_dicts = query['results']
     pagination_info = _pagination_info(query, data_dict)
 
-    serializer = RDFSerializer()
+    serializer = RDFSerializer(workers=_endpoint_workers())
     serializer.validation_mode = data_dict.get('validation_mode') in ['true', 'True']
+    if data_dict.get('wkt') in ['false', 'False']:
+        serializer.include_wkt = False
 
-    output = serializer.serialize_catalog({}, dataset_dicts,
-                                          _format=data_dict.get('format'),
-                                          pagination_info=pagination_info)
-
-    return output
+    return _serialize_catalog(context, serializer, dataset_dicts,
+                              data_dict.get('format'), pagination_info)
 
 
 @toolkit.side_effect_free
@@ -60,13 +86,10 @@ def dcat_catalog_search(context, data_dict):
     dataset_dicts = query['results']
     pagination_info = _pagination_info(query, data_dict)
 
-    serializer = RDFSerializer()
-
-    output = serializer.serialize_catalog({}, dataset_dicts,
-                                          _format=data_dict.get('format'),
-                                          pagination_info=pagination_info)
+    serializer = RDFSerializer(workers=_endpoint_workers())
 
-    return output
+    return _serialize_catalog(context, serializer, dataset_dicts,
+                              data_dict.get('format'), pagination_info)
 
 
 @toolkit.side_effect_free
@@ -80,7 +103,148 @@ def dcat_datasets_list(context, data_dict):
             for ckan_dataset in ckan_datasets]
 
 
-def _search_ckan_datasets(context, data_dict):
+def _endpoint_workers():
+    '''
+    Returns the number of processes used to serialize catalog pages, as
+    defined by the `ckanext.dcat.serializer.endpoint_workers` option
+
+    Defaults to 0, as worker processes are forked from the web server
+    process on each request.
+    '''
+    return int(config.get(SERIALIZER_ENDPOINT_WORKERS_CONFIG_OPTION, 0))
+
+
+def _serialize_catalog(context, serializer, dataset_dicts, _format,
+                       pagination_info):
+    '''
+    Serializes the catalog page, optionally as a stream
+
+    If `stream` is set on the context, an iterable that yields the
+    serialization in chunks is returned (see
+    `RDFSerializer.serialize_catalog_stream`), otherwise a string.
+
+    Note that the streamed output can not be returned via the action API, as
+    it is not JSON serializable. It is meant for internal callers like the
+    DCAT controller.
+    '''
+    prefetch_dataset_ids(dataset_dicts)
+
+    if context.get('stream'):
+        return serializer.serialize_catalog_stream(
+            {}, dataset_dicts, _format=_format,
+            pagination_info=pagination_info)
+
+    return serializer.serialize_catalog({}, dataset_dicts,
+                                        _format=_format,
+                                        pagination_info=pagination_info)
+
+
+def catalog_page_modified(context, data_dict, include_catalog=True):
+    '''
+    Returns the values that determine whether a catalog page has changed,
+    without retrieving or serializing the actual datasets
+
+    `data_dict` contains the same params as `dcat_catalog_show`. Returns a
+    dict with the following keys:
+
+    * `count`: number of datasets matching the request
+    * `page_modified`: most recent `metadata_modified` value of the datasets
+      on the requested page
+    * `catalog_modified`: most recent `metadata_modified` value on the whole
+      catalog (used on the catalog `dct:modified` property). Only queried if
+      `include_catalog` is True.
+
+    Dates are None if there are no matching datasets.
+    '''
+    query = _search_ckan_datasets(context, data_dict, rows=1)
+
+    page_modified = None
+    if query['results']:
+        page_modified = query['results'][0]['metadata_modified']
+
+        if data_dict.get('cursor'):
+            # Cursor pages are sorted oldest first, so the most recent
+            # dataset is the last one on the page
+            n = int(config.get('ckanext.dcat.datasets_per_page',
+                               DATASETS_PER_PAGE))
+            last = min(n, query['count']) - 1
+            if last > 0:
+                last_query = _search_ckan_datasets(context, data_dict,
+                                                   rows=1, offset=last)
+                if last_query['results']:
+                    page_modified = \
+                        last_query['results'][0]['metadata_modified']
+
+    catalog_modified = None
+    if include_catalog:
+        catalog_modified = last_catalog_modification()
+
+    return {
+        'count': query['count'],
+        'page_modified': page_modified,
+        'catalog_modified': catalog_modified,
+    }
+
+
+def _encode_cursor(dataset_dict):
+    '''
+    Returns the continuation token pointing to the datasets after the
+    provided one
+    '''
+    value = json.dumps([dataset_dict['metadata_modified'], dataset_dict['id']])
+    return base64.urlsafe_b64encode(value).rstrip('=')
+
+
+def _decode_cursor(cursor):
+    '''
+    Returns the `metadata_modified` and `id` values encoded on a continuation
+    token
+
+    Raises a ValidationError if the token is not valid
+    '''
+    try:
+        cursor = str(cursor)
+        value = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        metadata_modified, dataset_id = json.loads(value)
+    except (TypeError, ValueError, UnicodeEncodeError):
+        raise wrong_cursor_exception
+
+    if not isinstance(metadata_modified, basestring) or \
+            not iso_datetime_re.match(metadata_modified) or \
+            not isinstance(dataset_id, basestring):
+        raise wrong_cursor_exception
+
+    return metadata_modified, dataset_id
+
+
+def _cursor_filter(cursor):
+    '''
+    Returns a Solr filter query for the datasets sorted after the one the
+    cursor points to, using `metadata_modified` and `id` as tiebreaker
+    '''
+    metadata_modified, dataset_id = _decode_cursor(cursor)
+    metadata_modified = metadata_modified + 'Z'
+    dataset_id = dataset_id.replace('\\', '\\\\').replace('"', '\\"')
+
+    return ('metadata_modified:{{{0} TO *] OR '
+            '(metadata_modified:"{0}" AND id:{{"{1}" TO *])').format(
+                metadata_modified, dataset_id)
+
+
+def _search_ckan_datasets(context, data_dict, rows=None, offset=0):
+    '''
+    Returns the `package_search` results for the requested page
+
+    If `rows` is provided only that number of datasets from the start of the
+    page (skipping the first `offset` ones) are returned.
+
+    If a `cursor` param is provided, datasets are returned in a stable order
+    (oldest modified first, using the id as tiebreaker) starting after the
+    dataset the cursor points to, instead of using `page`. This avoids the
+    cost of deep paging on Solr and datasets being skipped or repeated when
+    the catalog changes while being crawled. The token for the following
+    page is returned in the `next_cursor` key (None on the last page).
+    '''
 
     n = int(config.get('ckanext.dcat.datasets_per_page', DATASETS_PER_PAGE))
     page = data_dict.get('page', 1) or 1
@@ -100,11 +264,20 @@ def _search_ckan_datasets(context, data_dict):
             raise toolkit.ValidationError(
                 'Wrong modified date format. Use ISO-8601 format')
 
-    search_data_dict = {
-        'rows': n,
-        'start': n * (page - 1),
-        'sort': 'metadata_modified desc',
-    }
+    cursor = data_dict.get('cursor')
+
+    if cursor:
+        search_data_dict = {
+            'rows': rows or n,
+            'start': offset,
+            'sort': 'metadata_modified asc, id asc',
+        }
+    else:
+        search_data_dict = {
+            'rows': rows or n,
+            'start': n * (page - 1) + offset,
+            'sort': 'metadata_modified desc',
+        }
 
     search_data_dict['q'] = data_dict.get('q', '*:*')
     search_data_dict['fq'] = data_dict.get('fq')
@@ -118,8 +291,16 @@ def _search_ckan_datasets(context, data_dict):
         search_data_dict['fq_list'].append(
             'metadata_modified:[{0} TO NOW]'.format(modified_since))
 
+    if cursor and cursor != CURSOR_START:
+        search_data_dict['fq_list'].append(_cursor_filter(cursor))
+
     query = toolkit.get_action('package_search')(context, search_data_dict)
 
+    if cursor:
+        query['next_cursor'] = None
+        if query['results'] and query['count'] > len(query['results']):
+            query['next_cursor'] = _encode_cursor(query['results'][-1])
+
     return query
 
 
@@ -140,26 +321,50 @@ def _pagination_info(query, data_dict):
     * `next`
     * `previous`
 
+    In cursor mode (see `_search_ckan_datasets`) there are no `last` and
+    `previous` pages, `next` contains the continuation token and `count` is
+    only included on the first page.
+
     Returns a dict
     '''
 
-    def _page_url(page):
+    def _page_url(page, param='page'):
 
         params = [p for p in toolkit.request.params.iteritems()
-                  if p[0] != 'page']
+                  if p[0] not in ('page', 'cursor')]
         if params:
             qs = '&'.join(['{0}={1}'.format(p[0], p[1]) for p in params])
-            return '{0}?{1}&page={2}'.format(
+            return '{0}?{1}&{2}={3}'.format(
                 toolkit.request.path_url,
                 qs,
+                param,
                 page
             )
         else:
-            return '{0}?page={1}'.format(
+            return '{0}?{1}={2}'.format(
                 toolkit.request.path_url,
+                param,
                 page
             )
 
+    cursor = data_dict.get('cursor')
+    if cursor:
+        if query['count'] == 0:
+            return {}
+
+        pagination_info = {
+            'items_per_page': int(config.get('ckanext.dcat.datasets_per_page',
+                                             DATASETS_PER_PAGE)),
+            'current': _page_url(cursor, 'cursor'),
+            'first': _page_url(CURSOR_START, 'cursor'),
+        }
+        if cursor == CURSOR_START:
+            pagination_info['count'] = query['count']
+        if query.get('next_cursor'):
+            pagination_info['next'] = _page_url(query['next_cursor'],
+                                                'cursor')
+        return pagination_info
+
     try:
         page = int(data_dict.get('page', 1) or 1)
         if page < 1:
@@ -1,6 +1,10 @@
+import datetime
+
 from pylons import config
+from sqlalchemy import event
 
 from ckan import plugins as p
+from ckan import model
 
 from ckanext.dcat.logic import (dcat_dataset_show,
                                 dcat_catalog_show,
@@ -9,6 +13,7 @@ from ckanext.dcat.logic import (dcat_dataset_show,
                                 dcat_auth,
                                 )
 from ckanext.dcat.utils import catalog_uri
+from ckanext.dcat.cache import invalidate_last_catalog_modification
 
 
 DEFAULT_CATALOG_ENDPOINT = '/catalog.{_format}'
@@ -22,6 +27,7 @@ class DCATPlugin(p.SingletonPlugin):
     p.implements(p.IRoutes, inherit=True)
     p.implements(p.IActions, inherit=True)
     p.implements(p.IAuthFunctions, inherit=True)
+    p.implements(p.IPackageController, inherit=True)
 
     # IConfigurer
     def update_config(self, config):
@@ -51,11 +57,14 @@ class DCATPlugin(p.SingletonPlugin):
                      config.get('ckanext.dcat.catalog_endpoint',
                                 DEFAULT_CATALOG_ENDPOINT),
                      controller=controller, action='read_catalog',
-                     requirements={'_format': 'xml|rdf|n3|ttl|jsonld'})
+                     requirements={'_format': 'xml|rdf|n3|ttl|nt|jsonld'})
 
         _map.connect('dcat_dataset', '/dataset/{_id}.{_format}',
                      controller=controller, action='read_dataset',
-                     requirements={'_format': 'xml|rdf|n3|ttl|jsonld'})
+                     requirements={'_format': 'xml|rdf|n3|ttl|nt|jsonld'})
+
+        _map.connect('dcat_jsonld_context', '/dcat/context.jsonld',
+                     controller=controller, action='jsonld_context')
 
         if p.toolkit.asbool(config.get(ENABLE_CONTENT_NEGOTIATION_CONFIG)):
 
@@ -84,6 +93,49 @@ class DCATPlugin(p.SingletonPlugin):
             'dcat_catalog_search': dcat_auth,
         }
 
+    # IPackageController
+    def after_create(self, context, data_dict):
+        _invalidate_after_commit()
+
+    def after_update(self, context, data_dict):
+        _invalidate_after_commit()
+
+    def after_delete(self, context, data_dict):
+        _touch_deleted_dataset(data_dict)
+        _invalidate_after_commit()
+
+
+def _touch_deleted_dataset(data_dict):
+    '''
+    Updates the `metadata_modified` value of a dataset being deleted
+
+    Deleted datasets are not returned by the search, so otherwise the
+    catalog modification date (used eg on the Last-Modified header) would
+    not change when a dataset is removed from it.
+    '''
+    dataset = model.Package.get(data_dict.get('id'))
+    if dataset:
+        dataset.metadata_modified = datetime.datetime.utcnow()
+
+
+def _invalidate_after_commit():
+    '''
+    Invalidates the cached catalog modification date once the current
+    session is committed
+
+    The IPackageController hooks are called before the changes are committed
+    and the search index is updated, so invalidating the value straight away
+    would allow requests in between to cache the previous date again.
+    '''
+    session = model.Session()
+    if not getattr(session, '_dcat_invalidate_on_commit', False):
+        event.listen(session, 'after_commit', _after_commit)
+        session._dcat_invalidate_on_commit = True
+
+
+def _after_commit(session):
+    invalidate_last_catalog_modification()
+
 
 class DCATJSONInterface(p.SingletonPlugin):
 
@@ -1,5 +1,10 @@
+import os
 import sys
 import argparse
+import threading
+import weakref
+import itertools
+import multiprocessing
 import xml
 import json
 from pkg_resources import iter_entry_points
@@ -13,7 +18,18 @@ from rdflib.namespace import Namespace, RDF
 
 import ckan.plugins as p
 
-from ckanext.dcat.utils import catalog_uri, dataset_uri, url_to_rdflib_format
+from ckanext.dcat.utils import (catalog_uri, dataset_uri,
+                                url_to_rdflib_format, prefetch_dataset_ids,
+                                dataset_id_from_resource)
+from ckanext.dcat.cache import get_fragment_cache
+from ckanext.dcat.writers import WRITE_ONLY_GRAPHS
+from ckanext.dcat.jsonld import (JSONLDWriter, get_jsonld_writer,
+                                 JSONLD_FRAGMENT, JSONLD_FLAT_FRAGMENT)
+from ckanext.dcat.streaming import (PartitionedTriples, PARTITIONED_FORMATS,
+                                    NQUADS_FORMATS, partitions_for_size)
+from ckanext.dcat.subgraph import (dataset_subgraph, subgraph_uri_depth,
+                                   use_subgraphs, parse_dataset_subgraph)
+from ckanext.dcat.stores import new_graph, RDF_STORE_CONFIG, DEFAULT_STORE
 
 
 HYDRA = Namespace('http://www.w3.org/ns/hydra/core#')
@@ -22,9 +38,24 @@ DCAT = Namespace("http://www.w3.org/ns/dcat#")
 RDF_PROFILES_ENTRY_POINT_GROUP = 'ckan.rdf.profiles'
 RDF_PROFILES_CONFIG_OPTION = 'ckanext.dcat.rdf.profiles'
 COMPAT_MODE_CONFIG_OPTION = 'ckanext.dcat.compatibility_mode'
+WRITE_ONLY_GRAPH_CONFIG_OPTION = 'ckanext.dcat.write_only_graph'
+SERIALIZER_WORKERS_CONFIG_OPTION = 'ckanext.dcat.serializer.workers'
+SERIALIZER_ENDPOINT_WORKERS_CONFIG_OPTION = \
+    'ckanext.dcat.serializer.endpoint_workers'
+SERIALIZER_CHUNK_SIZE_CONFIG_OPTION = 'ckanext.dcat.serializer.chunk_size'
+PARSER_WORKERS_CONFIG_OPTION = 'ckanext.dcat.parser.workers'
+PARSER_CHUNK_SIZE_CONFIG_OPTION = 'ckanext.dcat.parser.chunk_size'
 
 DEFAULT_RDF_PROFILES = ['euro_dcat_ap']
 
+# Number of datasets sent to each serializer worker process at a time
+DEFAULT_SERIALIZER_CHUNK_SIZE = 20
+DEFAULT_PARSER_CHUNK_SIZE = 20
+
+# rdflib formats whose serializations can be concatenated into a valid
+# document, and thus can be written out one dataset at a time
+STREAMING_FORMATS = ('nt', 'turtle', 'n3')
+
 
 class RDFParserException(Exception):
     pass
@@ -34,6 +65,92 @@ class RDFProfileException(Exception):
     pass
 
 
+class RDFProfileRegistry(object):
+    '''
+    Process-wide registry of RDF profiles
+
+    Profiles are registered on ``entry_points`` in setup.py, under the
+    ``[ckan.rdf.profiles]`` group. Each list of profile names is resolved
+    only once, and the resulting profile classes are reused by all the
+    parsers and serializers created afterwards.
+
+    When a profile class is first loaded its `name` attribute is set to the
+    name it was registered with.
+
+    Profiles can also be registered programmatically (eg on tests) with
+    `register`, and `reset` forgets all loaded profiles so they are looked
+    up again on the next request.
+    '''
+
+    def __init__(self, group=RDF_PROFILES_ENTRY_POINT_GROUP):
+        self.group = group
+        self._profiles = {}
+        self._profile_lists = {}
+        self._lock = threading.RLock()
+
+    def register(self, name, profile_class):
+        '''
+        Registers a profile class under the provided name, overriding any
+        entry point with the same name
+        '''
+        with self._lock:
+            profile_class.name = name
+            self._profiles[name] = profile_class
+            self._profile_lists = {}
+
+    def get_profile(self, name):
+        '''
+        Returns the profile class registered with the provided name, or None
+        if not found
+        '''
+        with self._lock:
+            if name not in self._profiles:
+                for entry_point in iter_entry_points(group=self.group,
+                                                     name=name):
+                    profile_class = entry_point.load()
+                    # Set a reference to the profile name
+                    profile_class.name = entry_point.name
+                    self._profiles[name] = profile_class
+                    break
+            return self._profiles.get(name)
+
+    def get_profiles(self, profile_names):
+        '''
+        Returns a list with the profile classes for the provided names, in the
+        same order
+
+        Raises RDFProfileException if any of the profiles is not found
+        '''
+        key = tuple(profile_names)
+        with self._lock:
+            if key not in self._profile_lists:
+                profiles = []
+                unknown_profiles = []
+                for profile_name in profile_names:
+                    profile_class = self.get_profile(profile_name)
+                    if profile_class:
+                        profiles.append(profile_class)
+                    else:
+                        unknown_profiles.append(profile_name)
+
+                if unknown_profiles:
+                    raise RDFProfileException(
+                        'Unknown RDF profiles: {0}'.format(
+                            ', '.join(sorted(set(unknown_profiles)))))
+
+                self._profile_lists[key] = profiles
+
+            return list(self._profile_lists[key])
+
+    def reset(self):
+        with self._lock:
+            self._profiles = {}
+            self._profile_lists = {}
+
+
+profile_registry = RDFProfileRegistry()
+
+
 class RDFProcessor(object):
 
     def __init__(self, profiles=None, compatibility_mode=False):
@@ -64,36 +181,56 @@ class RDFProcessor(object):
                 config.get(COMPAT_MODE_CONFIG_OPTION, False))
         self.compatibility_mode = compatibility_mode
 
-        self.g = rdflib.Graph()
+        # Uses the store set in `ckanext.dcat.rdf.store`
+        self.g = new_graph()
+
+        self._profile_instances = None
+        self._profile_instances_graph = None
+        self._profile_instances_classes = None
+        # Graphs the profiles have already bound their namespaces to
+        self._bound_graphs = weakref.WeakSet()
 
     def _load_profiles(self, profile_names):
         '''
-        Loads the specified RDF parser profiles
+        Returns the classes for the specified RDF profiles
 
-        These are registered on ``entry_points`` in setup.py, under the
-        ``[ckan.rdf.profiles]`` group.
+        Profiles are resolved by the process-wide `profile_registry`.
         '''
-        profiles = []
-        loaded_profiles_names = []
+        return profile_registry.get_profiles(profile_names)
 
-        for profile_name in profile_names:
-            for profile in iter_entry_points(
-                    group=RDF_PROFILES_ENTRY_POINT_GROUP,
-                    name=profile_name):
-                profile_class = profile.load()
-                # Set a reference to the profile name
-                profile_class.name = profile.name
-                profiles.append(profile_class)
-                loaded_profiles_names.append(profile.name)
-                break
+    def _profile_names(self):
+        return [getattr(profile, 'name', profile.__name__)
+                for profile in self._profiles]
 
-        unknown_profiles = set(profile_names) - set(loaded_profiles_names)
-        if unknown_profiles:
-            raise RDFProfileException(
-                'Unknown RDF profiles: {0}'.format(
-                    ', '.join(sorted(unknown_profiles))))
+    def _get_profiles(self, bind_namespaces=True):
+        '''
+        Returns instances of the loaded profiles for the current graph
+
+        Profiles are instantiated once and reused for all datasets and
+        graphs. If the graph (`self.g`) changes, the instances are pointed to
+        the new one, and their `bind_namespaces` method is called the first
+        time each graph is used, unless `bind_namespaces` is False. New
+        instances are only created if the list of profiles changes.
+        '''
+        if (self._profile_instances is None or
+                self._profile_instances_classes != self._profiles):
+            self._profile_instances = [
+                profile_class(self.g, self.compatibility_mode)
+                for profile_class in self._profiles]
+            self._profile_instances_classes = list(self._profiles)
+            self._profile_instances_graph = None
 
-        return profiles
+        if self._profile_instances_graph is not self.g:
+            for profile in self._profile_instances:
+                profile.g = self.g
+            self._profile_instances_graph = self.g
+
+        if bind_namespaces and self.g not in self._bound_graphs:
+            for profile in self._profile_instances:
+                profile.bind_namespaces()
+            self._bound_graphs.add(self.g)
+
+        return self._profile_instances
 
 
 class RDFParser(RDFProcessor):
@@ -104,6 +241,31 @@ class RDFParser(RDFProcessor):
     CKAN dicts from the RDF graph.
     '''
 
+    def __init__(self, profiles=None, compatibility_mode=False, workers=0):
+        '''
+        Creates a parser instance
+
+        Check `RDFProcessor` for details about the `profiles` and
+        `compatibility_mode` parameters.
+
+        If `workers` is greater than 1, datasets are parsed on a pool of
+        worker processes. See `datasets` for details. This forks the current
+        process, so it should only be used from the harvesters or the command
+        line, which read it from the `ckanext.dcat.parser.workers`
+        configuration option.
+        '''
+        super(RDFParser, self).__init__(profiles, compatibility_mode)
+
+        # Set when the last source was parsed in streaming mode
+        self._partitions = None
+
+        # Whether to run the profiles on a separate graph for each dataset
+        self.subgraphs = use_subgraphs()
+
+        self.workers = int(workers or 0)
+        self.chunk_size = int(config.get(PARSER_CHUNK_SIZE_CONFIG_OPTION,
+                                         DEFAULT_PARSER_CHUNK_SIZE))
+
     def _datasets(self):
         '''
         Generator that returns all DCAT datasets on the graph
@@ -114,7 +276,7 @@ class RDFParser(RDFProcessor):
         for dataset in self.g.subjects(RDF.type, DCAT.Dataset):
             yield dataset
 
-    def parse(self, data, _format=None):
+    def parse(self, data, _format=None, streaming=False):
         '''
         Parses and RDF graph serialization and into the class graph
 
@@ -124,6 +286,13 @@ class RDFParser(RDFProcessor):
         ... ). By default RF/XML is expected. The optional parameter _format
         can be used to tell rdflib otherwise.
 
+        If `streaming` is True, N-Triples and N-Quads sources are not loaded
+        into the class graph. Statements are written to disk partitioned by
+        subject instead (see `ckanext.dcat.streaming.PartitionedTriples`),
+        and `datasets()` builds a separate graph for each dataset, so memory
+        usage is bounded by the size of the largest dataset rather than the
+        whole source. In this mode `data` can also be a file-like object.
+
         It raises a ``RDFParserException`` if there was some error during
         the parsing.
 
@@ -134,6 +303,14 @@ class RDFParser(RDFProcessor):
         if _format == 'pretty-xml':
             _format = 'xml'
 
+        if self._partitions is not None:
+            self._partitions.close()
+            self._partitions = None
+
+        if streaming:
+            self._parse_partitioned(data, _format)
+            return
+
         try:
             self.g.parse(data=data, format=_format)
         # Apparently there is no single way of catching exceptions from all
@@ -145,6 +322,30 @@ class RDFParser(RDFProcessor):
 
             raise RDFParserException(e)
 
+    def _parse_partitioned(self, data, _format):
+        if _format not in PARTITIONED_FORMATS:
+            raise RDFParserException(
+                'Streaming parse is only supported for N-Triples and '
+                'N-Quads, not {0}'.format(_format))
+
+        if isinstance(data, basestring):
+            size = len(data)
+        else:
+            try:
+                size = os.fstat(data.fileno()).st_size
+            except (AttributeError, OSError, ValueError):
+                size = None
+
+        partitions = PartitionedTriples(partitions_for_size(size))
+        try:
+            partitions.add(data, nquads=(_format in NQUADS_FORMATS))
+            partitions.index()
+        except ValueError, e:
+            partitions.close()
+            raise RDFParserException(e)
+
+        self._partitions = partitions
+
     def supported_formats(self):
         '''
         Returns a list of all formats supported by this processor.
@@ -153,24 +354,135 @@ class RDFParser(RDFProcessor):
                        for plugin
                        in rdflib.plugin.plugins(kind=rdflib.parser.Parser)])
 
-    def datasets(self):
+    def datasets(self, ordered=True):
         '''
         Generator that returns CKAN datasets parsed from the RDF graph
 
         Each dataset is passed to all the loaded profiles before being
         yielded, so it can be further modified by each one of them.
 
+        If the `ckanext.dcat.parser.subgraphs` option is enabled, the
+        profiles are run on a graph containing just the statements describing
+        each dataset (see `dataset_subgraphs`), which is the class graph while
+        the dataset is parsed. This is always the case when parsing in
+        streaming mode.
+
+        If `workers` is greater than 1, the dataset subgraphs are sent in
+        chunks of `chunk_size` datasets (defaults to the
+        `ckanext.dcat.parser.chunk_size` configuration option, 20) to a pool
+        of worker processes, each one loading the profiles once. Datasets are
+        returned in the same order as on the graph, unless `ordered` is
+        False, in which case chunks are returned as soon as they are parsed.
+        If there are not enough datasets to fill more than one chunk they are
+        parsed on this process.
+
         Returns a dataset dict that can be passed to eg `package_create`
         or `package_update`
         '''
-        for dataset_ref in self._datasets():
-            dataset_dict = {}
-            for profile_class in self._profiles:
-                profile = profile_class(self.g, self.compatibility_mode)
-                profile.parse_dataset(dataset_dict, dataset_ref)
-
+        if self.workers > 1:
+            for dataset_dict in self._parallel_datasets(ordered):
+                yield dataset_dict
+            return
+
+        if self._partitions is None and not self.subgraphs:
+            profiles = self._get_profiles()
+            for dataset_ref in self._datasets():
+                yield self._parse_dataset(dataset_ref, profiles)
+            return
+
+        for dataset_dict in self._subgraphs_datasets(
+                self.dataset_subgraphs()):
             yield dataset_dict
 
+    def _subgraphs_datasets(self, subgraphs):
+        graph = self.g
+        try:
+            for dataset_ref, subgraph in subgraphs:
+                self.g = subgraph
+                # Prefixes are not needed to parse the dataset graphs
+                yield self._parse_dataset(
+                    dataset_ref, self._get_profiles(bind_namespaces=False))
+        finally:
+            self.g = graph
+
+    def _parallel_datasets(self, ordered):
+        '''
+        Parses the dataset subgraphs on a pool of worker processes
+
+        Subgraphs are serialized as N-Triples and sent to the pool in
+        batches, each one submitted before the results of the previous one
+        are returned, so workers are kept busy while they are consumed and
+        only a couple of batches are held in memory.
+        '''
+        chunks = _batches(self.dataset_subgraphs(), self.chunk_size)
+        first_chunk = next(chunks, [])
+        second_chunk = next(chunks, None)
+        if second_chunk is None:
+            for dataset_dict in self._subgraphs_datasets(first_chunk):
+                yield dataset_dict
+            return
+
+        chunks = itertools.chain([first_chunk, second_chunk], chunks)
+        batches = _batches(chunks, self.workers)
+
+        pool = multiprocessing.Pool(
+            self.workers, _init_parser_worker,
+            (self._profile_names(), self.compatibility_mode))
+        try:
+            imap = pool.imap if ordered else pool.imap_unordered
+            pending = None
+            for batch in batches:
+                submitted = imap(
+                    _parse_datasets_chunk,
+                    [[(dataset_ref.n3(), subgraph.serialize(format='nt'))
+                      for dataset_ref, subgraph in chunk]
+                     for chunk in batch])
+                if pending:
+                    for dataset_dicts in pending:
+                        for dataset_dict in dataset_dicts:
+                            yield dataset_dict
+                pending = submitted
+            if pending:
+                for dataset_dicts in pending:
+                    for dataset_dict in dataset_dicts:
+                        yield dataset_dict
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def _parse_dataset(self, dataset_ref, profiles):
+        dataset_dict = {}
+        for profile in profiles:
+            profile.before_dataset()
+            profile.parse_dataset(dataset_dict, dataset_ref)
+        return dataset_dict
+
+    def dataset_subgraphs(self):
+        '''
+        Generator that returns a separate graph for each DCAT dataset
+
+        Each graph holds the concise bounded description of the dataset: its
+        statements, and those of its distributions, blank nodes and linked
+        URI nodes up to the depth set in the
+        `ckanext.dcat.parser.subgraph_uri_depth` option (see
+        `ckanext.dcat.subgraph.dataset_subgraph`). They can be hashed with
+        `ckanext.dcat.subgraph.graph_hash` to detect changes on a dataset.
+
+        Yields tuples with the dataset reference and its graph
+        '''
+        uri_depth = subgraph_uri_depth()
+
+        if self._partitions is not None:
+            for subject in self._partitions.datasets:
+                yield parse_dataset_subgraph(
+                    subject,
+                    ''.join(self._partitions.closure(subject, uri_depth)))
+            return
+
+        graph = self.g
+        for dataset_ref in graph.subjects(RDF.type, DCAT.Dataset):
+            yield dataset_ref, dataset_subgraph(graph, dataset_ref, uri_depth)
+
 
 class RDFSerializer(RDFProcessor):
     '''
@@ -179,6 +491,53 @@ class RDFSerializer(RDFProcessor):
     Supports different profiles which are the ones that will generate
     the RDF graph.
     '''
+
+    def __init__(self, profiles=None, compatibility_mode=False,
+                 fragment_cache=None, workers=0):
+        '''
+        Creates a serializer instance
+
+        Check `RDFProcessor` for details about the `profiles` and
+        `compatibility_mode` parameters.
+
+        `fragment_cache` is a `ckanext.dcat.cache.FragmentCache` instance
+        used to store the serialized triples of each dataset when serializing
+        catalogs. If not provided, the one defined in the configuration (if
+        any) will be used.
+
+        If `write_only_graph` is set (defaults to the
+        `ckanext.dcat.write_only_graph` configuration option), catalogs
+        requested in formats supported by `ckanext.dcat.writers` are
+        written directly as triples are added, rather than being stored on
+        an rdflib graph first. This requires that the profiles do not query
+        the graph when serializing.
+
+        If `workers` is greater than 1, the datasets of catalogs are
+        serialized on a pool of worker processes. See
+        `serialize_datasets_fragments` for details. This forks the current
+        process, so by default it is only used when generating catalog dumps
+        from the command line (which reads it from the
+        `ckanext.dcat.serializer.workers` configuration option). The catalog
+        endpoints use the `ckanext.dcat.serializer.endpoint_workers` one,
+        which defaults to 0.
+        '''
+        super(RDFSerializer, self).__init__(profiles, compatibility_mode)
+
+        self.fragment_cache = fragment_cache or get_fragment_cache()
+
+        self.write_only_graph = p.toolkit.asbool(
+            config.get(WRITE_ONLY_GRAPH_CONFIG_OPTION, False))
+
+        # Overrides the `ckanext.dcat.geometry.wkt` option if set
+        self.include_wkt = None
+
+        # Reused for the graphs of single datasets (see `_dataset_graph`)
+        self._dataset_g = None
+
+        self.workers = int(workers or 0)
+        self.chunk_size = int(config.get(SERIALIZER_CHUNK_SIZE_CONFIG_OPTION,
+                                         DEFAULT_SERIALIZER_CHUNK_SIZE))
+
     def _add_pagination_triples(self, paging_info):
         '''
         Adds pagination triples to the graph using the paging info provided
@@ -228,19 +587,14 @@ class RDFSerializer(RDFProcessor):
         Returns the reference to the dataset, which will be an rdflib URIRef.
         '''
 
-        uri_value = dataset_dict.get('uri')
-        if not uri_value:
-            for extra in dataset_dict.get('extras', []):
-                if extra['key'] == 'uri':
-                    uri_value = extra['value']
-                    break
-
         dataset_ref = URIRef(dataset_uri(dataset_dict))
 
-        for profile_class in self._profiles:
-            profile = profile_class(self.g, self.compatibility_mode)
+        for profile in self._get_profiles():
             if hasattr(self, 'validation_mode'):
                 profile.validation_mode = self.validation_mode
+            if hasattr(self, 'include_wkt'):
+                profile.include_wkt = self.include_wkt
+            profile.before_dataset()
             profile.graph_from_dataset(dataset_dict, dataset_ref)
 
         return dataset_ref
@@ -257,12 +611,265 @@ class RDFSerializer(RDFProcessor):
 
         catalog_ref = URIRef(catalog_uri())
 
-        for profile_class in self._profiles:
-            profile = profile_class(self.g, self.compatibility_mode)
+        for profile in self._get_profiles():
             profile.graph_from_catalog(catalog_dict, catalog_ref)
 
         return catalog_ref
 
+    def _use_write_only_graph(self, _format):
+        return self.write_only_graph and _format in WRITE_ONLY_GRAPHS
+
+    def _use_fragment_cache(self):
+        # Validation mode output and geometry settings for a particular
+        # request are not stored, as they differ from the standard output
+        return (self.fragment_cache is not None and
+                not getattr(self, 'validation_mode', False) and
+                self.include_wkt is None)
+
+    def _dataset_graph(self, dataset_dict):
+        '''
+        Creates a separate graph for a CKAN dataset dict
+
+        The class graph is left untouched. The same graph is cleared and
+        reused for every dataset, so the profiles only bind their namespaces
+        to it once. It must be consumed before calling this method again.
+
+        Returns a tuple with the reference to the dataset and the graph
+        '''
+        if self._dataset_g is None:
+            self._dataset_g = rdflib.Graph()
+        else:
+            self._dataset_g.remove((None, None, None))
+
+        graph = self.g
+        self.g = self._dataset_g
+        try:
+            dataset_ref = self.graph_from_dataset(dataset_dict)
+            dataset_graph = self.g
+        finally:
+            self.g = graph
+
+        return dataset_ref, dataset_graph
+
+    def _dataset_fragment(self, dataset_dict, _format):
+        '''
+        Returns the serialized triples of a single dataset
+
+        Check `serialize_dataset_fragments` for details.
+
+        Returns a tuple with the reference to the dataset and the serialized
+        fragment
+        '''
+        dataset_ref, fragments = self.serialize_dataset_fragments(
+            dataset_dict, [_format])
+
+        return dataset_ref, fragments[_format]
+
+    def serialize_dataset_fragments(self, dataset_dict, formats):
+        '''
+        Returns the serialized triples of a single dataset in several formats
+
+        Fragments only contain the triples generated by the profiles for the
+        dataset, without any catalog or namespace information beyond the one
+        required by the format. They are meant to be combined into larger
+        documents, eg catalog pages or dumps.
+
+        If the fragment cache is enabled, previously serialized fragments
+        will be returned if the dataset has not changed. Otherwise the
+        profiles are run once, and the resulting graph is serialized to all
+        the requested formats and stored.
+
+        `formats` is a list of rdflib format names, or the JSON-LD fragment
+        formats defined in `ckanext.dcat.jsonld`.
+
+        Returns a tuple with the reference to the dataset and a dict with the
+        serialized fragments keyed by format
+        '''
+        fragments = self._cached_fragments(dataset_dict, formats)
+        if len(fragments) == len(formats):
+            return URIRef(dataset_uri(dataset_dict)), fragments
+
+        dataset_ref, dataset_graph = self._dataset_graph(dataset_dict)
+
+        new_fragments = {}
+        for _format in formats:
+            if _format in fragments:
+                continue
+            if _format in (JSONLD_FRAGMENT, JSONLD_FLAT_FRAGMENT):
+                writer = JSONLDWriter(frame=(_format == JSONLD_FRAGMENT))
+                new_fragments[_format] = writer.fragment(dataset_graph,
+                                                         dataset_ref)
+            else:
+                new_fragments[_format] = dataset_graph.serialize(
+                    format=_format)
+
+        self._store_fragments(dataset_dict, new_fragments)
+        fragments.update(new_fragments)
+
+        return dataset_ref, fragments
+
+    def _cached_fragments(self, dataset_dict, formats):
+        '''
+        Returns a dict with the fragments for a dataset found on the fragment
+        cache, keyed by format
+        '''
+        fragments = {}
+        if self._use_fragment_cache():
+            profile_names = self._profile_names()
+            for _format in formats:
+                fragment = self.fragment_cache.get(
+                    dataset_dict, profile_names, _format)
+                if fragment is not None:
+                    fragments[_format] = fragment
+        return fragments
+
+    def _store_fragments(self, dataset_dict, fragments):
+        if fragments and self._use_fragment_cache():
+            profile_names = self._profile_names()
+            for _format, fragment in fragments.iteritems():
+                self.fragment_cache.set(dataset_dict, profile_names,
+                                        _format, fragment)
+
+    def serialize_datasets_fragments(self, dataset_dicts, formats):
+        '''
+        Generator that returns the serialized triples of several datasets
+
+        Check `serialize_dataset_fragments` for details about the fragments
+        and the `formats` parameter.
+
+        If `workers` is greater than 1, datasets are split in chunks of
+        `chunk_size` datasets (defaults to the
+        `ckanext.dcat.serializer.chunk_size` configuration option, 20) that
+        are serialized on a pool of worker processes, each one loading the
+        profiles once. Datasets are read from `dataset_dicts` a few chunks
+        ahead of the ones being returned, so it can be a generator. Lookups
+        on the fragment cache are still done on this process. If there are
+        not enough datasets to fill more than one chunk they are serialized
+        on this process.
+
+        Yields tuples with the dataset dict, the reference to the dataset
+        and a dict with the serialized fragments keyed by format, in the
+        same order as `dataset_dicts`
+        '''
+        dataset_dicts = dataset_dicts or []
+
+        if self.workers > 1:
+            batches = _batches(dataset_dicts, self.workers * self.chunk_size)
+            first_batch = next(batches, [])
+            if len(first_batch) > self.chunk_size:
+                for item in self._parallel_datasets_fragments(
+                        itertools.chain([first_batch], batches), formats):
+                    yield item
+                return
+            # A single chunk, which is the only batch
+            dataset_dicts = first_batch
+
+        for dataset_dict in dataset_dicts:
+            dataset_ref, fragments = self.serialize_dataset_fragments(
+                dataset_dict, formats)
+            yield dataset_dict, dataset_ref, fragments
+
+    def _parallel_datasets_fragments(self, batches, formats):
+        '''
+        Serializes batches of datasets on a pool of worker processes
+
+        Each batch is submitted to the pool before the results of the
+        previous one are returned, so workers are kept busy while they are
+        consumed.
+        '''
+        settings = {'include_wkt': self.include_wkt}
+        if hasattr(self, 'validation_mode'):
+            settings['validation_mode'] = self.validation_mode
+
+        pool = multiprocessing.Pool(
+            self.workers, _init_serializer_worker,
+            (self._profile_names(), self.compatibility_mode, settings))
+        try:
+            pending = None
+            for batch in batches:
+                submitted = self._submit_batch(pool, batch, formats)
+                if pending:
+                    for item in self._collect_batch(*pending):
+                        yield item
+                pending = submitted
+            if pending:
+                for item in self._collect_batch(*pending):
+                    yield item
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def _submit_batch(self, pool, dataset_dicts, formats):
+        cached = [self._cached_fragments(dataset_dict, formats)
+                  for dataset_dict in dataset_dicts]
+        missing = [index for index, fragments in enumerate(cached)
+                   if len(fragments) < len(formats)]
+        chunks = [missing[i:i + self.chunk_size]
+                  for i in xrange(0, len(missing), self.chunk_size)]
+
+        # Workers get plain dicts including everything needed to serialize
+        # them, so they never use the database connection inherited from
+        # this process
+        worker_dicts = _with_dataset_ids(
+            [dataset_dicts[index] for index in missing])
+        worker_dicts = dict(zip(missing, worker_dicts))
+
+        result = pool.map_async(
+            _serialize_datasets_chunk,
+            [([worker_dicts[index] for index in chunk], formats)
+             for chunk in chunks])
+
+        return dataset_dicts, cached, chunks, result
+
+    def _collect_batch(self, dataset_dicts, cached, chunks, result):
+        serialized = {}
+        for chunk, chunk_results in zip(chunks, result.get()):
+            serialized.update(zip(chunk, chunk_results))
+
+        for index, dataset_dict in enumerate(dataset_dicts):
+            if index in serialized:
+                dataset_ref, fragments = serialized[index]
+                self._store_fragments(
+                    dataset_dict,
+                    dict((_format, fragment)
+                         for _format, fragment in fragments.iteritems()
+                         if _format not in cached[index]))
+            else:
+                dataset_ref = URIRef(dataset_uri(dataset_dict))
+                fragments = cached[index]
+
+            yield dataset_dict, dataset_ref, fragments
+
+    def _graph_from_dataset_fragment(self, dataset_dict):
+        '''
+        Adds the triples for a dataset to the class graph via the fragment
+        cache
+
+        Cached fragments are parsed into the graph, while on cache misses
+        the dataset graph is created using the profiles and stored as an
+        N-Triples fragment.
+
+        Returns the reference to the dataset, which will be an rdflib URIRef.
+        '''
+        profile_names = self._profile_names()
+
+        fragment = self.fragment_cache.get(dataset_dict, profile_names, 'nt')
+        if fragment is not None:
+            self.g.parse(data=fragment, format='nt')
+            return URIRef(dataset_uri(dataset_dict))
+
+        dataset_ref, dataset_graph = self._dataset_graph(dataset_dict)
+
+        for prefix, namespace in dataset_graph.namespaces():
+            self.g.bind(prefix, namespace)
+        for triple in dataset_graph:
+            self.g.add(triple)
+
+        self.fragment_cache.set(dataset_dict, profile_names, 'nt',
+                                dataset_graph.serialize(format='nt'))
+
+        return dataset_ref
+
     def serialize_dataset(self, dataset_dict, _format='xml'):
         '''
         Given a CKAN dataset dict, returns an RDF serialization
@@ -273,12 +880,12 @@ class RDFSerializer(RDFProcessor):
         Returns a string with the serialized dataset
         '''
 
-        self.graph_from_dataset(dataset_dict)
+        dataset_ref = self.graph_from_dataset(dataset_dict)
 
         _format = url_to_rdflib_format(_format)
 
         if _format == 'json-ld':
-            output = self.g.serialize(format=_format, auto_compact=True)
+            output = get_jsonld_writer().document(self.g, [dataset_ref])
         else:
             output = self.g.serialize(format=_format)
 
@@ -304,24 +911,318 @@ class RDFSerializer(RDFProcessor):
         `pagination_info` may be a dict containing keys describing the results
         pagination. See the `_add_pagination_triples()` method for details.
 
+        JSON-LD output is written with `ckanext.dcat.jsonld.JSONLDWriter`,
+        so the class graph will only contain the triples of the last part
+        (see `serialize_catalog_stream`).
+
         Returns a string with the serialized catalog
         '''
+        _format = url_to_rdflib_format(_format)
+
+        if _format == 'json-ld':
+            return ''.join(self._serialize_catalog_stream_jsonld(
+                catalog_dict, dataset_dicts, pagination_info))
+
+        write_only = self._use_write_only_graph(_format)
+        if write_only:
+            self.g = WRITE_ONLY_GRAPHS[_format]()
 
         catalog_ref = self.graph_from_catalog(catalog_dict)
-        if dataset_dicts:
+        if dataset_dicts and self.workers > 1:
+            # Write-only graphs get the fragments in the requested format,
+            # the rest parse them from N-Triples
+            fragment_format = _format if write_only else 'nt'
+            for dataset_dict, dataset_ref, fragments in \
+                    self.serialize_datasets_fragments(dataset_dicts,
+                                                      [fragment_format]):
+                if write_only:
+                    self.g.write(fragments[fragment_format])
+                else:
+                    self.g.parse(data=fragments[fragment_format],
+                                 format='nt')
+
+                self.g.add((catalog_ref, DCAT.dataset, dataset_ref))
+        elif dataset_dicts:
             for dataset_dict in dataset_dicts:
-                dataset_ref = self.graph_from_dataset(dataset_dict)
+                if write_only and self._use_fragment_cache():
+                    dataset_ref, fragment = self._dataset_fragment(
+                        dataset_dict, _format)
+                    self.g.write(fragment)
+                elif self._use_fragment_cache():
+                    dataset_ref = self._graph_from_dataset_fragment(
+                        dataset_dict)
+                else:
+                    dataset_ref = self.graph_from_dataset(dataset_dict)
 
                 self.g.add((catalog_ref, DCAT.dataset, dataset_ref))
 
         if pagination_info:
             self._add_pagination_triples(pagination_info)
 
-        _format = url_to_rdflib_format(_format)
+        if write_only:
+            return self.g.getvalue()
+
         output = self.g.serialize(format=_format)
 
         return output
 
+    def serialize_catalog_stream(self, catalog_dict=None, dataset_dicts=None,
+                                 _format='xml', pagination_info=None):
+        '''
+        Generator that returns an RDF serialization of the catalog in chunks
+
+        It accepts the same parameters as `serialize_catalog`, but instead of
+        building a single graph for the catalog and all the datasets, the
+        catalog triples are serialized first, then each dataset is serialized
+        (and its graph discarded) as soon as it has been processed, and finally
+        the pagination triples are added.
+
+        This keeps memory usage bounded by the size of the largest dataset
+        rather than by the number of datasets on the page.
+
+        Only formats that can be concatenated into a valid document are
+        streamed (see `STREAMING_FORMATS`), plus JSON-LD, which is written
+        with `ckanext.dcat.jsonld.JSONLDWriter`. For other formats the whole
+        catalog is serialized using `serialize_catalog` and yielded as a
+        single chunk.
+
+        Note that after the generator has been consumed the class graph
+        (`serializer.g`) will only contain the triples of the last chunk.
+
+        Yields strings with the serialized chunks
+        '''
+
+        _format = url_to_rdflib_format(_format)
+
+        if _format == 'json-ld':
+            for chunk in self._serialize_catalog_stream_jsonld(
+                    catalog_dict, dataset_dicts, pagination_info):
+                yield chunk
+            return
+
+        if _format not in STREAMING_FORMATS:
+            yield self.serialize_catalog(catalog_dict, dataset_dicts,
+                                         _format=_format,
+                                         pagination_info=pagination_info)
+            return
+
+        if (self._use_write_only_graph(_format) and
+                not self._use_fragment_cache() and self.workers < 2):
+            for chunk in self._serialize_catalog_stream_write_only(
+                    catalog_dict, dataset_dicts, _format, pagination_info):
+                yield chunk
+            return
+
+        catalog_ref = self.graph_from_catalog(catalog_dict)
+        yield self.g.serialize(format=_format)
+
+        for dataset_dict, dataset_ref, fragments in \
+                self.serialize_datasets_fragments(dataset_dicts, [_format]):
+            # N-Triples statements are also valid Turtle and N3
+            yield fragments[_format] + u'{0} {1} {2} .\n'.format(
+                catalog_ref.n3(), DCAT.dataset.n3(),
+                dataset_ref.n3()).encode('utf8')
+
+        if pagination_info:
+            self.g = rdflib.Graph()
+
+            self._add_pagination_triples(pagination_info)
+
+            yield self.g.serialize(format=_format)
+
+    def _serialize_catalog_stream_write_only(self, catalog_dict,
+                                             dataset_dicts, _format,
+                                             pagination_info):
+        '''
+        Streams the catalog serialization using a write-only graph, yielding
+        the triples written after the catalog and each of the datasets
+        '''
+        self.g = WRITE_ONLY_GRAPHS[_format]()
+
+        catalog_ref = self.graph_from_catalog(catalog_dict)
+        yield self.g.drain()
+
+        for dataset_dict in dataset_dicts or []:
+            dataset_ref = self.graph_from_dataset(dataset_dict)
+            self.g.add((catalog_ref, DCAT.dataset, dataset_ref))
+            yield self.g.drain()
+
+        if pagination_info:
+            self._add_pagination_triples(pagination_info)
+            yield self.g.drain()
+
+    def _serialize_catalog_stream_jsonld(self, catalog_dict, dataset_dicts,
+                                         pagination_info):
+        '''
+        Streams the catalog serialization as a JSON-LD document
+
+        The document is a list of node objects (see
+        `JSONLDWriter.document`). When framing, datasets are nested in the
+        catalog node, which is the first one, and the rest of the nodes (eg
+        the pagination ones) follow it.
+        '''
+        writer = get_jsonld_writer()
+
+        catalog_ref = self.graph_from_catalog(catalog_dict)
+        catalog_nodes = writer.nodes(self.g, [catalog_ref])
+
+        yield '['
+
+        separator = ''
+        if writer.frame:
+            if (catalog_nodes and
+                    catalog_nodes[0].get('@id') == unicode(catalog_ref)):
+                catalog_node = catalog_nodes.pop(0)
+            else:
+                catalog_node = {'@id': unicode(catalog_ref)}
+            yield '{0}, "{1}": ['.format(
+                writer.with_context(writer.dumps(catalog_node))[:-1],
+                writer.compact_iri(DCAT.dataset))
+        catalog_nodes = [writer.dumps(node) for node in catalog_nodes]
+
+        if not writer.frame and catalog_nodes:
+            yield ', '.join(writer.with_context(node)
+                            for node in catalog_nodes)
+            catalog_nodes = []
+            separator = ', '
+
+        # Nodes that can not be nested in the catalog one
+        other_nodes = catalog_nodes
+
+        for dataset_dict, dataset_ref, fragments in \
+                self.serialize_datasets_fragments(
+                    dataset_dicts, [writer.fragment_format]):
+            nodes = fragments[writer.fragment_format].split('\n')
+            if writer.frame:
+                yield separator + nodes[0]
+                other_nodes.extend(nodes[1:])
+            else:
+                nodes.append(writer.dumps({
+                    '@id': unicode(catalog_ref),
+                    writer.compact_iri(DCAT.dataset): {
+                        '@id': unicode(dataset_ref)}}))
+                yield separator + ', '.join(writer.with_context(node)
+                                            for node in nodes)
+            separator = ', '
+
+        if writer.frame:
+            yield ']}'
+            separator = ', '
+
+        if pagination_info:
+            self.g = rdflib.Graph()
+
+            self._add_pagination_triples(pagination_info)
+
+            other_nodes.extend(writer.dumps(node)
+                               for node in writer.nodes(self.g))
+
+        if other_nodes:
+            yield separator + ', '.join(writer.with_context(node)
+                                        for node in other_nodes)
+
+        yield ']'
+
+
+def _batches(iterable, size):
+    '''
+    Generator that returns lists with `size` consecutive items of the
+    iterable (the last one might be shorter)
+    '''
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _with_dataset_ids(dataset_dicts):
+    '''
+    Returns copies of the dataset dicts with the `package_id` field set on
+    all their resources (see `prefetch_dataset_ids`)
+    '''
+    prefetch_dataset_ids(dataset_dicts)
+
+    copies = []
+    for dataset_dict in dataset_dicts:
+        if dataset_dict.get('resources'):
+            dataset_dict = dict(dataset_dict, resources=[
+                dict(resource_dict,
+                     package_id=dataset_id_from_resource(resource_dict))
+                if resource_dict.get('id') and
+                not resource_dict.get('package_id') else resource_dict
+                for resource_dict in dataset_dict['resources']])
+        copies.append(dataset_dict)
+    return copies
+
+
+# Parser used by each of the worker processes
+_worker_parser = None
+
+
+def _init_parser_worker(profiles, compatibility_mode):
+    '''
+    Creates the parser used by a worker process, loading the profiles
+    '''
+    global _worker_parser
+
+    # Workers only handle the graphs of single datasets
+    config[RDF_STORE_CONFIG] = DEFAULT_STORE
+
+    _worker_parser = RDFParser(profiles, compatibility_mode, workers=0)
+
+
+def _parse_datasets_chunk(subgraphs):
+    '''
+    Parses a chunk of dataset subgraphs on a worker process
+
+    `subgraphs` is a list of tuples with the dataset reference and its
+    subgraph, both serialized as N-Triples
+
+    Returns a list of dataset dicts
+    '''
+    return list(_worker_parser._subgraphs_datasets(
+        parse_dataset_subgraph(dataset_n3, data)
+        for dataset_n3, data in subgraphs))
+
+
+# Serializer used by each of the worker processes
+_worker_serializer = None
+
+
+def _init_serializer_worker(profiles, compatibility_mode, settings):
+    '''
+    Creates the serializer used by a worker process, loading the profiles
+
+    Fragments are not stored on the fragment cache by the workers, this is
+    done by the parent process.
+    '''
+    global _worker_serializer
+
+    # Workers only handle the graphs of single datasets
+    config[RDF_STORE_CONFIG] = DEFAULT_STORE
+
+    serializer = RDFSerializer(profiles, compatibility_mode, workers=0)
+    serializer.fragment_cache = None
+    for key, value in settings.iteritems():
+        setattr(serializer, key, value)
+
+    _worker_serializer = serializer
+
+
+def _serialize_datasets_chunk(args):
+    '''
+    Serializes a chunk of datasets on a worker process
+
+    Returns a list of tuples with the dataset reference and the fragments
+    '''
+    dataset_dicts, formats = args
+
+    return [_worker_serializer.serialize_dataset_fragments(dataset_dict,
+                                                           formats)
+            for dataset_dict in dataset_dicts]
+
 
 if __name__ == '__main__':
 
@@ -350,10 +1251,20 @@ Operation mode.
     parser.add_argument('-m', '--compat-mode',
                         action='store_true',
                         help='Enable compatibility mode')
+    parser.add_argument('-s', '--streaming',
+                        action='store_true',
+                        help='''Parse N-Triples or N-Quads files in streaming
+                                mode, with bounded memory usage''')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='''Number of worker processes used to parse the
+                                datasets''')
 
     args = parser.parse_args()
 
-    contents = args.file.read()
+    if args.mode == 'consume' and args.streaming:
+        contents = args.file
+    else:
+        contents = args.file.read()
 
     if args.mode == 'produce':
         serializer = RDFSerializer(profiles=args.profile,
@@ -364,9 +1275,10 @@ Operation mode.
         print out
     else:
         parser = RDFParser(profiles=args.profile,
-                           compatibility_mode=args.compat_mode)
+                           compatibility_mode=args.compat_mode,
+                           workers=args.workers)
 
-        parser.parse(contents, _format=args.format)
+        parser.parse(contents, _format=args.format, streaming=args.streaming)
 
         ckan_datasets = [d for d in parser.datasets()]
 
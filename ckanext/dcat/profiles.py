@@ -1,19 +1,21 @@
-import datetime
 import json
 
-from dateutil.parser import parse as parse_date
-
 from pylons import config
 
 import rdflib
 from rdflib import URIRef, BNode, Literal
 from rdflib.namespace import Namespace, RDF, XSD, SKOS, RDFS
 
-from geomet import wkt, InvalidGeoJSONException
-
 from ckan.plugins import toolkit
 
-from ckanext.dcat.utils import resource_uri, publisher_uri_from_dataset_dict
+from ckanext.dcat.utils import (resource_uri, publisher_uri_from_dataset_dict,
+                                parse_date)
+from ckanext.dcat.cache import last_catalog_modification
+from ckanext.dcat.formats import format_index
+from ckanext.dcat.geometry import (valid_geojson, wkt_to_geojson,
+                                   geojson_to_wkt, cap_precision,
+                                   geometry_decimals, WKT_DECIMALS,
+                                   GEOMETRY_WKT_CONFIG)
 
 DCT = Namespace("http://purl.org/dc/terms/")
 DCAT = Namespace("http://www.w3.org/ns/dcat#")
@@ -65,6 +67,12 @@ class RDFProfile(object):
 
         self.compatibility_mode = compatibility_mode
 
+        self._extras_indexes = {}
+
+        # Statements of the subjects looked up on the current dataset, by
+        # subject and predicate (see `_objects`)
+        self._subject_statements = {}
+
     def _datasets(self):
         '''
         Generator that returns all DCAT datasets on the graph
@@ -82,9 +90,31 @@ class RDFProfile(object):
         Yields rdflib.term.URIRef objects that can be used on graph lookups
         and queries
         '''
-        for distribution in self.g.objects(dataset, DCAT.distribution):
+        for distribution in self._objects(dataset, DCAT.distribution):
             yield distribution
 
+    def _objects(self, subject, predicate):
+        '''
+        Returns a list with all the objects for this subject and predicate
+
+        All the statements of a subject are read from the graph in a single
+        pass the first time it is looked up, and kept until the next
+        `before_dataset` call, so subsequent lookups for the same subject
+        don't need to query the graph. All the `_object*` helpers use it.
+
+        Both subject and predicate must be rdflib URIRef or BNode objects
+        '''
+        statements = self._subject_statements.get(subject)
+        if statements is None:
+            statements = {}
+            for _predicate, _object in self.g.predicate_objects(subject):
+                if _predicate in statements:
+                    statements[_predicate].append(_object)
+                else:
+                    statements[_predicate] = [_object]
+            self._subject_statements[subject] = statements
+        return statements.get(predicate, [])
+
     def _object(self, subject, predicate):
         '''
         Helper for returning the first object for this subject and predicate
@@ -93,9 +123,8 @@ class RDFProfile(object):
 
         Returns an rdflib reference (URIRef or BNode) or None if not found
         '''
-        for _object in self.g.objects(subject, predicate):
-            return _object
-        return None
+        objects = self._objects(subject, predicate)
+        return objects[0] if objects else None
 
     def _object_value(self, subject, predicate):
         '''
@@ -105,9 +134,8 @@ class RDFProfile(object):
 
         If found, the unicode representation is returned, else None
         '''
-        for o in self.g.objects(subject, predicate):
-            return unicode(o)
-        return None
+        objects = self._objects(subject, predicate)
+        return unicode(objects[0]) if objects else None
 
     def _object_value_int(self, subject, predicate):
         '''
@@ -135,7 +163,7 @@ class RDFProfile(object):
 
         If no values found, returns an empty string
         '''
-        return [unicode(o) for o in self.g.objects(subject, predicate)]
+        return [unicode(o) for o in self._objects(subject, predicate)]
 
     def _time_interval(self, subject, predicate):
         '''
@@ -155,7 +183,7 @@ class RDFProfile(object):
 
         start_date = end_date = None
 
-        for interval in self.g.objects(subject, predicate):
+        for interval in self._objects(subject, predicate):
             # Fist try the schema.org way
             start_date = self._object_value(interval, SCHEMA.startDate)
             end_date = self._object_value(interval, SCHEMA.endDate)
@@ -164,10 +192,8 @@ class RDFProfile(object):
                 return start_date, end_date
 
             # If no luck, try the w3 time way
-            start_nodes = [t for t in self.g.objects(interval,
-                                                     TIME.hasBeginning)]
-            end_nodes = [t for t in self.g.objects(interval,
-                                                   TIME.hasEnd)]
+            start_nodes = self._objects(interval, TIME.hasBeginning)
+            end_nodes = self._objects(interval, TIME.hasEnd)
             if start_nodes:
                 start_date = self._object_value(start_nodes[0],
                                                 TIME.inXSDDateTime)
@@ -214,7 +240,7 @@ class RDFProfile(object):
 
         publisher = {}
 
-        for agent in self.g.objects(subject, predicate):
+        for agent in self._objects(subject, predicate):
 
             publisher['uri'] = (unicode(agent) if isinstance(agent,
                                 rdflib.term.URIRef) else None)
@@ -241,7 +267,7 @@ class RDFProfile(object):
 
         contact = {}
 
-        for agent in self.g.objects(subject, predicate):
+        for agent in self._objects(subject, predicate):
 
             contact['uri'] = (unicode(agent) if isinstance(agent,
                               rdflib.term.URIRef) else None)
@@ -273,7 +299,7 @@ class RDFProfile(object):
         text = None
         geom = None
 
-        for spatial in self.g.objects(subject, predicate):
+        for spatial in self._objects(subject, predicate):
 
             if isinstance(spatial, URIRef):
                 uri = unicode(spatial)
@@ -281,23 +307,17 @@ class RDFProfile(object):
             if isinstance(spatial, Literal):
                 text = unicode(spatial)
 
-            if (spatial, RDF.type, DCT.Location) in self.g:
-                for geometry in self.g.objects(spatial, LOCN.geometry):
+            if DCT.Location in self._objects(spatial, RDF.type):
+                for geometry in self._objects(spatial, LOCN.geometry):
                     if (geometry.datatype == URIRef(GEOJSON_IMT) or
                             not geometry.datatype):
-                        try:
-                            json.loads(unicode(geometry))
+                        if valid_geojson(unicode(geometry)):
                             geom = unicode(geometry)
-                        except (ValueError, TypeError):
-                            pass
                     if not geom and geometry.datatype == GSP.wktLiteral:
-                        try:
-                            geom = json.dumps(wkt.loads(unicode(geometry)))
-                        except (ValueError, TypeError):
-                            pass
-                for label in self.g.objects(spatial, SKOS.prefLabel):
+                        geom = wkt_to_geojson(unicode(geometry))
+                for label in self._objects(spatial, SKOS.prefLabel):
                     text = unicode(label)
-                for label in self.g.objects(spatial, RDFS.label):
+                for label in self._objects(spatial, RDFS.label):
                     text = unicode(label)
 
         return {
@@ -328,6 +348,9 @@ class RDFProfile(object):
 
         1. literal value of dct:format if it not contains a '/' character
         2. label of dct:format if it is an instance of dct:IMT (see above)
+        3. value of dct:format if it is a URI matching a known format, eg an
+           EU file type authority URI (only if `normalize_ckan_format` is
+           True)
 
         If `normalize_ckan_format` is True and using CKAN>=2.3, the label will
         be tried to match against the standard list of formats that is included
@@ -335,7 +358,8 @@ class RDFProfile(object):
         (https://github.com/ckan/ckan/blob/master/ckan/config/resource_formats.json)
         This allows for instance to populate the CKAN resource format field
         with a format that view plugins, etc will understand (`csv`, `xml`,
-        etc.)
+        etc.). Site-specific mappings can be added by plugins implementing
+        `IDCATFormatMappings` (see `ckanext.dcat.formats.FormatIndex`).
 
         Return a tuple with the media type and the label, both set to None if
         they couldn't be found.
@@ -355,20 +379,18 @@ class RDFProfile(object):
         elif isinstance(_format, (BNode, URIRef)):
             if self._object(_format, RDF.type) == DCT.IMT:
                 if not imt:
-                    imt = unicode(self.g.value(_format, default=None))
-                label = unicode(self.g.label(_format, default=None))
-
-        if ((imt or label) and normalize_ckan_format and
-                toolkit.check_ckan_version(min_version='2.3')):
-            import ckan.config
-            from ckan.lib import helpers
-
-            format_registry = helpers.resource_formats()
-
-            if imt in format_registry:
-                label = format_registry[imt][1]
-            elif label in format_registry:
-                label = format_registry[label][1]
+                    imt = unicode(self._object(_format, RDF.value))
+                label = unicode(self._object(_format, RDFS.label))
+            elif isinstance(_format, URIRef) and normalize_ckan_format:
+                # eg EU file type authority URIs, only used if they match a
+                # known format
+                label = format_index.normalize(unicode(_format))
+
+        if (imt or label) and normalize_ckan_format:
+            ckan_format = (format_index.normalize(imt) or
+                           format_index.normalize(label))
+            if ckan_format:
+                label = ckan_format
 
         return imt, label
 
@@ -386,11 +408,46 @@ class RDFProfile(object):
         if key in _dict:
             return _dict[key]
 
-        for extra in _dict.get('extras', []):
-            if extra['key'] == key or extra['key'] == 'dcat_' + key:
-                return extra['value']
+        return self._extras_index(_dict).get(key, default)
+
+    def _extras_index(self, _dict):
+        '''
+        Returns a dict mapping the extras keys of a CKAN dict to their values
 
-        return default
+        Legacy `dcat_` extras are also indexed without the prefix, unless
+        there is an extra with the unprefixed key. The first extra wins if
+        a key is repeated.
+
+        The index is built once per dict and reused on subsequent lookups.
+        It is rebuilt if the extras list is replaced or its length changes,
+        and discarded on `before_dataset`.
+        '''
+        extras = _dict.get('extras')
+        if not extras:
+            return {}
+
+        cached = self._extras_indexes.get(id(_dict))
+        if cached and cached[0] is extras and cached[1] == len(extras):
+            return cached[2]
+
+        index = {}
+        legacy = {}
+        for extra in extras:
+            key = extra['key']
+            if key not in index:
+                index[key] = extra['value']
+            if key.startswith('dcat_') and key[5:] not in legacy:
+                legacy[key[5:]] = extra['value']
+        for key, value in legacy.iteritems():
+            if key not in index:
+                index[key] = value
+
+        if len(self._extras_indexes) >= 1000:
+            self._extras_indexes = {}
+        # The extras list is kept on the cache so its id can not be reused
+        self._extras_indexes[id(_dict)] = (extras, len(extras), index)
+
+        return index
 
     def _get_dataset_value(self, dataset_dict, key, default=None):
         '''
@@ -494,22 +551,33 @@ class RDFProfile(object):
         '''
         Adds a new triple with a date object
 
-        Dates are parsed using dateutil, and if the date obtained is correct,
-        added to the graph as an XSD.dateTime value.
+        Dates are parsed using `ckanext.dcat.utils.parse_date`, and if the
+        date obtained is correct, added to the graph as an XSD.dateTime value.
 
         If there are parsing errors, the literal string value is added.
         '''
         if not value:
             return
         try:
-            default_datetime = datetime.datetime(1, 1, 1, 0, 0, 0)
-            _date = parse_date(value, default=default_datetime)
+            _date = parse_date(value)
 
             self.g.add((subject, predicate, Literal(_date.isoformat(),
                                                     datatype=XSD.dateTime)))
         except ValueError:
             self.g.add((subject, predicate, Literal(value)))
 
+    def _include_wkt(self):
+        '''
+        Returns True if geometries should also be serialized as WKT
+
+        Defaults to the `ckanext.dcat.geometry.wkt` configuration option, but
+        it can be overridden by setting `include_wkt` on the serializer.
+        '''
+        include_wkt = getattr(self, 'include_wkt', None)
+        if include_wkt is None:
+            include_wkt = toolkit.asbool(config.get(GEOMETRY_WKT_CONFIG, True))
+        return include_wkt
+
     def _last_catalog_modification(self):
         '''
         Returns the date and time the catalog was last modified
@@ -517,20 +585,13 @@ class RDFProfile(object):
         To be more precise, the most recent value for `metadata_modified` on a
         dataset.
 
+        The value is cached between requests, see
+        `ckanext.dcat.cache.last_catalog_modification`.
+
         Returns a dateTime string in ISO format, or None if it could not be
         found.
         '''
-        context = {
-            'user': toolkit.get_action('get_site_user')(
-                {'ignore_auth': True})['name']
-        }
-        result = toolkit.get_action('package_search')(context, {
-            'sort': 'metadata_modified desc',
-            'rows': 1,
-        })
-        if result and result.get('results'):
-            return result['results'][0]['metadata_modified']
-        return None
+        return last_catalog_modification()
 
     # Public methods for profiles to implement
 
@@ -548,6 +609,28 @@ class RDFProfile(object):
         '''
         return dataset_dict
 
+    def bind_namespaces(self):
+        '''
+        Binds the namespace prefixes used by the profile to the graph
+
+        Called once for each graph the profile is used on. Instances are
+        reused across graphs, with `self.g` pointing to the current one.
+        '''
+        pass
+
+    def before_dataset(self):
+        '''
+        Called before each dataset is parsed or serialized
+
+        Profile instances are reused for all the datasets on a graph, so
+        profiles keeping any per-dataset state should reset it here.
+        Overriding methods should call this one to discard the extras
+        indexes and the statements read from the graph for the previous
+        dataset.
+        '''
+        self._extras_indexes = {}
+        self._subject_statements = {}
+
     def graph_from_catalog(self, catalog_dict, catalog_ref):
         '''
         Creates an RDF graph for the whole catalog (site)
@@ -684,6 +767,9 @@ class EuropeanDCATAPProfile(RDFProfile):
                        else None)
         dataset_dict['extras'].append({'key': 'uri', 'value': dataset_uri})
 
+        normalize_ckan_format = toolkit.asbool(config.get(
+            'ckanext.dcat.normalize_ckan_format', True))
+
         # Resources
         for distribution in self._distributions(dataset_ref):
 
@@ -714,8 +800,6 @@ class EuropeanDCATAPProfile(RDFProfile):
                                                        DCAT.downloadURL))
 
             # Format and media type
-            normalize_ckan_format = config.get(
-                'ckanext.dcat.normalize_ckan_format', True)
             imt, label = self._distribution_format(distribution,
                                                    normalize_ckan_format)
 
@@ -754,13 +838,15 @@ class EuropeanDCATAPProfile(RDFProfile):
 
         return dataset_dict
 
+    def bind_namespaces(self):
+
+        for prefix, namespace in namespaces.iteritems():
+            self.g.bind(prefix, namespace)
+
     def graph_from_dataset(self, dataset_dict, dataset_ref):
 
         g = self.g
 
-        for prefix, namespace in namespaces.iteritems():
-            g.bind(prefix, namespace)
-
         g.add((dataset_ref, RDF.type, DCAT.Dataset))
 
         # Basic fields
@@ -889,19 +975,24 @@ class EuropeanDCATAPProfile(RDFProfile):
                 g.add((spatial_ref, SKOS.prefLabel, Literal(spatial_text)))
 
             if spatial_geom:
+                decimals = geometry_decimals()
+                if decimals is not None:
+                    spatial_geom = cap_precision(spatial_geom, decimals)
                 # GeoJSON
                 g.add((spatial_ref,
                        LOCN.geometry,
                        Literal(spatial_geom, datatype=GEOJSON_IMT)))
                 # WKT, because GeoDCAT-AP says so
-                try:
-                    g.add((spatial_ref,
-                           LOCN.geometry,
-                           Literal(wkt.dumps(json.loads(spatial_geom),
-                                             decimals=4),
-                                   datatype=GSP.wktLiteral)))
-                except (TypeError, ValueError, InvalidGeoJSONException):
-                    pass
+                if self._include_wkt():
+                    spatial_wkt = geojson_to_wkt(
+                        spatial_geom,
+                        decimals=(WKT_DECIMALS if decimals is None
+                                  else min(decimals, WKT_DECIMALS)))
+                    if spatial_wkt:
+                        g.add((spatial_ref,
+                               LOCN.geometry,
+                               Literal(spatial_wkt,
+                                       datatype=GSP.wktLiteral)))
 
         # Resources
         for resource_dict in dataset_dict.get('resources', []):
@@ -970,9 +1061,6 @@ class EuropeanDCATAPProfile(RDFProfile):
 
         g = self.g
 
-        for prefix, namespace in namespaces.iteritems():
-            g.bind(prefix, namespace)
-
         g.add((catalog_ref, RDF.type, DCAT.Catalog))
 
         # Basic fields
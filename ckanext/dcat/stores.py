@@ -0,0 +1,339 @@
+import os
+import sqlite3
+import tempfile
+
+from pylons import config
+
+import rdflib
+from rdflib.store import Store
+from rdflib import URIRef, BNode, Literal
+
+RDF_STORE_CONFIG = 'ckanext.dcat.rdf.store'
+RDF_STORE_PATH_CONFIG = 'ckanext.dcat.rdf.store.path'
+
+DEFAULT_STORE = 'default'
+
+# Returned as the contexts of each triple, as these stores are not context
+# aware
+_NO_CONTEXTS = ()
+
+
+class CompactMemoryStore(Store):
+    '''
+    In-memory store tuned for the access pattern of the profiles
+
+    Profiles mostly look up the statements of a subject, which usually has
+    a few predicates with a single object each. Statements are kept on a
+    single subject -> predicate -> object(s) index, storing the object
+    directly unless there are several of them. Only non literal objects are
+    indexed to find the statements referencing a node (eg
+    `subjects(RDF.type, DCAT.Dataset)`), and patterns with just the
+    predicate or a literal object scan the whole store. Terms are interned,
+    so each one is only kept once regardless of the number of statements
+    using it.
+
+    It is not context aware, so it can only be used with `rdflib.Graph`.
+    '''
+
+    def __init__(self, configuration=None, identifier=None):
+        super(CompactMemoryStore, self).__init__(configuration)
+        self.identifier = identifier
+
+        # subject -> predicate -> object, or set of objects
+        self._spo = {}
+        # non literal object -> (subject, predicate) tuple, or set of them
+        self._o = {}
+        self._terms = {}
+        self._len = 0
+
+        self._namespaces = {}
+        self._prefixes = {}
+
+    def _intern(self, term):
+        return self._terms.setdefault(term, term)
+
+    def add(self, (subject, predicate, _object), context, quoted=False):
+        predicates = self._spo.get(subject)
+        if predicates is None:
+            subject = self._intern(subject)
+            predicates = self._spo[subject] = {}
+
+        objects = predicates.get(predicate)
+        if objects is None:
+            _object = self._intern(_object)
+            predicates[self._intern(predicate)] = _object
+        elif isinstance(objects, set):
+            if _object in objects:
+                return
+            _object = self._intern(_object)
+            objects.add(_object)
+        elif objects == _object:
+            return
+        else:
+            _object = self._intern(_object)
+            predicates[predicate] = set([objects, _object])
+
+        self._len += 1
+        if not isinstance(_object, Literal):
+            reference = (self._intern(subject), self._intern(predicate))
+            references = self._o.get(_object)
+            if references is None:
+                self._o[_object] = reference
+            elif isinstance(references, set):
+                references.add(reference)
+            else:
+                self._o[_object] = set([references, reference])
+
+    def remove(self, triple_pattern, context=None):
+        for (subject, predicate, _object), contexts in list(
+                self.triples(triple_pattern)):
+            predicates = self._spo[subject]
+            objects = predicates[predicate]
+            if isinstance(objects, set):
+                objects.discard(_object)
+                if len(objects) == 1:
+                    predicates[predicate] = objects.pop()
+            else:
+                del predicates[predicate]
+                if not predicates:
+                    del self._spo[subject]
+
+            self._len -= 1
+            if not isinstance(_object, Literal):
+                references = self._o[_object]
+                if isinstance(references, set):
+                    references.discard((subject, predicate))
+                    if len(references) == 1:
+                        self._o[_object] = references.pop()
+                else:
+                    del self._o[_object]
+
+    def triples(self, (subject, predicate, _object), context=None):
+        if subject is not None:
+            predicates = self._spo.get(subject)
+            if not predicates:
+                return
+            if predicate is not None:
+                if predicate not in predicates:
+                    return
+                items = [(predicate, predicates[predicate])]
+            else:
+                items = predicates.items()
+            for _predicate, objects in items:
+                if isinstance(objects, set):
+                    if _object is None:
+                        for o in list(objects):
+                            yield (subject, _predicate, o), _NO_CONTEXTS
+                    elif _object in objects:
+                        yield (subject, _predicate, _object), _NO_CONTEXTS
+                elif _object is None or objects == _object:
+                    yield (subject, _predicate, objects), _NO_CONTEXTS
+
+        elif _object is not None and not isinstance(_object, Literal):
+            references = self._o.get(_object)
+            if references is None:
+                return
+            if not isinstance(references, set):
+                references = (references,)
+            for s, p in list(references):
+                if predicate is None or p == predicate:
+                    yield (s, p, _object), _NO_CONTEXTS
+
+        else:
+            for s, predicates in self._spo.items():
+                for p, objects in predicates.items():
+                    if predicate is not None and p != predicate:
+                        continue
+                    if not isinstance(objects, set):
+                        objects = (objects,)
+                    for o in objects:
+                        if _object is None or o == _object:
+                            yield (s, p, o), _NO_CONTEXTS
+
+    def __len__(self, context=None):
+        return self._len
+
+    def bind(self, prefix, namespace):
+        self._prefixes[namespace] = prefix
+        self._namespaces[prefix] = namespace
+
+    def namespace(self, prefix):
+        return self._namespaces.get(prefix)
+
+    def prefix(self, namespace):
+        return self._prefixes.get(namespace)
+
+    def namespaces(self):
+        for prefix, namespace in self._namespaces.iteritems():
+            yield prefix, namespace
+
+
+class SQLiteStore(Store):
+    '''
+    Disk-backed store using a temporary SQLite database
+
+    Allows parsing sources bigger than the available memory. Statements are
+    kept on a single table indexed by subject, predicate and object, and by
+    object. The database is created on the directory passed as
+    configuration (defaults to the `ckanext.dcat.rdf.store.path` option or
+    the system temporary directory), and removed on `close`.
+
+    It is not context aware, so it can only be used with `rdflib.Graph`.
+    '''
+
+    def __init__(self, configuration=None, identifier=None):
+        super(SQLiteStore, self).__init__()
+        self.identifier = identifier
+
+        self.path = None
+        self._connection = None
+        self._len = 0
+
+        self._namespaces = {}
+        self._prefixes = {}
+
+        self.open(configuration, create=True)
+
+    def open(self, configuration, create=False):
+        if self._connection is not None:
+            return
+        fd, self.path = tempfile.mkstemp(
+            prefix='dcat-store-', suffix='.db',
+            dir=configuration or config.get(RDF_STORE_PATH_CONFIG) or None)
+        os.close(fd)
+
+        self._connection = sqlite3.connect(self.path)
+        # The database is discarded once closed, so there is no need to
+        # keep a journal or to wait for writes to reach the disk
+        self._connection.execute('PRAGMA journal_mode = OFF')
+        self._connection.execute('PRAGMA synchronous = OFF')
+        self._connection.execute('''
+            CREATE TABLE triples (
+                s TEXT NOT NULL,
+                p TEXT NOT NULL,
+                o TEXT NOT NULL,
+                UNIQUE (s, p, o)
+            )''')
+        self._connection.execute('CREATE INDEX triples_o ON triples (o)')
+
+    def close(self, commit_pending_transaction=False):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+        self.path = None
+
+    def destroy(self, configuration):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    def add(self, (subject, predicate, _object), context, quoted=False):
+        cursor = self._connection.execute(
+            'INSERT OR IGNORE INTO triples VALUES (?, ?, ?)',
+            (_encode(subject), _encode(predicate), _encode(_object)))
+        self._len += cursor.rowcount
+
+    def remove(self, triple_pattern, context=None):
+        where, params = self._where(triple_pattern)
+        cursor = self._connection.execute(
+            'DELETE FROM triples' + where, params)
+        self._len -= cursor.rowcount
+
+    def triples(self, triple_pattern, context=None):
+        where, params = self._where(triple_pattern)
+        cursor = self._connection.execute(
+            'SELECT s, p, o FROM triples' + where, params)
+        subject, predicate, _object = triple_pattern
+        for s, p, o in cursor:
+            yield (subject if subject is not None else _decode(s),
+                   predicate if predicate is not None else _decode(p),
+                   _object if _object is not None else _decode(o)), \
+                _NO_CONTEXTS
+
+    def _where(self, triple_pattern):
+        conditions = []
+        params = []
+        for column, term in zip(('s', 'p', 'o'), triple_pattern):
+            if term is not None:
+                conditions.append('{0} = ?'.format(column))
+                params.append(_encode(term))
+        if not conditions:
+            return '', params
+        return ' WHERE ' + ' AND '.join(conditions), params
+
+    def __len__(self, context=None):
+        return self._len
+
+    def bind(self, prefix, namespace):
+        self._prefixes[namespace] = prefix
+        self._namespaces[prefix] = namespace
+
+    def namespace(self, prefix):
+        return self._namespaces.get(prefix)
+
+    def prefix(self, namespace):
+        return self._prefixes.get(namespace)
+
+    def namespaces(self):
+        for prefix, namespace in self._namespaces.iteritems():
+            yield prefix, namespace
+
+
+def _encode(term):
+    # Literals include the language and datatype, which can not contain the
+    # separator
+    if isinstance(term, Literal):
+        return u'L{0}\x1f{1}\x1f{2}'.format(term.language or u'',
+                                            unicode(term.datatype or u''),
+                                            unicode(term))
+    elif isinstance(term, BNode):
+        return u'B' + unicode(term)
+    return u'U' + unicode(term)
+
+
+def _decode(value):
+    kind, value = value[0], value[1:]
+    if kind == u'U':
+        return URIRef(value)
+    elif kind == u'B':
+        return BNode(value)
+    language, datatype, value = value.split(u'\x1f', 2)
+    return Literal(value, lang=language or None,
+                   datatype=URIRef(datatype) if datatype else None)
+
+
+STORES = {
+    'compact': CompactMemoryStore,
+    'sqlite': SQLiteStore,
+}
+
+
+def get_store(name=None):
+    '''
+    Returns a new instance of an RDF store
+
+    `name` (defaults to the `ckanext.dcat.rdf.store` option) can be
+    `compact` (see `CompactMemoryStore`), `sqlite` (see `SQLiteStore`) or
+    the name of any store registered as an rdflib plugin. Returns None for
+    `default`, which is the rdflib in-memory store.
+    '''
+    name = name or config.get(RDF_STORE_CONFIG) or DEFAULT_STORE
+    if name == DEFAULT_STORE:
+        return None
+    if name in STORES:
+        return STORES[name]()
+    return rdflib.plugin.get(name, Store)()
+
+
+def new_graph(store=None):
+    '''
+    Returns an empty rdflib graph backed by the configured store (see
+    `get_store`)
+    '''
+    store = get_store(store)
+    if store is None:
+        return rdflib.Graph()
+    return rdflib.Graph(store=store)
@@ -0,0 +1,310 @@
+import os
+import re
+import bisect
+import shutil
+import tempfile
+import zlib
+from collections import deque
+from cStringIO import StringIO
+
+from pylons import config
+
+from ckan.plugins import toolkit
+
+from ckanext.dcat.subgraph import subgraph_uri_depth
+
+STREAMING_PARSE_CONFIG = 'ckanext.dcat.streaming_parse'
+STREAMING_PARSE_MIN_SIZE_CONFIG = 'ckanext.dcat.streaming_parse.min_size'
+STREAMING_PARSE_PATH_CONFIG = 'ckanext.dcat.streaming_parse.path'
+
+# In bytes
+DEFAULT_STREAMING_PARSE_MIN_SIZE = 10 * 1024 * 1024
+PARTITION_SIZE = 32 * 1024 * 1024
+MIN_PARTITIONS = 16
+
+# A subject out of this number is kept on the in-memory index of each
+# partition
+INDEX_INTERVAL = 32
+
+# rdflib format names of the line-based formats that can be parsed in
+# partitions
+NTRIPLES_FORMATS = ('nt', 'nt11', 'ntriples', 'application/n-triples')
+NQUADS_FORMATS = ('nquads', 'application/n-quads')
+PARTITIONED_FORMATS = NTRIPLES_FORMATS + NQUADS_FORMATS
+
+RDF_TYPE = '<http://www.w3.org/1999/02/22-rdf-syntax-ns#type>'
+DCAT_DATASET = '<http://www.w3.org/ns/dcat#Dataset>'
+DCAT_CATALOG = '<http://www.w3.org/ns/dcat#Catalog>'
+DCAT_DISTRIBUTION = '<http://www.w3.org/ns/dcat#distribution>'
+
+term_re = re.compile(r'''
+    (
+        <[^>]*>                                     # IRI
+      | _:[^\s.]+(?:\.+[^\s.]+)*                    # Blank node
+      | "(?:[^"\\]|\\.)*"                           # Literal
+        (?:@[A-Za-z]+(?:-[A-Za-z0-9]+)*|\^\^<[^>]*>)?
+    )\s*''', re.VERBOSE)
+
+end_re = re.compile(r'\.\s*(?:#.*)?$')
+
+
+def split_statement(line, nquads=False):
+    '''
+    Splits an N-Triples (or N-Quads, if `nquads` is True) line into its
+    subject, predicate and object terms, as strings
+
+    The graph term of N-Quads statements is ignored.
+
+    Returns None for empty and comment lines. Raises ValueError if the line
+    is not a valid statement.
+    '''
+    position = len(line) - len(line.lstrip())
+    if position == len(line) or line[position] == '#':
+        return None
+
+    terms = []
+    for i in xrange(4 if nquads else 3):
+        match = term_re.match(line, position)
+        if not match:
+            if i == 3:
+                break
+            raise ValueError('Invalid statement: {0}'.format(line[:200]))
+        terms.append(match.group(1))
+        position = match.end()
+
+    if (not end_re.match(line, position) or
+            terms[0][0] == '"' or terms[1][0] != '<' or
+            (len(terms) == 4 and terms[3][0] == '"')):
+        raise ValueError('Invalid statement: {0}'.format(line[:200]))
+
+    return terms[0], terms[1], terms[2]
+
+
+def partitions_for_size(size):
+    '''
+    Returns the number of partitions used for a source of `size` bytes, so
+    each one holds about 32 MB
+    '''
+    return max(MIN_PARTITIONS, (size or 0) // PARTITION_SIZE + 1)
+
+
+def use_streaming_parse(_format, size, enabled=None):
+    '''
+    Checks if a source should be parsed in partitions, as defined by the
+    `ckanext.dcat.streaming_parse` option (defaults to False) and the
+    `ckanext.dcat.streaming_parse.min_size` one (in bytes, defaults to 10
+    MB)
+
+    `enabled` overrides the `ckanext.dcat.streaming_parse` option if not
+    None.
+    '''
+    if enabled is None:
+        enabled = toolkit.asbool(config.get(STREAMING_PARSE_CONFIG, False))
+    if not enabled:
+        return False
+    min_size = int(config.get(STREAMING_PARSE_MIN_SIZE_CONFIG,
+                              DEFAULT_STREAMING_PARSE_MIN_SIZE))
+    return _format in PARTITIONED_FORMATS and size >= min_size
+
+
+class PartitionedTriples(object):
+    '''
+    Disk-backed store of the statements of an N-Triples or N-Quads source,
+    partitioned by subject
+
+    Statements are written to a number of partition files depending on a
+    hash of their subject as they are read, so the whole source never needs
+    to be held in memory. Once all the statements have been added, each
+    partition is sorted by subject, and only one out of `INDEX_INTERVAL`
+    subjects is kept in memory to find the statements of a subject.
+
+    The subjects typed as dcat:Dataset are recorded while reading, and the
+    statements describing each of them (see `closure`) can be retrieved
+    afterwards.
+
+    Partition files are stored on a temporary directory created in `path`
+    (defaults to the `ckanext.dcat.streaming_parse.path` option or the
+    system temporary directory), which is removed with `close`.
+    '''
+
+    def __init__(self, partitions=MIN_PARTITIONS, path=None):
+        self.partitions = partitions
+        self.path = tempfile.mkdtemp(
+            prefix='dcat-partitions-',
+            dir=path or config.get(STREAMING_PARSE_PATH_CONFIG) or None)
+
+        # Dataset subjects, in the order they were found
+        self.datasets = []
+        self._datasets = set()
+        self._catalogs = set()
+
+        self._writers = [open(self._partition_path(i), 'wb')
+                         for i in xrange(partitions)]
+        self._readers = None
+        self._indexes = None
+
+    def _partition_path(self, partition):
+        return os.path.join(self.path, '{0}.nt'.format(partition))
+
+    def _partition(self, subject):
+        return (zlib.crc32(subject) & 0xffffffff) % self.partitions
+
+    def add(self, source, nquads=False):
+        '''
+        Adds the statements from `source`, a string or a file-like object
+
+        Raises ValueError if an invalid statement is found.
+        '''
+        if isinstance(source, unicode):
+            source = source.encode('utf8')
+        if isinstance(source, str):
+            source = StringIO(source)
+
+        if self._writers is None:
+            raise ValueError('Statements can not be added once indexed')
+
+        for number, line in enumerate(source, 1):
+            try:
+                statement = split_statement(line, nquads)
+            except ValueError, e:
+                raise ValueError('Line {0}: {1}'.format(number, e))
+            if statement is None:
+                continue
+            subject, predicate, _object = statement
+
+            if predicate == RDF_TYPE:
+                if _object == DCAT_DATASET and subject not in self._datasets:
+                    self._datasets.add(subject)
+                    self.datasets.append(subject)
+                elif _object == DCAT_CATALOG:
+                    self._catalogs.add(subject)
+
+            self._writers[self._partition(subject)].write(
+                '{0} {1} {2} .\n'.format(subject, predicate, _object))
+
+    def index(self):
+        '''
+        Sorts each partition by subject and builds the in-memory indexes
+
+        Memory usage is bounded by the size of the largest partition.
+        '''
+        if self._indexes is not None:
+            return
+
+        for writer in self._writers:
+            writer.close()
+        self._writers = None
+
+        self._indexes = []
+        for partition in xrange(self.partitions):
+            path = self._partition_path(partition)
+            with open(path, 'rb') as f:
+                lines = f.readlines()
+            lines.sort()
+
+            subjects, offsets = [], []
+            offset, count = 0, 0
+            previous_line = previous_subject = None
+            with open(path, 'wb') as f:
+                for line in lines:
+                    if line == previous_line:
+                        continue
+                    previous_line = line
+                    subject = line.split(' ', 1)[0]
+                    if subject != previous_subject:
+                        if count % INDEX_INTERVAL == 0:
+                            subjects.append(subject)
+                            offsets.append(offset)
+                        count += 1
+                        previous_subject = subject
+                    f.write(line)
+                    offset += len(line)
+            del lines
+
+            self._indexes.append((subjects, offsets))
+
+        self._readers = [open(self._partition_path(i), 'rb')
+                         for i in xrange(self.partitions)]
+
+    def statements(self, subject):
+        '''
+        Returns a list with the N-Triples lines of the provided subject
+        '''
+        self.index()
+
+        partition = self._partition(subject)
+        subjects, offsets = self._indexes[partition]
+        position = bisect.bisect_right(subjects, subject) - 1
+        if position < 0:
+            return []
+
+        f = self._readers[partition]
+        f.seek(offsets[position])
+
+        statements = []
+        while True:
+            line = f.readline()
+            if not line:
+                break
+            line_subject = line.split(' ', 1)[0]
+            if line_subject == subject:
+                statements.append(line)
+            elif line_subject > subject:
+                break
+        return statements
+
+    def closure(self, subject, uri_depth=None):
+        '''
+        Returns a list with the N-Triples lines describing a node
+
+        These are the statements of the node and of the nodes it links to,
+        following the same rules as `ckanext.dcat.subgraph.dataset_subgraph`:
+        blank nodes and distributions are always followed, and other URI
+        nodes (eg publisher, contact point) up to `uri_depth` links away.
+        Other datasets and catalogs are not followed.
+        '''
+        if uri_depth is None:
+            uri_depth = subgraph_uri_depth()
+
+        statements = []
+        seen = set([subject])
+        queue = deque([(subject, uri_depth)])
+        while queue:
+            node, depth = queue.popleft()
+            for line in self.statements(node):
+                statements.append(line)
+                predicate, _object = line.split(' ', 2)[1:]
+                _object = _object[:-3]
+                if predicate == RDF_TYPE or _object in seen:
+                    continue
+                if _object[0] == '_':
+                    next_depth = depth
+                elif _object[0] == '<':
+                    if predicate == DCAT_DISTRIBUTION:
+                        next_depth = uri_depth
+                    elif depth > 0:
+                        next_depth = depth - 1
+                    else:
+                        continue
+                    if _object in self._datasets or _object in self._catalogs:
+                        continue
+                else:
+                    continue
+                seen.add(_object)
+                queue.append((_object, next_depth))
+        return statements
+
+    def close(self):
+        '''
+        Removes the partition files
+        '''
+        for f in ((getattr(self, '_writers', None) or []) +
+                  (getattr(self, '_readers', None) or [])):
+            f.close()
+        self._writers = self._readers = None
+        path = getattr(self, 'path', None)
+        if path and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+    def __del__(self):
+        self.close()
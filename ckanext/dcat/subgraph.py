@@ -0,0 +1,168 @@
+import hashlib
+from collections import deque
+
+from pylons import config
+
+import rdflib
+from rdflib import URIRef, BNode
+from rdflib.namespace import Namespace, RDF
+
+from ckan.plugins import toolkit
+
+DCAT = Namespace('http://www.w3.org/ns/dcat#')
+
+SUBGRAPHS_CONFIG = 'ckanext.dcat.parser.subgraphs'
+SUBGRAPH_URI_DEPTH_CONFIG = 'ckanext.dcat.parser.subgraph_uri_depth'
+
+# Number of links to URI nodes (eg agents) followed from a dataset or
+# distribution
+DEFAULT_URI_DEPTH = 1
+
+# Links always followed, regardless of the depth
+FOLLOWED_PREDICATES = (DCAT.distribution,)
+
+# Nodes of these types are never included on other nodes subgraphs
+EXCLUDED_TYPES = (DCAT.Dataset, DCAT.Catalog)
+
+# Predicate used to mark the dataset node on subgraphs serialized as
+# N-Triples, as blank node labels are not kept when parsing them
+DATASET_MARKER = URIRef('urn:ckanext-dcat:subgraph-dataset')
+
+
+def use_subgraphs():
+    '''
+    Returns whether the parsers should run the profiles on per-dataset
+    subgraphs, as defined in `ckanext.dcat.parser.subgraphs` (defaults to
+    False)
+    '''
+    return toolkit.asbool(config.get(SUBGRAPHS_CONFIG, False))
+
+
+def subgraph_uri_depth():
+    '''
+    Returns the number of links to URI nodes followed when extracting
+    subgraphs, as defined in `ckanext.dcat.parser.subgraph_uri_depth`
+    (defaults to 1)
+    '''
+    return int(config.get(SUBGRAPH_URI_DEPTH_CONFIG, DEFAULT_URI_DEPTH))
+
+
+def dataset_subgraph(graph, dataset_ref, uri_depth=None):
+    '''
+    Returns a new graph with the concise bounded description of a dataset
+
+    This includes all the statements about the dataset and, recursively,
+    about the nodes it links to:
+
+    * Blank nodes are always followed.
+    * Distributions (dcat:distribution) are always followed.
+    * Other URI nodes (eg publisher or contact point agents, spatial
+      locations) are followed up to `uri_depth` links (defaults to the
+      `ckanext.dcat.parser.subgraph_uri_depth` option, 1) away from the
+      dataset or distribution.
+
+    Other datasets and catalogs are never followed.
+    '''
+    if uri_depth is None:
+        uri_depth = subgraph_uri_depth()
+
+    subgraph = rdflib.Graph()
+
+    seen = set([dataset_ref])
+    queue = deque([(dataset_ref, uri_depth)])
+    while queue:
+        node, depth = queue.popleft()
+        for predicate, _object in graph.predicate_objects(node):
+            subgraph.add((node, predicate, _object))
+
+            if predicate == RDF.type or _object in seen:
+                continue
+            if isinstance(_object, BNode):
+                next_depth = depth
+            elif isinstance(_object, URIRef):
+                if predicate in FOLLOWED_PREDICATES:
+                    next_depth = uri_depth
+                elif depth > 0:
+                    next_depth = depth - 1
+                else:
+                    continue
+                if _excluded(graph, _object):
+                    continue
+            else:
+                continue
+
+            seen.add(_object)
+            queue.append((_object, next_depth))
+
+    return subgraph
+
+
+def parse_dataset_subgraph(dataset_n3, data):
+    '''
+    Parses a dataset subgraph serialized as N-Triples
+
+    `dataset_n3` is the dataset node as it appears on `data`, in N-Triples
+    notation (eg `<http://example.org/dataset/1>` or `_:b1`). Other dataset
+    nodes that may be included on the subgraph (eg blank nodes) are
+    ignored.
+
+    Returns a tuple with the dataset reference and the graph
+    '''
+    if isinstance(data, unicode):
+        data = data.encode('utf8')
+    if isinstance(dataset_n3, unicode):
+        dataset_n3 = dataset_n3.encode('utf8')
+
+    subgraph = rdflib.Graph()
+    subgraph.parse(data='{0}\n{1} <{2}> "" .\n'.format(
+        data, dataset_n3, str(DATASET_MARKER)), format='nt')
+
+    dataset_ref = next(subgraph.subjects(DATASET_MARKER, None))
+    subgraph.remove((dataset_ref, DATASET_MARKER, None))
+
+    return dataset_ref, subgraph
+
+
+def _excluded(graph, node):
+    for _type in EXCLUDED_TYPES:
+        if (node, RDF.type, _type) in graph:
+            return True
+    return False
+
+
+def graph_hash(graph):
+    '''
+    Returns a hash of the contents of a graph, that does not depend on the
+    blank node identifiers
+
+    Blank nodes are replaced by a hash of the statements about them, so
+    the same dataset subgraph parsed twice gets the same hash, and it can be
+    used to detect changes on the source.
+    '''
+    labels = {}
+
+    def label(node, path=()):
+        if not isinstance(node, BNode):
+            return node.n3()
+        if node in labels:
+            return labels[node]
+        if node in path:
+            # Cycle between blank nodes
+            return '_:cycle'
+        value = '_:' + _sha1(sorted(
+            '{0} {1}'.format(predicate.n3(), label(_object, path + (node,)))
+            for predicate, _object in graph.predicate_objects(node)))
+        labels[node] = value
+        return value
+
+    return _sha1(sorted(
+        u'{0} {1} {2}'.format(label(s), p.n3(), label(o))
+        for s, p, o in graph))
+
+
+def _sha1(lines):
+    h = hashlib.sha1()
+    for line in lines:
+        h.update(line.encode('utf8'))
+        h.update('\n')
+    return h.hexdigest()
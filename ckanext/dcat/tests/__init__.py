@@ -5,3 +5,71 @@ try:
 except ImportError:
     import pkgutil
     __path__ = pkgutil.extend_path(__path__, __name__)
+
+import os
+import json
+
+
+def example_path(name):
+    '''
+    Returns the path of a file in the examples directory
+    '''
+    return os.path.join(os.path.dirname(__file__), '..', '..', '..',
+                        'examples', name)
+
+
+def example_contents(name):
+    '''
+    Returns the contents of a file in the examples directory
+    '''
+    with open(example_path(name), 'r') as f:
+        return f.read()
+
+
+def example_dataset_dict():
+    '''
+    Returns the dataset dict in examples/ckan_dataset.json
+    '''
+    return json.loads(example_contents('ckan_dataset.json'))
+
+
+def example_dataset_dicts(count=3):
+    '''
+    Returns `count` copies of the examples/ckan_dataset.json dataset, with
+    different ids and names
+    '''
+    datasets = []
+    for i in xrange(count):
+        dataset_dict = example_dataset_dict()
+        dataset_dict['id'] = 'dataset-{0}'.format(i)
+        dataset_dict['name'] = 'test-dataset-{0}'.format(i)
+        datasets.append(dataset_dict)
+    return datasets
+
+
+def minimal_dataset_dicts(count=3):
+    '''
+    Returns `count` datasets with just the fields needed to serialize them
+    and cache their fragments
+    '''
+    return [
+        {
+            'id': 'dataset-{0}'.format(i),
+            'name': 'test-dataset-{0}'.format(i),
+            'title': 'Test DCAT dataset {0}'.format(i),
+            'metadata_modified': '2016-01-0{0}T10:00:00'.format(i + 1),
+        }
+        for i in xrange(count)
+    ]
+
+
+def sorted_parsed_datasets(parser):
+    '''
+    Returns the datasets parsed by `parser`, sorted so they can be compared
+    regardless of the graph ordering
+    '''
+    datasets = sorted(parser.datasets(), key=lambda d: d['title'])
+    for dataset in datasets:
+        for key in ('resources', 'tags'):
+            dataset[key].sort(key=lambda v: v.get('url') or v.get('name'))
+    return datasets
@@ -1,4 +1,5 @@
 import nose
+import mock
 
 from pylons import config
 
@@ -7,10 +8,12 @@ from rdflib.namespace import Namespace, RDF
 
 from ckanext.dcat.processors import (
     RDFParser,
+    RDFSerializer,
     RDFParserException,
     RDFProfileException,
     DEFAULT_RDF_PROFILES,
-    RDF_PROFILES_CONFIG_OPTION
+    RDF_PROFILES_CONFIG_OPTION,
+    RDFProfileRegistry,
 )
 
 from ckanext.dcat.profiles import RDFProfile
@@ -70,6 +73,31 @@ class MockRDFProfile2(RDFProfile):
         return dataset_dict
 
 
+class MockLifecycleRDFProfile(RDFProfile):
+
+    instances = 0
+
+    def __init__(self, *args, **kwargs):
+        super(MockLifecycleRDFProfile, self).__init__(*args, **kwargs)
+        MockLifecycleRDFProfile.instances += 1
+        self.namespaces_bound = 0
+        self.datasets = 0
+
+    def bind_namespaces(self):
+        self.namespaces_bound += 1
+
+    def before_dataset(self):
+        super(MockLifecycleRDFProfile, self).before_dataset()
+        self.datasets += 1
+
+    def parse_dataset(self, dataset_dict, dataset_ref):
+
+        dataset_dict['namespaces_bound'] = self.namespaces_bound
+        dataset_dict['datasets'] = self.datasets
+
+        return dataset_dict
+
+
 class TestRDFParser(object):
 
     def test_default_profile(self):
@@ -119,6 +147,50 @@ class TestRDFParser(object):
             assert dataset['profile_1']
             assert dataset['profile_2']
 
+    def test_profiles_are_reused_for_all_datasets(self):
+
+        MockLifecycleRDFProfile.instances = 0
+
+        p = RDFParser()
+
+        p._profiles = [MockLifecycleRDFProfile]
+
+        p.g = _default_graph()
+
+        datasets = [d for d in p.datasets()]
+
+        eq_(MockLifecycleRDFProfile.instances, 1)
+        eq_([d['namespaces_bound'] for d in datasets], [1, 1, 1])
+        eq_(sorted([d['datasets'] for d in datasets]), [1, 2, 3])
+
+        # A new graph reuses the instances, binding the namespaces to it
+        p.g = _default_graph()
+
+        datasets = [d for d in p.datasets()]
+
+        eq_(MockLifecycleRDFProfile.instances, 1)
+        eq_([d['namespaces_bound'] for d in datasets], [2, 2, 2])
+        assert p._get_profiles()[0].g is p.g
+
+    def test_profiles_are_reused_for_dataset_graphs(self):
+
+        MockLifecycleRDFProfile.instances = 0
+
+        s = RDFSerializer()
+        s._profiles = [MockLifecycleRDFProfile]
+
+        for i in xrange(3):
+            s.serialize_dataset_fragments(
+                {'id': 'dataset-{0}'.format(i),
+                 'name': 'dataset-{0}'.format(i)}, ['nt'])
+
+        profile = s._profile_instances[0]
+
+        # The same dataset graph is used for all the datasets
+        eq_(MockLifecycleRDFProfile.instances, 1)
+        eq_(profile.namespaces_bound, 1)
+        eq_(profile.datasets, 3)
+
     def test_parse_data(self):
 
         data = '''<?xml version="1.0" encoding="utf-8" ?>
@@ -208,3 +280,44 @@ class TestRDFParser(object):
         p.g = Graph()
 
         eq_(len([d for d in p.datasets()]), 0)
+
+
+class TestRDFProfileRegistry(object):
+
+    @mock.patch('ckanext.dcat.processors.iter_entry_points')
+    def test_entry_points_are_only_scanned_once(self, mock_iter_entry_points):
+
+        from pkg_resources import iter_entry_points
+        mock_iter_entry_points.side_effect = iter_entry_points
+
+        registry = RDFProfileRegistry()
+
+        profiles = registry.get_profiles(['euro_dcat_ap'])
+        eq_(profiles[0].name, 'euro_dcat_ap')
+
+        eq_(registry.get_profiles(['euro_dcat_ap']), profiles)
+
+        eq_(mock_iter_entry_points.call_count, 1)
+
+    def test_register(self):
+
+        registry = RDFProfileRegistry()
+
+        registry.register('mock_1', MockRDFProfile1)
+        registry.register('mock_2', MockRDFProfile2)
+
+        eq_(registry.get_profiles(['mock_2', 'mock_1']),
+            [MockRDFProfile2, MockRDFProfile1])
+        eq_(MockRDFProfile1.name, 'mock_1')
+
+        registry.reset()
+
+        eq_(registry.get_profile('mock_1'), None)
+
+    def test_unknown_profiles(self):
+
+        registry = RDFProfileRegistry()
+
+        nose.tools.assert_raises(RDFProfileException,
+                                 registry.get_profiles,
+                                 ['euro_dcat_ap', 'not_found'])
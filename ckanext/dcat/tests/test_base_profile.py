@@ -1,4 +1,5 @@
 import nose
+import mock
 
 from rdflib import Graph, URIRef, Literal
 from rdflib.namespace import Namespace
@@ -135,6 +136,29 @@ class TestBaseRDFProfile(object):
         eq_(len(value), 2)
         eq_(sorted(value), ['moon', 'space'])
 
+    def test_objects_prefetched(self):
+
+        p = RDFProfile(_default_graph())
+        dataset_ref = URIRef('http://example.org/datasets/1')
+
+        eq_(p._object_value(dataset_ref, DCT.title), 'Test Dataset 1')
+
+        with mock.patch.object(p.g, 'predicate_objects') as mock_lookup:
+            # All statements of the subject were read on the first lookup
+            eq_(p._object_value(dataset_ref, DCT.title), 'Test Dataset 1')
+            eq_(len(p._objects(dataset_ref, DCAT.distribution)), 2)
+            eq_(p._object(dataset_ref, DCT.unknown_property), None)
+
+            eq_(mock_lookup.call_count, 0)
+
+        p.g.add((dataset_ref, TEST.some_number, Literal('23')))
+
+        eq_(p._object_value_int(dataset_ref, TEST.some_number), None)
+
+        p.before_dataset()
+
+        eq_(p._object_value_int(dataset_ref, TEST.some_number), 23)
+
     def test_object_list_not_found(self):
 
         p = RDFProfile(_default_graph())
@@ -213,6 +237,36 @@ class TestBaseRDFProfile(object):
         eq_(start, '1904-01-01')
         eq_(end, '2014-03-22')
 
+    def test_time_interval_values_unchanged(self):
+
+        data = '''<?xml version="1.0" encoding="utf-8" ?>
+        <rdf:RDF
+         xmlns:dct="http://purl.org/dc/terms/"
+         xmlns:schema="http://schema.org/"
+         xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+         xmlns:rdfs="http://www.w3.org/2000/01/rdf-schema#">
+        <rdfs:SomeClass rdf:about="http://example.org">
+            <dct:temporal>
+                <dct:PeriodOfTime>
+                    <schema:startDate>1904-05</schema:startDate>
+                    <schema:endDate>2013-01-05T10:00:00Z</schema:endDate>
+                </dct:PeriodOfTime>
+            </dct:temporal>
+        </rdfs:SomeClass>
+        </rdf:RDF>
+        '''
+
+        g = Graph()
+
+        g.parse(data=data)
+
+        p = RDFProfile(g)
+
+        start, end = p._time_interval(URIRef('http://example.org'), DCT.temporal)
+
+        eq_(start, '1904-05')
+        eq_(end, '2013-01-05T10:00:00Z')
+
     def test_publisher_foaf(self):
 
         data = '''<?xml version="1.0" encoding="utf-8" ?>
@@ -301,3 +355,53 @@ class TestBaseRDFProfile(object):
 
         eq_(contact['name'], 'Point of Contact')
         eq_(contact['email'], 'mailto:contact@some.org')
+
+    def test_get_dict_value(self):
+
+        dataset_dict = {
+            'title': 'Root title',
+            'extras': [
+                {'key': 'title', 'value': 'Extra title'},
+                {'key': 'dcat_version', 'value': 'Legacy version'},
+                {'key': 'version', 'value': 'Extra version'},
+                {'key': 'dcat_language', 'value': 'Legacy language'},
+                {'key': 'theme', 'value': 'First theme'},
+                {'key': 'theme', 'value': 'Second theme'},
+            ]
+        }
+
+        p = RDFProfile(Graph())
+
+        eq_(p._get_dict_value(dataset_dict, 'title'), 'Root title')
+        eq_(p._get_dict_value(dataset_dict, 'version'), 'Extra version')
+        eq_(p._get_dict_value(dataset_dict, 'dcat_version'), 'Legacy version')
+        eq_(p._get_dict_value(dataset_dict, 'language'), 'Legacy language')
+        eq_(p._get_dict_value(dataset_dict, 'theme'), 'First theme')
+        eq_(p._get_dict_value(dataset_dict, 'not_there'), None)
+        eq_(p._get_dict_value(dataset_dict, 'not_there', 'default'), 'default')
+        eq_(p._get_dict_value({}, 'title', 'default'), 'default')
+
+    def test_get_dict_value_extras_changed(self):
+
+        dataset_dict = {
+            'extras': [
+                {'key': 'version', 'value': '1.0'},
+            ]
+        }
+
+        p = RDFProfile(Graph())
+
+        eq_(p._get_dict_value(dataset_dict, 'version'), '1.0')
+        eq_(len(p._extras_indexes), 1)
+
+        dataset_dict['extras'].append({'key': 'language', 'value': 'en'})
+
+        eq_(p._get_dict_value(dataset_dict, 'language'), 'en')
+
+        dataset_dict['extras'] = [{'key': 'version', 'value': '2.0'}]
+
+        eq_(p._get_dict_value(dataset_dict, 'version'), '2.0')
+
+        p.before_dataset()
+
+        eq_(p._extras_indexes, {})
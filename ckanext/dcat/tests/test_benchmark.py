@@ -0,0 +1,88 @@
+import nose
+
+from pylons import config
+
+from ckanext.dcat import benchmark
+from ckanext.dcat.cache import invalidate_last_catalog_modification
+from ckanext.dcat.processors import RDFParser
+
+eq_ = nose.tools.eq_
+
+
+class TestBenchmark(object):
+
+    def setup(self):
+        self.original_config = config.copy()
+
+    def teardown(self):
+        config.clear()
+        config.update(self.original_config)
+        invalidate_last_catalog_modification()
+
+    def test_synthetic_datasets(self):
+
+        datasets = benchmark.synthetic_datasets(5)
+
+        eq_(len(datasets), 5)
+        eq_(datasets, benchmark.synthetic_datasets(5))
+
+        for dataset in datasets:
+            assert 1 <= len(dataset['resources']) <= 10
+
+    def test_synthetic_graph(self):
+
+        benchmark.setup_environment()
+
+        data = benchmark.synthetic_graph(5, 'nt')
+
+        p = RDFParser()
+        p.parse(data, _format='nt')
+
+        eq_(len([d for d in p.datasets()]), 5)
+
+    def test_run(self):
+
+        results = benchmark.run(tasks=['serialize_catalog', 'ckan_to_dcat'],
+                                sizes=[5], formats=['ttl', 'nt'],
+                                isolate=False)
+
+        eq_([(r['task'], r['format']) for r in results['results']],
+            [('serialize_catalog', 'ttl'), ('serialize_catalog', 'nt'),
+             ('ckan_to_dcat', None)])
+
+        for result in results['results']:
+            assert 'error' not in result, result['error']
+            eq_(result['datasets'], 5)
+            assert result['seconds'] >= 0
+            assert result['peak_rss_kb'] > 0
+
+    def test_scaled_examples(self):
+
+        benchmark.setup_environment()
+
+        data = benchmark.scaled_examples(12, 'nt')
+
+        p = RDFParser()
+        p.parse(data, _format='nt')
+        datasets = [d for d in p.datasets()]
+
+        eq_(len(datasets), 12)
+
+        # Each copy gets its own URI
+        uris = set(extra['value'] for d in datasets
+                   for extra in d['extras'] if extra['key'] == 'uri')
+        eq_(len(uris), 12)
+
+    def test_run_stores(self):
+
+        results = benchmark.run(tasks=['parse', 'ckan_to_dcat'],
+                                sizes=[5], formats=['nt'],
+                                stores=['default', 'compact', 'sqlite'],
+                                isolate=False)
+
+        eq_([(r['task'], r['store']) for r in results['results']],
+            [('parse', 'default'), ('parse', 'compact'), ('parse', 'sqlite'),
+             ('ckan_to_dcat', None)])
+
+        for result in results['results']:
+            assert 'error' not in result, result['error']
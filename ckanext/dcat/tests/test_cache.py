@@ -0,0 +1,350 @@
+import shutil
+import tempfile
+
+import nose
+import mock
+
+from rdflib import Graph, URIRef, Literal
+from rdflib.namespace import RDF
+
+from ckanext.dcat.cache import (LRUCacheBackend,
+                                FileSystemCacheBackend,
+                                RedisCacheBackend,
+                                FragmentCache,
+                                ValueCache,
+                                last_catalog_modification,
+                                invalidate_last_catalog_modification,
+                                _search_last_catalog_modification)
+from ckanext.dcat.processors import RDFSerializer
+from ckanext.dcat.profiles import RDFProfile, DCAT, DCT
+from ckanext.dcat.tests import minimal_dataset_dicts
+from ckanext.dcat.utils import catalog_uri, dataset_uri
+
+eq_ = nose.tools.eq_
+
+
+class FakeRedis(object):
+    '''
+    Minimal in-memory stand-in for a Redis client
+    '''
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+        if ex:
+            self.expires[key] = ex
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def keys(self, pattern):
+        prefix = pattern.rstrip('*')
+        return [key for key in self.data if key.startswith(prefix)]
+
+
+class CountingProfile(RDFProfile):
+
+    calls = 0
+
+    def graph_from_dataset(self, dataset_dict, dataset_ref):
+        CountingProfile.calls += 1
+        self.g.add((dataset_ref, RDF.type, DCAT.Dataset))
+        self.g.add((dataset_ref, DCT.title, Literal(dataset_dict['title'])))
+
+
+class TestLRUCacheBackend(object):
+
+    def test_get_set(self):
+
+        backend = LRUCacheBackend(10)
+
+        backend.set('a', 'value a')
+
+        eq_(backend.get('a'), 'value a')
+        eq_(backend.get('b'), None)
+
+    def test_eviction(self):
+
+        backend = LRUCacheBackend(2)
+
+        backend.set('a', 'value a')
+        backend.set('b', 'value b')
+        # Access a so b is the least recently used one
+        backend.get('a')
+        backend.set('c', 'value c')
+
+        eq_(len(backend), 2)
+        eq_(backend.evictions, 1)
+        eq_(backend.get('b'), None)
+        eq_(backend.get('a'), 'value a')
+        eq_(backend.get('c'), 'value c')
+
+    def test_eviction_max_size(self):
+
+        backend = LRUCacheBackend(10, max_size=10)
+
+        backend.set('a', '12345')
+        backend.set('b', '12345')
+        eq_(backend.size, 10)
+
+        backend.set('c', '123')
+
+        eq_(backend.evictions, 1)
+        eq_(backend.size, 8)
+        eq_(backend.get('a'), None)
+
+        # Values bigger than the limit are not stored
+        backend.set('d', '12345678901')
+
+        eq_(backend.get('d'), None)
+        eq_(backend.size, 8)
+
+
+class TestFileSystemCacheBackend(object):
+
+    def setup(self):
+        self.path = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.path)
+
+    def test_get_set(self):
+
+        backend = FileSystemCacheBackend(self.path, 10)
+
+        backend.set('a', 'value a')
+
+        eq_(backend.get('a'), 'value a')
+        eq_(backend.get('b'), None)
+
+        # Values are available to other instances
+        eq_(FileSystemCacheBackend(self.path).get('a'), 'value a')
+
+    def test_eviction(self):
+
+        backend = FileSystemCacheBackend(self.path, 10)
+
+        for i in xrange(11):
+            backend.set(str(i), 'value')
+
+        eq_(len(backend), 9)
+        eq_(backend.evictions, 2)
+
+    def test_clear(self):
+
+        backend = FileSystemCacheBackend(self.path, 10)
+
+        backend.set('a', 'value a')
+        backend.clear()
+
+        eq_(backend.get('a'), None)
+        eq_(len(backend), 0)
+
+
+class TestRedisCacheBackend(object):
+
+    def test_get_set(self):
+
+        client = FakeRedis()
+        backend = RedisCacheBackend(client=client, ttl=60)
+
+        backend.set('a', 'value a')
+
+        eq_(backend.get('a'), 'value a')
+        eq_(client.expires['ckanext-dcat:fragment:a'], 60)
+
+        backend.clear()
+
+        eq_(backend.get('a'), None)
+
+
+class TestFragmentCache(object):
+
+    def test_key(self):
+
+        cache = FragmentCache(LRUCacheBackend())
+
+        dataset = minimal_dataset_dicts()[0]
+
+        eq_(cache.key(dataset, ['euro_dcat_ap'], 'nt'),
+            'dataset-0:2016-01-01T10:00:00:euro_dcat_ap:nt')
+
+        eq_(cache.key({'id': 'dataset-0'}, ['euro_dcat_ap'], 'nt'), None)
+
+    def test_stats(self):
+
+        cache = FragmentCache(LRUCacheBackend())
+
+        dataset = minimal_dataset_dicts()[0]
+
+        eq_(cache.get(dataset, ['euro_dcat_ap'], 'nt'), None)
+
+        cache.set(dataset, ['euro_dcat_ap'], 'nt', 'fragment')
+
+        eq_(cache.get(dataset, ['euro_dcat_ap'], 'nt'), 'fragment')
+
+        # Changes on the dataset invalidate the fragment
+        dataset['metadata_modified'] = '2016-02-01T10:00:00'
+        eq_(cache.get(dataset, ['euro_dcat_ap'], 'nt'), None)
+
+        eq_(cache.stats(), {'hits': 1, 'misses': 2, 'evictions': 0})
+
+
+class TestSerializerFragmentCache(object):
+
+    def setup(self):
+        CountingProfile.calls = 0
+
+    def _serializer(self, cache):
+        s = RDFSerializer(fragment_cache=cache)
+        s._profiles = [CountingProfile]
+        return s
+
+    def test_serialize_catalog_uses_cached_fragments(self):
+
+        cache = FragmentCache(FileSystemCacheBackend(tempfile.mkdtemp()))
+
+        try:
+            for i in xrange(2):
+                s = self._serializer(cache)
+                output = s.serialize_catalog({}, minimal_dataset_dicts(), _format='nt')
+
+                g = Graph()
+                g.parse(data=output, format='nt')
+
+                eq_(len([d for d in g.subjects(RDF.type, DCAT.Dataset)]), 3)
+                assert (URIRef(catalog_uri()), DCAT.dataset,
+                        URIRef(dataset_uri(minimal_dataset_dicts()[1]))) in g
+        finally:
+            shutil.rmtree(cache.backend.path)
+
+        # Profiles were only run on the first request
+        eq_(CountingProfile.calls, 3)
+        eq_(cache.hits, 3)
+        eq_(cache.misses, 3)
+
+    def test_serialize_catalog_stream_uses_cached_fragments(self):
+
+        cache = FragmentCache(RedisCacheBackend(client=FakeRedis()))
+
+        outputs = []
+        for i in xrange(2):
+            s = self._serializer(cache)
+            outputs.append(''.join(s.serialize_catalog_stream(
+                {}, minimal_dataset_dicts(), _format='ttl')))
+
+        eq_(outputs[0], outputs[1])
+        eq_(CountingProfile.calls, 3)
+
+        g = Graph()
+        g.parse(data=outputs[1], format='turtle')
+
+        eq_(len([d for d in g.subjects(RDF.type, DCAT.Dataset)]), 3)
+
+
+class TestValueCache(object):
+
+    def test_get(self):
+
+        cache = ValueCache()
+        compute = mock.Mock(return_value='value')
+
+        eq_(cache.get(compute, 60), 'value')
+        eq_(cache.get(compute, 60), 'value')
+
+        eq_(compute.call_count, 1)
+
+    def test_invalidate(self):
+
+        cache = ValueCache()
+        compute = mock.Mock(return_value='value')
+
+        cache.get(compute, 60)
+        cache.invalidate()
+        cache.get(compute, 60)
+
+        eq_(compute.call_count, 2)
+
+    def test_invalidate_while_computing(self):
+
+        cache = ValueCache()
+
+        def compute():
+            # Eg a dataset updated while querying the value
+            cache.invalidate()
+            return 'old value'
+
+        eq_(cache.get(compute, 60), 'old value')
+
+        # The outdated value was not cached
+        eq_(cache.get(mock.Mock(return_value='value'), 60), 'value')
+
+    def test_ttl(self):
+
+        cache = ValueCache()
+        compute = mock.Mock(return_value='value')
+
+        with mock.patch('ckanext.dcat.cache.time.time', return_value=1000):
+            cache.get(compute, 60)
+        with mock.patch('ckanext.dcat.cache.time.time', return_value=1059):
+            cache.get(compute, 60)
+
+        eq_(compute.call_count, 1)
+
+        with mock.patch('ckanext.dcat.cache.time.time', return_value=1060):
+            cache.get(compute, 60)
+
+        eq_(compute.call_count, 2)
+
+        # A TTL of 0 disables the cache
+        cache.get(compute, 0)
+
+        eq_(compute.call_count, 3)
+
+
+class TestLastCatalogModification(object):
+
+    def setup(self):
+        invalidate_last_catalog_modification()
+
+    def teardown(self):
+        invalidate_last_catalog_modification()
+
+    @mock.patch('ckanext.dcat.cache._search_last_catalog_modification')
+    def test_cached_until_invalidated(self, mock_search):
+
+        mock_search.return_value = '2016-01-01T10:00:00'
+
+        eq_(last_catalog_modification(), '2016-01-01T10:00:00')
+        eq_(last_catalog_modification(), '2016-01-01T10:00:00')
+
+        eq_(mock_search.call_count, 1)
+
+        # Called by the dcat plugin after a dataset is created or updated
+        mock_search.return_value = '2016-02-01T10:00:00'
+        invalidate_last_catalog_modification()
+
+        eq_(last_catalog_modification(), '2016-02-01T10:00:00')
+
+        eq_(mock_search.call_count, 2)
+
+    @mock.patch('ckan.plugins.toolkit.get_action')
+    def test_deleted_datasets(self, mock_get_action):
+
+        mock_get_action.return_value.return_value = {
+            'name': 'site_user',
+            'results': [{'metadata_modified': '2016-01-01T10:00:00'}],
+        }
+
+        eq_(_search_last_catalog_modification(), '2016-01-01T10:00:00')
+
+        # Deleting a dataset modifies the catalog
+        search_data_dict = mock_get_action.return_value.call_args[0][1]
+        eq_(search_data_dict['fq'], '+state:(active OR deleted)')
@@ -0,0 +1,136 @@
+import os
+import gzip
+import json
+import shutil
+import tempfile
+
+import nose
+import mock
+
+from pylons import config
+from rdflib import Graph
+from rdflib.namespace import RDF
+
+from ckanext.dcat.commands import GenerateStaticDCATCommand, MANIFEST_FILE
+from ckanext.dcat.processors import (RDFSerializer,
+                                     SERIALIZER_CHUNK_SIZE_CONFIG_OPTION)
+from ckanext.dcat.profiles import DCAT
+from ckanext.dcat.tests import minimal_dataset_dicts
+
+eq_ = nose.tools.eq_
+
+
+class TestGenerateStaticCatalog(object):
+
+    def setup(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.cmd = GenerateStaticDCATCommand('generate_static')
+        self.cmd.log = mock.Mock()
+
+    def teardown(self):
+        shutil.rmtree(self.output_dir)
+
+    def _dump_graph(self, _format, rdflib_format):
+        with gzip.open(os.path.join(self.output_dir,
+                                    'catalog.{0}.gz'.format(_format))) as f:
+            g = Graph()
+            g.parse(data=f.read(), format=rdflib_format)
+        return g
+
+    @mock.patch.object(RDFSerializer, '_dataset_graph', autospec=True,
+                       side_effect=RDFSerializer._dataset_graph)
+    def test_generate_catalog(self, mock_dataset_graph):
+
+        datasets = minimal_dataset_dicts()
+        self.cmd._datasets = lambda: iter(datasets)
+
+        self.cmd.generate_catalog(self.output_dir, ['ttl', 'nt', 'rdf'])
+
+        eq_(mock_dataset_graph.call_count, 3)
+
+        for _format, rdflib_format in (('ttl', 'turtle'),
+                                       ('nt', 'nt'),
+                                       ('rdf', 'xml')):
+            g = self._dump_graph(_format, rdflib_format)
+            eq_(len([d for d in g.subjects(RDF.type, DCAT.Dataset)]), 3)
+            eq_(len([d for d in g.objects(None, DCAT.dataset)]), 3)
+
+        with open(os.path.join(self.output_dir, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+
+        eq_(manifest['datasets']['dataset-1'], '2016-01-02T10:00:00')
+
+        # Only modified datasets are serialized on subsequent runs
+        datasets[1]['metadata_modified'] = '2016-02-01T10:00:00'
+        datasets[1]['title'] = 'Updated title'
+
+        self.cmd.generate_catalog(self.output_dir, ['ttl', 'nt', 'rdf'])
+
+        eq_(mock_dataset_graph.call_count, 4)
+
+        g = self._dump_graph('ttl', 'turtle')
+        eq_(len([d for d in g.subjects(RDF.type, DCAT.Dataset)]), 3)
+        assert 'Updated title' in [unicode(t) for t in g.objects()]
+
+        # Fragments for the previous version are removed
+        fragments = os.listdir(os.path.join(self.output_dir, '.fragments'))
+        eq_(len(fragments), 3 * 2)
+
+    def test_generate_catalog_workers(self):
+
+        datasets = minimal_dataset_dicts()
+        self.cmd._datasets = lambda: iter(datasets)
+
+        original_config = config.copy()
+        config[SERIALIZER_CHUNK_SIZE_CONFIG_OPTION] = '1'
+        try:
+            self.cmd.generate_catalog(self.output_dir, ['ttl', 'jsonld'],
+                                      workers=2)
+        finally:
+            config.clear()
+            config.update(original_config)
+
+        for _format, rdflib_format in (('ttl', 'turtle'),
+                                       ('jsonld', 'json-ld')):
+            g = self._dump_graph(_format, rdflib_format)
+            eq_(len([d for d in g.subjects(RDF.type, DCAT.Dataset)]), 3)
+
+        with open(os.path.join(self.output_dir, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+
+        eq_(len(manifest['datasets']), 3)
+
+    def test_generate_catalog_deleted_datasets(self):
+
+        datasets = minimal_dataset_dicts()
+        self.cmd._datasets = lambda: iter(datasets)
+
+        self.cmd.generate_catalog(self.output_dir, ['nt'])
+
+        del datasets[0]
+
+        self.cmd.generate_catalog(self.output_dir, ['nt'])
+
+        g = self._dump_graph('nt', 'nt')
+        eq_(len([d for d in g.subjects(RDF.type, DCAT.Dataset)]), 2)
+
+        with open(os.path.join(self.output_dir, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+
+        eq_(sorted(manifest['datasets'].keys()), ['dataset-1', 'dataset-2'])
+
+    def test_generate_catalog_error(self):
+
+        def _datasets_with_error():
+            for dataset_dict in minimal_dataset_dicts()[:2]:
+                yield dataset_dict
+            raise ValueError('Search error')
+
+        self.cmd._datasets = _datasets_with_error
+
+        nose.tools.assert_raises(ValueError, self.cmd.generate_catalog,
+                                 self.output_dir, ['ttl', 'nt'])
+
+        # No partial dumps or manifest are left behind
+        eq_([f for f in os.listdir(self.output_dir) if f != '.fragments'],
+            [])
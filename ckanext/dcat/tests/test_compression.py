@@ -0,0 +1,160 @@
+import gzip
+from StringIO import StringIO
+
+import nose
+import mock
+
+from pylons import config
+
+from ckanext.dcat import compression
+from ckanext.dcat.cache import LRUCacheBackend
+
+eq_ = nose.tools.eq_
+
+
+def _gunzip(data):
+    return gzip.GzipFile(fileobj=StringIO(data)).read()
+
+
+class TestNegotiateEncoding(object):
+
+    @mock.patch('ckanext.dcat.compression.brotli', None)
+    def test_gzip(self):
+
+        eq_(compression.negotiate_encoding('gzip'), 'gzip')
+        eq_(compression.negotiate_encoding('deflate, gzip;q=0.8'), 'gzip')
+        eq_(compression.negotiate_encoding('x-gzip'), 'gzip')
+        eq_(compression.negotiate_encoding('*'), 'gzip')
+        eq_(compression.negotiate_encoding('br'), None)
+        eq_(compression.negotiate_encoding('gzip;q=0'), None)
+        eq_(compression.negotiate_encoding('*;q=0.5, gzip;q=0'), None)
+        eq_(compression.negotiate_encoding('identity'), None)
+        eq_(compression.negotiate_encoding(''), None)
+        eq_(compression.negotiate_encoding(None), None)
+
+    @mock.patch('ckanext.dcat.compression.brotli', mock.Mock())
+    def test_brotli(self):
+
+        eq_(compression.negotiate_encoding('gzip, deflate, br'), 'br')
+        eq_(compression.negotiate_encoding('gzip, br;q=0.5'), 'gzip')
+        eq_(compression.negotiate_encoding('gzip;q=0, br'), 'br')
+
+
+class TestCompression(object):
+
+    def setup(self):
+        self.original_config = config.copy()
+        compression._compression_cache = None
+
+    def teardown(self):
+        config.clear()
+        config.update(self.original_config)
+        compression._compression_cache = None
+
+    def test_encoded_etag(self):
+
+        eq_(compression.encoded_etag('"abc"', 'gzip'), '"abc-gzip"')
+        eq_(compression.encoded_etag('"abc"', None), '"abc"')
+
+    def test_compress(self):
+
+        content = 'test content ' * 100
+
+        compressed = compression.compress(content, 'gzip')
+
+        eq_(_gunzip(compressed), content)
+        assert len(compressed) < len(content)
+
+        # Output is deterministic
+        eq_(compression.compress(content, 'gzip'), compressed)
+
+        eq_(_gunzip(compression.compress(u'Caf\xe9', 'gzip')),
+            u'Caf\xe9'.encode('utf8'))
+
+        nose.tools.assert_raises(ValueError, compression.compress,
+                                 content, 'compress')
+
+    def test_compress_response(self):
+
+        compressed = compression.compress_response('content', '"abc"',
+                                                   'gzip')
+
+        eq_(_gunzip(compressed), 'content')
+        eq_(compression.get_compressed('"abc"', 'gzip'), compressed)
+        eq_(compression.get_compressed('"abc"', 'br'), None)
+        eq_(compression.get_compressed('"other"', 'gzip'), None)
+
+    def test_compress_response_stream(self):
+
+        chunks = ['chunk {0}\n'.format(i) for i in xrange(100)]
+
+        compressed = compression.compress_response(iter(chunks), '"abc"',
+                                                   'gzip')
+
+        # Not stored until the stream is consumed
+        eq_(compression.get_compressed('"abc"', 'gzip'), None)
+
+        compressed = ''.join(compressed)
+
+        eq_(_gunzip(compressed), ''.join(chunks))
+        eq_(compression.get_compressed('"abc"', 'gzip'), compressed)
+
+    def test_compress_response_max_item_size(self):
+
+        config[compression.COMPRESSION_CACHE_MAX_ITEM_SIZE_CONFIG] = '100'
+
+        content = ''.join(str(i) for i in xrange(1000))
+
+        compressed = compression.compress_response(content, '"abc"', 'gzip')
+        eq_(_gunzip(compressed), content)
+        eq_(compression.get_compressed('"abc"', 'gzip'), None)
+
+        chunks = [str(i) for i in xrange(1000)]
+        compressed = ''.join(compression.compress_response(
+            iter(chunks), '"def"', 'gzip'))
+        eq_(_gunzip(compressed), content)
+        eq_(compression.get_compressed('"def"', 'gzip'), None)
+
+        # Smaller responses are still stored
+        compressed = ''.join(compression.compress_response(
+            iter(['content']), '"ghi"', 'gzip'))
+        eq_(compression.get_compressed('"ghi"', 'gzip'), compressed)
+
+    @mock.patch('ckanext.dcat.compression.get_fragment_cache')
+    def test_fragment_cache_backend(self, mock_get_fragment_cache):
+
+        backend = LRUCacheBackend()
+        mock_get_fragment_cache.return_value = mock.Mock(backend=backend)
+
+        compression.compress_response('content', '"abc"', 'gzip')
+
+        eq_(len(backend), 1)
+
+    @mock.patch('ckanext.dcat.compression.get_fragment_cache')
+    def test_cache_errors(self, mock_get_fragment_cache):
+
+        backend = mock.Mock()
+        backend.get.side_effect = IOError('Cache not available')
+        backend.set.side_effect = IOError('Cache not available')
+        mock_get_fragment_cache.return_value = mock.Mock(backend=backend)
+
+        eq_(compression.get_compressed('"abc"', 'gzip'), None)
+
+        compressed = compression.compress_response('content', '"abc"',
+                                                   'gzip')
+        eq_(_gunzip(compressed), 'content')
+
+        compressed = compression.compress_response(iter(['content']),
+                                                   '"abc"', 'gzip')
+        eq_(_gunzip(''.join(compressed)), 'content')
+
+        eq_(backend.set.call_count, 2)
+
+    def test_cache_disabled(self):
+
+        config[compression.COMPRESSION_CACHE_MAX_SIZE_CONFIG] = '0'
+
+        compression.compress_response('content', '"abc"', 'gzip')
+
+        eq_(compression.get_compression_cache(), None)
+        eq_(compression.get_compressed('"abc"', 'gzip'), None)
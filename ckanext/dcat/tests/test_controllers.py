@@ -1,5 +1,9 @@
+import gzip
 import time
+from StringIO import StringIO
+
 import nose
+import mock
 
 from ckan.lib.helpers import url_for
 
@@ -10,14 +14,24 @@ try:
 except ImportError:
     from ckan.new_tests import helpers, factories
 
+try:
+    from ckan import authz
+except ImportError:
+    from ckan import new_authz as authz
+
 from ckanext.dcat.processors import RDFParser
 from ckanext.dcat.profiles import RDF, DCAT
 from ckanext.dcat.processors import HYDRA
+from ckanext.dcat.cache import last_catalog_modification
 
 eq_ = nose.tools.eq_
 assert_true = nose.tools.assert_true
 
 
+def _deny_access(context, data_dict):
+    return {'success': False}
+
+
 class TestEndpoints(helpers.FunctionalTestBase):
 
     @classmethod
@@ -305,6 +319,192 @@ class TestEndpoints(helpers.FunctionalTestBase):
         eq_(self._object_value(g, pagination, HYDRA.lastPage),
             url_for('dcat_catalog', _format='rdf', page=2, host='localhost'))
 
+    def test_dataset_conditional_get(self):
+
+        dataset = factories.Dataset()
+
+        url = url_for('dcat_dataset', _id=dataset['id'], _format='ttl')
+
+        app = self._get_test_app()
+
+        response = app.get(url)
+
+        etag = response.headers['ETag']
+        last_modified = response.headers['Last-Modified']
+
+        response = app.get(url, headers={'If-None-Match': etag}, status=304)
+        eq_(response.body, '')
+
+        app.get(url, headers={'If-Modified-Since': last_modified},
+                status=304)
+
+        # Other formats have a different ETag
+        url = url_for('dcat_dataset', _id=dataset['id'], _format='rdf')
+        app.get(url, headers={'If-None-Match': etag}, status=200)
+
+        # Changes on the dataset invalidate the ETag
+        time.sleep(1)
+        helpers.call_action('package_patch', id=dataset['id'],
+                            title='Updated title')
+
+        url = url_for('dcat_dataset', _id=dataset['id'], _format='ttl')
+        app.get(url, headers={'If-None-Match': etag}, status=200)
+        app.get(url, headers={'If-Modified-Since': last_modified},
+                status=200)
+
+    def test_catalog_conditional_get(self):
+
+        for i in xrange(2):
+            factories.Dataset()
+
+        url = url_for('dcat_catalog', _format='ttl')
+
+        app = self._get_test_app()
+
+        response = app.get(url)
+
+        etag = response.headers['ETag']
+
+        app.get(url, headers={'If-None-Match': etag}, status=304)
+
+        factories.Dataset()
+
+        app.get(url, headers={'If-None-Match': etag}, status=200)
+
+    def test_catalog_cursor_conditional_get(self):
+
+        datasets = [factories.Dataset() for i in xrange(3)]
+
+        url = url_for('dcat_catalog', _format='ttl', cursor='*')
+
+        app = self._get_test_app()
+
+        response = app.get(url)
+
+        etag = response.headers['ETag']
+
+        app.get(url, headers={'If-None-Match': etag}, status=304)
+
+        # Cursor pages are sorted oldest first, so this is not the first
+        # dataset on the page
+        time.sleep(1)
+        helpers.call_action('package_patch', id=datasets[1]['id'],
+                            title='Updated title')
+
+        app.get(url, headers={'If-None-Match': etag}, status=200)
+
+    def test_catalog_modified_invalidated(self):
+
+        dataset = factories.Dataset()
+
+        modified = last_catalog_modification()
+        eq_(modified, dataset['metadata_modified'])
+
+        time.sleep(1)
+        dataset = helpers.call_action('package_patch', id=dataset['id'],
+                                      title='Updated title')
+
+        # The cached value is invalidated once the change is committed
+        eq_(last_catalog_modification(), dataset['metadata_modified'])
+
+    def test_catalog_last_modified_deleted_dataset(self):
+
+        datasets = [factories.Dataset() for i in xrange(2)]
+
+        url = url_for('dcat_catalog', _format='ttl')
+
+        app = self._get_test_app()
+
+        response = app.get(url)
+
+        headers = {'If-Modified-Since': response.headers['Last-Modified']}
+
+        app.get(url, headers=headers, status=304)
+
+        time.sleep(1)
+        helpers.call_action('package_delete', id=datasets[1]['id'])
+
+        # The most recent active dataset has not changed, but the catalog
+        # has
+        app.get(url, headers=headers, status=200)
+
+    def test_catalog_compressed(self):
+
+        factories.Dataset()
+
+        url = url_for('dcat_catalog', _format='ttl')
+
+        app = self._get_test_app()
+
+        plain_response = app.get(url)
+        assert 'Content-Encoding' not in plain_response.headers
+
+        response = app.get(url, headers={'Accept-Encoding': 'gzip'})
+
+        eq_(response.headers['Content-Encoding'], 'gzip')
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert response.headers['ETag'] != plain_response.headers['ETag']
+
+        content = gzip.GzipFile(fileobj=StringIO(response.body)).read()
+        eq_(content, plain_response.body)
+
+        g = Graph()
+        g.parse(data=content, format='turtle')
+        eq_(len([d for d in g.subjects(RDF.type, DCAT.Dataset)]), 1)
+
+        # The compressed representation is reused
+        eq_(app.get(url, headers={'Accept-Encoding': 'gzip'}).body,
+            response.body)
+
+        app.get(url, headers={'Accept-Encoding': 'gzip',
+                              'If-None-Match': response.headers['ETag']},
+                status=304)
+
+    def test_dataset_compressed(self):
+
+        dataset = factories.Dataset()
+
+        url = url_for('dcat_dataset', _id=dataset['id'], _format='rdf')
+
+        app = self._get_test_app()
+
+        response = app.get(url, headers={'Accept-Encoding': 'gzip;q=0.5'})
+
+        eq_(response.headers['Content-Encoding'], 'gzip')
+
+        content = gzip.GzipFile(fileobj=StringIO(response.body)).read()
+        g = Graph()
+        g.parse(data=content, format='xml')
+        eq_(len([d for d in g.subjects(RDF.type, DCAT.Dataset)]), 1)
+
+        response = app.get(url, headers={'Accept-Encoding': 'gzip;q=0'})
+        assert 'Content-Encoding' not in response.headers
+
+    def test_conditional_get_not_authorized(self):
+
+        dataset = factories.Dataset()
+
+        app = self._get_test_app()
+
+        for action, url in (
+                ('dcat_catalog_show', url_for('dcat_catalog', _format='ttl')),
+                ('dcat_dataset_show', url_for('dcat_dataset',
+                                              _id=dataset['id'],
+                                              _format='ttl'))):
+            headers = {'Accept-Encoding': 'gzip'}
+            response = app.get(url, headers=headers)
+            headers['If-None-Match'] = response.headers['ETag']
+            app.get(url, headers=headers, status=304)
+
+            # Neither the conditional request nor the cached compressed
+            # response skip the auth function
+            with mock.patch.dict(authz._AuthFunctions._functions,
+                                 {action: _deny_access}):
+                app.get(url, headers=headers, status=403)
+                app.get(url, headers={'Accept-Encoding': 'gzip'},
+                        status=403)
+                app.get(url, status=403)
+
 
 class TestAcceptHeader(helpers.FunctionalTestBase):
     '''
@@ -6,6 +6,8 @@ import nose
 from rdflib import Graph, URIRef, BNode, Literal
 from rdflib.namespace import RDF
 
+from pylons import config
+
 from ckan.plugins import toolkit
 
 try:
@@ -13,7 +15,9 @@ try:
 except ImportError:
     from ckan.new_tests import helpers
 
-from ckanext.dcat.processors import RDFParser
+from ckanext.dcat.processors import (RDFParser,
+                                     PARSER_CHUNK_SIZE_CONFIG_OPTION,
+                                     PARSER_WORKERS_CONFIG_OPTION)
 from ckanext.dcat.profiles import (DCAT, DCT, ADMS, LOCN, SKOS, GSP, RDFS,
                                    GEOJSON_IMT)
 
@@ -750,3 +754,95 @@ class TestEuroDCATAPProfileParsingSpatial(BaseParseTest):
         eq_(extras['spatial_uri'], 'http://geonames/Newark')
         assert_true('spatial_text' not in extras)
         assert_true('spatial' not in extras)
+
+
+class TestEuroDCATAPProfileParsingParallel(BaseParseTest):
+
+    def setup(self):
+        self.original_config = config.copy()
+        config[PARSER_CHUNK_SIZE_CONFIG_OPTION] = '2'
+
+    def teardown(self):
+        config.clear()
+        config.update(self.original_config)
+
+    def _graph(self):
+        g = Graph()
+        for i in xrange(7):
+            dataset = URIRef('http://example.org/datasets/{0}'.format(i))
+            distribution = URIRef(
+                'http://example.org/distributions/{0}'.format(i))
+            g.add((dataset, RDF.type, DCAT.Dataset))
+            g.add((dataset, DCT.title, Literal('Dataset {0}'.format(i))))
+            g.add((dataset, DCAT.distribution, distribution))
+            g.add((distribution, RDF.type, DCAT.Distribution))
+            g.add((distribution, DCAT.accessURL,
+                   Literal('http://example.org/{0}.csv'.format(i))))
+            g.add((distribution, DCT['format'], Literal('CSV')))
+        return g
+
+    def _datasets(self, g, workers, ordered=True):
+        p = RDFParser(workers=workers)
+        p.g = g
+        return [d for d in p.datasets(ordered=ordered)]
+
+    def test_datasets(self):
+
+        g = self._graph()
+        datasets = self._datasets(g, workers=0)
+
+        eq_(len(datasets), 7)
+        eq_(self._datasets(g, workers=2), datasets)
+        eq_(datasets[0]['resources'][0]['format'], 'CSV')
+
+    def test_datasets_unordered(self):
+
+        g = self._graph()
+        key = lambda d: d['title']
+        eq_(sorted(self._datasets(g, workers=2, ordered=False), key=key),
+            sorted(self._datasets(g, workers=0), key=key))
+
+    def test_datasets_single_chunk(self):
+
+        config[PARSER_CHUNK_SIZE_CONFIG_OPTION] = '10'
+
+        g = self._graph()
+        eq_(self._datasets(g, workers=2), self._datasets(g, workers=0))
+
+    def test_datasets_nested(self):
+
+        # Blank node datasets are included on the subgraphs of the datasets
+        # linking to them, but are only parsed once
+        g = self._graph()
+        part = BNode()
+        g.add((URIRef('http://example.org/datasets/0'), DCT.hasPart, part))
+        g.add((part, RDF.type, DCAT.Dataset))
+        g.add((part, DCT.title, Literal('Part')))
+
+        datasets = self._datasets(g, workers=0)
+
+        eq_(len(datasets), 8)
+        eq_(self._datasets(g, workers=2), datasets)
+
+        p = RDFParser(workers=2)
+        p.parse(g.serialize(format='nt'), _format='nt', streaming=True)
+
+        eq_(sorted(d['title'] for d in p.datasets()),
+            sorted(d['title'] for d in datasets))
+
+    def test_workers_not_used_by_default(self):
+
+        # The option is only read by the harvesters and the command line
+        config[PARSER_WORKERS_CONFIG_OPTION] = '2'
+
+        eq_(RDFParser().workers, 0)
+
+    def test_datasets_streaming(self):
+
+        data = self._graph().serialize(format='nt')
+
+        p = RDFParser(workers=2)
+        p.parse(data, _format='nt', streaming=True)
+
+        eq_(sorted(d['title'] for d in p.datasets()),
+            ['Dataset {0}'.format(i) for i in xrange(7)])
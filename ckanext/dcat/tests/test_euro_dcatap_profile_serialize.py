@@ -1,12 +1,14 @@
 import json
 
 import nose
+import mock
 
 from pylons import config
 
 from dateutil.parser import parse as parse_date
-from rdflib import URIRef, BNode, Literal
+from rdflib import Graph, URIRef, BNode, Literal
 from rdflib.namespace import RDF
+from rdflib.compare import isomorphic
 
 from geomet import wkt
 
@@ -16,9 +18,13 @@ except ImportError:
     from ckan.new_tests import helpers, factories
 
 from ckanext.dcat import utils
-from ckanext.dcat.processors import RDFSerializer
+from ckanext.dcat.processors import (RDFSerializer, HYDRA,
+                                     SERIALIZER_CHUNK_SIZE_CONFIG_OPTION,
+                                     SERIALIZER_WORKERS_CONFIG_OPTION,
+                                     _with_dataset_ids)
 from ckanext.dcat.profiles import (DCAT, DCT, ADMS, XSD, VCARD, FOAF, SCHEMA,
-                                   SKOS, LOCN, GSP, OWL, GEOJSON_IMT)
+                                   SKOS, LOCN, GSP, OWL, GEOJSON_IMT,
+                                   namespaces)
 
 eq_ = nose.tools.eq_
 assert_true = nose.tools.assert_true
@@ -707,6 +713,24 @@ class TestEuroDCATAPProfileSerializeDataset(BaseSerializeTest):
 
         assert self._triple(g, distribution, DCAT.mediaType, resource['format'])
 
+    def test_namespaces_are_bound_once(self):
+
+        s = RDFSerializer()
+
+        with mock.patch.object(s.g, 'bind', wraps=s.g.bind) as mock_bind:
+            for i in xrange(3):
+                s.graph_from_dataset({
+                    'id': 'dataset-{0}'.format(i),
+                    'name': 'test-dataset-{0}'.format(i),
+                    'title': 'Test DCAT dataset {0}'.format(i),
+                })
+
+        eq_(mock_bind.call_count, len(namespaces))
+
+        prefixes = dict(s.g.namespaces())
+        eq_(unicode(prefixes['dcat']), unicode(DCAT))
+        eq_(unicode(prefixes['dct']), unicode(DCT))
+
 
 class TestEuroDCATAPProfileSerializeCatalog(BaseSerializeTest):
 
@@ -764,3 +788,177 @@ class TestEuroDCATAPProfileSerializeCatalog(BaseSerializeTest):
         eq_(unicode(catalog), utils.catalog_uri())
 
         assert self._triple(g, catalog, DCT.modified, dataset['metadata_modified'], XSD.dateTime)
+
+
+class TestEuroDCATAPProfileSerializeCatalogStream(BaseSerializeTest):
+
+    def _datasets(self):
+        return [
+            {
+                'id': 'ds-{0}'.format(i),
+                'name': 'test-dataset-{0}'.format(i),
+                'title': 'Test DCAT dataset {0}'.format(i),
+            }
+            for i in xrange(3)
+        ]
+
+    def test_serialize_catalog_stream(self):
+
+        pagination_info = {
+            'count': 3,
+            'items_per_page': 100,
+            'current': 'http://example.com/catalog.ttl?page=1',
+        }
+
+        s = RDFSerializer()
+
+        chunks = [chunk for chunk in s.serialize_catalog_stream(
+            {}, self._datasets(), _format='ttl',
+            pagination_info=pagination_info)]
+
+        # Catalog, one per dataset and pagination
+        eq_(len(chunks), 5)
+
+        g = Graph()
+        g.parse(data=''.join(chunks), format='turtle')
+
+        catalog = URIRef(utils.catalog_uri())
+
+        assert self._triple(g, catalog, RDF.type, DCAT.Catalog)
+        eq_(len([d for d in g.subjects(RDF.type, DCAT.Dataset)]), 3)
+        eq_(len([d for d in g.objects(catalog, DCAT.dataset)]), 3)
+        assert self._triple(g, URIRef(pagination_info['current']),
+                            RDF.type, HYDRA.PagedCollection)
+
+    def test_serialize_catalog_stream_nt(self):
+
+        s = RDFSerializer()
+
+        output = ''.join(s.serialize_catalog_stream(
+            {}, self._datasets(), _format='nt'))
+
+        g = Graph()
+        g.parse(data=output, format='nt')
+
+        eq_(len([d for d in g.subjects(RDF.type, DCAT.Dataset)]), 3)
+
+    def test_serialize_catalog_stream_not_streamable_format(self):
+
+        s = RDFSerializer()
+
+        chunks = [chunk for chunk in s.serialize_catalog_stream(
+            {}, self._datasets(), _format='xml')]
+
+        eq_(len(chunks), 1)
+
+        g = Graph()
+        g.parse(data=chunks[0], format='xml')
+
+        eq_(len([d for d in g.subjects(RDF.type, DCAT.Dataset)]), 3)
+
+
+class TestEuroDCATAPProfileSerializeCatalogParallel(BaseSerializeTest):
+
+    def setup(self):
+        self.original_config = config.copy()
+        config[SERIALIZER_CHUNK_SIZE_CONFIG_OPTION] = '2'
+
+    def teardown(self):
+        config.clear()
+        config.update(self.original_config)
+
+    def _datasets(self):
+        return [
+            {
+                'id': 'ds-{0}'.format(i),
+                'name': 'test-dataset-{0}'.format(i),
+                'title': 'Test DCAT dataset {0}'.format(i),
+                'resources': [{'id': 'res-{0}'.format(i),
+                               'package_id': 'ds-{0}'.format(i),
+                               'url': 'http://example.com/{0}'.format(i)}],
+            }
+            for i in xrange(7)
+        ]
+
+    def test_serialize_datasets_fragments(self):
+
+        s = RDFSerializer(workers=2)
+
+        results = [result for result in s.serialize_datasets_fragments(
+            iter(self._datasets()), ['nt', 'turtle'])]
+
+        eq_([dataset_dict['id'] for dataset_dict, ref, f in results],
+            ['ds-{0}'.format(i) for i in xrange(7)])
+
+        for dataset_dict, dataset_ref, fragments in results:
+            eq_(dataset_ref, URIRef(utils.dataset_uri(dataset_dict)))
+
+            g = Graph()
+            g.parse(data=fragments['nt'], format='nt')
+            assert self._triple(g, dataset_ref, DCT.title,
+                                dataset_dict['title'])
+            eq_(sorted(fragments.keys()), ['nt', 'turtle'])
+
+    @mock.patch('ckanext.dcat.processors.multiprocessing.Pool')
+    def test_serialize_datasets_fragments_single_chunk(self, mock_pool):
+
+        s = RDFSerializer(workers=2)
+
+        results = [result for result in s.serialize_datasets_fragments(
+            self._datasets()[:2], ['nt'])]
+
+        eq_(len(results), 2)
+        eq_(mock_pool.call_count, 0)
+
+    @mock.patch('ckanext.dcat.processors.multiprocessing.Pool')
+    def test_workers_not_used_by_default(self, mock_pool):
+
+        # Only the command line uses the option, requests never fork
+        config[SERIALIZER_WORKERS_CONFIG_OPTION] = '2'
+
+        s = RDFSerializer()
+
+        eq_(s.workers, 0)
+
+        s.serialize_catalog({}, self._datasets(), _format='nt')
+
+        eq_(mock_pool.call_count, 0)
+
+    def test_worker_dataset_dicts(self):
+
+        dataset_dicts = self._datasets()[:2]
+        del dataset_dicts[0]['resources'][0]['package_id']
+
+        copies = _with_dataset_ids(dataset_dicts)
+
+        eq_(copies[0]['resources'][0]['package_id'], 'ds-0')
+        assert 'package_id' not in dataset_dicts[0]['resources'][0]
+        eq_(copies[1], dataset_dicts[1])
+
+    def test_serialize_catalog(self):
+
+        pagination_info = {
+            'count': 7,
+            'current': 'http://example.com/catalog?page=1',
+        }
+
+        for _format, rdflib_format in (('nt', 'nt'), ('ttl', 'turtle'),
+                                       ('rdf', 'xml'), ('jsonld', 'json-ld')):
+            graphs = []
+            for workers in (0, 2):
+                s = RDFSerializer(workers=workers)
+                for output in (
+                        s.serialize_catalog({}, self._datasets(),
+                                            _format=_format,
+                                            pagination_info=pagination_info),
+                        ''.join(s.serialize_catalog_stream(
+                            {}, self._datasets(), _format=_format,
+                            pagination_info=pagination_info))):
+                    graphs.append(Graph().parse(data=output,
+                                                format=rdflib_format))
+
+            for g in graphs[1:]:
+                assert isomorphic(graphs[0], g), _format
+
+            eq_(len([d for d in graphs[-1].subjects(RDF.type, DCAT.Dataset)]),
+                7)
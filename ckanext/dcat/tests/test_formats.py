@@ -0,0 +1,141 @@
+import nose
+import mock
+
+from rdflib import Graph, URIRef
+from rdflib.namespace import RDF
+
+from ckanext.dcat.formats import FormatIndex, format_index
+from ckanext.dcat.processors import RDFParser
+from ckanext.dcat.profiles import DCAT, DCT
+
+eq_ = nose.tools.eq_
+
+
+RESOURCE_FORMATS = {}
+for line in (['text/csv', 'CSV', 'Comma Separated Values File', 'csv'],
+             ['application/rdf+xml', 'RDF', 'RDF/XML']):
+    for item in line:
+        RESOURCE_FORMATS[item.lower()] = line
+
+
+class MockFormatMappingsPlugin(object):
+
+    def update_format_mappings(self, mappings):
+        mappings['Spreadsheet'] = 'XLSX'
+        mappings['text/csv'] = 'Site CSV'
+        return mappings
+
+
+def _patch_formats(plugins=None):
+    return [
+        mock.patch('ckanext.dcat.formats.toolkit.check_ckan_version',
+                   return_value=True),
+        mock.patch('ckan.lib.helpers.resource_formats',
+                   return_value=RESOURCE_FORMATS, create=True),
+        mock.patch('ckanext.dcat.formats.p.PluginImplementations',
+                   return_value=plugins or []),
+    ]
+
+
+class TestFormatIndex(object):
+
+    def setup(self):
+        self.patches = _patch_formats()
+        for patch in self.patches:
+            patch.start()
+        format_index.reset()
+
+    def teardown(self):
+        for patch in self.patches:
+            patch.stop()
+        format_index.reset()
+
+    def test_normalize(self):
+
+        index = FormatIndex()
+
+        eq_(index.normalize('text/csv'), 'CSV')
+        eq_(index.normalize('Comma Separated Values File'), 'CSV')
+        eq_(index.normalize(' cSv '), 'CSV')
+        eq_(index.normalize('Unknown'), None)
+        eq_(index.normalize(None), None)
+
+    def test_normalize_uris(self):
+
+        index = FormatIndex()
+
+        eq_(index.normalize(
+            'http://publications.europa.eu/resource/authority/file-type/CSV'),
+            'CSV')
+        eq_(index.normalize(
+            'http://publications.europa.eu/resource/authority/file-type/'
+            'RDF_XML'),
+            'RDF')
+        eq_(index.normalize(
+            'https://www.iana.org/assignments/media-types/text/csv'),
+            'CSV')
+
+    def test_built_once(self):
+
+        index = FormatIndex()
+
+        with mock.patch.object(index, '_build_index',
+                               return_value={}) as mock_build:
+            for i in xrange(3):
+                index.normalize('text/csv')
+
+        eq_(mock_build.call_count, 1)
+
+    def test_plugin_mappings(self):
+
+        for patch in self.patches:
+            patch.stop()
+        self.patches = _patch_formats([MockFormatMappingsPlugin()])
+        for patch in self.patches:
+            patch.start()
+
+        index = FormatIndex()
+
+        eq_(index.normalize('spreadsheet'), 'XLSX')
+        eq_(index.normalize('text/csv'), 'Site CSV')
+        eq_(index.normalize('RDF/XML'), 'RDF')
+
+    def test_parse_format_uri(self):
+
+        g = Graph()
+
+        dataset = URIRef('http://example.org/datasets/1')
+        g.add((dataset, RDF.type, DCAT.Dataset))
+
+        distribution = URIRef('http://example.org/datasets/1/ds/1')
+        g.add((distribution, RDF.type, DCAT.Distribution))
+        g.add((distribution, DCT['format'], URIRef(
+            'http://publications.europa.eu/resource/authority/file-type/CSV')))
+        g.add((dataset, DCAT.distribution, distribution))
+
+        p = RDFParser(profiles=['euro_dcat_ap'])
+        p.g = g
+
+        resource = [d for d in p.datasets()][0]['resources'][0]
+
+        eq_(resource['format'], 'CSV')
+
+    def test_parse_unknown_format_uri(self):
+
+        g = Graph()
+
+        dataset = URIRef('http://example.org/datasets/1')
+        g.add((dataset, RDF.type, DCAT.Dataset))
+
+        distribution = URIRef('http://example.org/datasets/1/ds/1')
+        g.add((distribution, RDF.type, DCAT.Distribution))
+        g.add((distribution, DCT['format'], URIRef(
+            'http://example.org/formats/unknown')))
+        g.add((dataset, DCAT.distribution, distribution))
+
+        p = RDFParser(profiles=['euro_dcat_ap'])
+        p.g = g
+
+        resource = [d for d in p.datasets()][0]['resources'][0]
+
+        assert 'format' not in resource
@@ -0,0 +1,141 @@
+import json
+
+import nose
+import mock
+
+from pylons import config
+
+from rdflib import URIRef
+
+from ckanext.dcat import geometry
+from ckanext.dcat.processors import RDFSerializer
+from ckanext.dcat.profiles import DCT, LOCN, GSP, GEOJSON_IMT
+
+eq_ = nose.tools.eq_
+
+POLYGON = ('{"type": "Polygon", "coordinates": [[[1.1870606, 41.0786393], '
+           '[1.1870606, 41.1655218], [1.3752339, 41.1655218], '
+           '[1.3752339, 41.0786393], [1.1870606, 41.0786393]]]}')
+
+
+class TestGeometry(object):
+
+    def setup(self):
+        self.original_config = config.copy()
+        geometry._geometry_cache = None
+
+    def teardown(self):
+        config.clear()
+        config.update(self.original_config)
+        geometry._geometry_cache = None
+
+    def test_conversions(self):
+
+        wkt_value = geometry.geojson_to_wkt(POLYGON)
+        assert wkt_value.startswith('POLYGON ((1.1871 41.0786')
+
+        eq_(json.loads(geometry.wkt_to_geojson(wkt_value))['type'],
+            'Polygon')
+
+        assert geometry.valid_geojson(POLYGON)
+        assert not geometry.valid_geojson('{Not JSON')
+        eq_(geometry.geojson_to_wkt('{"key": "NotGeoJSON"}'), None)
+        eq_(geometry.wkt_to_geojson('Not WKT'), None)
+
+    @mock.patch('ckanext.dcat.geometry.wkt.dumps', return_value='POINT (1 2)')
+    def test_cached(self, mock_dumps):
+
+        for i in xrange(3):
+            eq_(geometry.geojson_to_wkt(POLYGON), 'POINT (1 2)')
+
+        eq_(mock_dumps.call_count, 1)
+
+        # Invalid values are cached too
+        mock_dumps.side_effect = ValueError
+        for i in xrange(3):
+            eq_(geometry.geojson_to_wkt('{}'), None)
+
+        eq_(mock_dumps.call_count, 2)
+
+    @mock.patch('ckanext.dcat.geometry.wkt.dumps', return_value='POINT (1 2)')
+    def test_cache_disabled(self, mock_dumps):
+
+        config[geometry.GEOMETRY_CACHE_MAX_SIZE_CONFIG] = '0'
+
+        for i in xrange(3):
+            geometry.geojson_to_wkt(POLYGON)
+
+        eq_(mock_dumps.call_count, 3)
+        eq_(geometry.get_geometry_cache(), None)
+
+    def test_cap_precision(self):
+
+        capped = json.loads(geometry.cap_precision(POLYGON, 2))
+
+        eq_(capped['coordinates'][0][0], [1.19, 41.08])
+
+        collection = json.dumps({
+            'type': 'GeometryCollection',
+            'geometries': [{'type': 'Point', 'coordinates': [1.23456, 2]}]
+        })
+        capped = json.loads(geometry.cap_precision(collection, 1))
+
+        eq_(capped['geometries'][0]['coordinates'], [1.2, 2])
+
+        eq_(geometry.cap_precision('{Not JSON', 1), '{Not JSON')
+
+
+class TestGeometrySerialization(object):
+
+    def setup(self):
+        self.original_config = config.copy()
+
+    def teardown(self):
+        config.clear()
+        config.update(self.original_config)
+
+    def _dataset(self):
+        return {
+            'id': '4b6fe9ca-dc77-4cec-92a4-55c6624a5bd6',
+            'name': 'test-dataset',
+            'extras': [
+                {'key': 'spatial', 'value': POLYGON},
+            ]
+        }
+
+    def _geometries(self, s, dataset_ref):
+        spatial = s.g.value(dataset_ref, DCT.spatial)
+        return dict((o.datatype, unicode(o))
+                    for o in s.g.objects(spatial, LOCN.geometry))
+
+    def test_skip_wkt(self):
+
+        s = RDFSerializer()
+        s.include_wkt = False
+
+        dataset_ref = s.graph_from_dataset(self._dataset())
+
+        eq_(self._geometries(s, dataset_ref).keys(), [URIRef(GEOJSON_IMT)])
+
+    def test_skip_wkt_config(self):
+
+        config[geometry.GEOMETRY_WKT_CONFIG] = 'false'
+
+        s = RDFSerializer()
+        dataset_ref = s.graph_from_dataset(self._dataset())
+
+        eq_(len(self._geometries(s, dataset_ref)), 1)
+
+    def test_decimals(self):
+
+        config[geometry.GEOMETRY_DECIMALS_CONFIG] = '2'
+
+        s = RDFSerializer()
+        dataset_ref = s.graph_from_dataset(self._dataset())
+
+        geometries = self._geometries(s, dataset_ref)
+
+        eq_(json.loads(geometries[URIRef(GEOJSON_IMT)])['coordinates'][0][0],
+            [1.19, 41.08])
+        assert geometries[GSP.wktLiteral].startswith(
+            'POLYGON ((1.19 41.08')
@@ -1,6 +1,7 @@
 from collections import defaultdict
 
 import nose
+import mock
 import httpretty
 
 import ckan.plugins as p
@@ -356,6 +357,20 @@ class TestDCATHarvestFunctional(FunctionalHarvestTest):
                                   self.ttl_content,
                                   self.ttl_content_type)
 
+    def test_harvest_create_with_parser_workers(self):
+
+        self._test_harvest_create(self.ttl_mock_url,
+                                  self.ttl_content,
+                                  self.ttl_content_type,
+                                  config='{"parser_workers": 2}')
+
+    def test_harvest_create_with_head_request(self):
+
+        self._test_harvest_create(self.rdf_mock_url,
+                                  self.rdf_content,
+                                  self.rdf_content_type,
+                                  config='{"head_request": true}')
+
     def test_harvest_create_with_config_content_Type(self):
 
         self._test_harvest_create(self.ttl_mock_url,
@@ -369,8 +384,8 @@ class TestDCATHarvestFunctional(FunctionalHarvestTest):
         httpretty.register_uri(httpretty.GET, url,
                                body=content, content_type=content_type)
 
-        # The harvester will try to do a HEAD request first so we need to mock
-        # this as well
+        # The harvester will do a HEAD request first if the source asks for
+        # it, so we need to mock this as well
         httpretty.register_uri(httpretty.HEAD, url,
                                status=405, content_type=content_type)
 
@@ -527,6 +542,35 @@ class TestDCATHarvestFunctional(FunctionalHarvestTest):
         assert ('Error parsing the RDF file'
                 in last_job_status['gather_error_summary'][0][0])
 
+    def test_harvest_source_max_file_size(self):
+
+        url = self.rdf_mock_url
+
+        httpretty.register_uri(httpretty.GET, url,
+                               body=self.rdf_content,
+                               content_type=self.rdf_content_type)
+        httpretty.register_uri(httpretty.HEAD, url,
+                               status=405,
+                               content_type=self.rdf_content_type)
+
+        harvest_source = self._create_harvest_source(
+            url, config='{"max_file_size": 100, "download_chunk_size": 10}')
+        self._create_harvest_job(harvest_source['id'])
+        self._run_jobs(harvest_source['id'])
+        self._gather_queue(1)
+
+        # Run the jobs to mark the previous one as Finished
+        self._run_jobs()
+
+        harvest_source = h.call_action('harvest_source_show',
+                                       id=harvest_source['id'])
+
+        last_job_status = harvest_source['status']['last_job']
+
+        eq_(last_job_status['status'], 'Finished')
+        assert ('Remote file is too big'
+                in last_job_status['gather_error_summary'][0][0])
+
 
 class TestDCATHarvestFunctionalExtensionPoints(FunctionalHarvestTest):
 
@@ -758,19 +802,70 @@ class TestDCATRDFHarvester(object):
     def test_validates_correct_config(self):
         harvester = DCATRDFHarvester()
 
-        for config in ['{}', '{"rdf_format":"text/turtle"}']:
+        for config in ['{}', '{"rdf_format":"text/turtle"}',
+                       '{"parser_workers": 4}',
+                       '{"parser_workers": 0}',
+                       '{"streaming_parse": true}',
+                       '{"max_file_size": 1048576, "download_chunk_size": 8192}',
+                       '{"timeout": 5, "head_request": true}',
+                       '{"timeout": 0.5}']:
             eq_(config, harvester.validate_config(config))
 
     def test_does_not_validate_incorrect_config(self):
         harvester = DCATRDFHarvester()
 
-        for config in ['invalid', '{invalid}', '{rdf_format:invalid}']:
+        for config in ['invalid', '{invalid}', '{rdf_format:invalid}',
+                       '{"parser_workers": "many"}',
+                       '{"parser_workers": -1}',
+                       '{"parser_workers": true}',
+                       '{"streaming_parse": "yes"}',
+                       '{"max_file_size": 0}',
+                       '{"max_file_size": true}',
+                       '{"download_chunk_size": "big"}',
+                       '{"timeout": -1}',
+                       '{"head_request": "yes"}']:
             try:
                 harvester.validate_config(config)
                 assert False
             except ValueError:
                 assert True
 
+    def test_session_per_job(self):
+        harvester = DCATRDFHarvester()
+
+        class Job(object):
+            def __init__(self, id):
+                self.id = id
+                self.source = None
+
+        job1 = Job('job1')
+
+        session = harvester._get_session(job1)
+
+        # All requests of a job share the same pooled session
+        assert harvester._get_session(job1) is session
+
+        assert harvester._get_session(Job('job2')) is not session
+
+        harvester._close_session()
+
+        assert harvester._session is None
+
+    @mock.patch('ckanext.dcat.harvesters.base.Retry', None)
+    def test_session_without_retry_support(self):
+        harvester = DCATRDFHarvester()
+
+        class Job(object):
+            id = 'job1'
+            source = None
+
+        # Older requests versions only get the number of retries
+        session = harvester._get_session(Job())
+
+        assert session.get_adapter('http://example.com')
+
+        harvester._close_session()
+
 
 class TestIDCATRDFHarvester(object):
 
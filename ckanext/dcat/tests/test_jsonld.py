@@ -0,0 +1,157 @@
+import json
+
+import nose
+
+from pylons import config
+
+from rdflib import Graph, URIRef, BNode, Literal
+from rdflib.compare import isomorphic
+from rdflib.namespace import RDF
+
+from ckanext.dcat.jsonld import (JSONLDWriter, CONTEXT, context_document,
+                                 JSONLD_FRAME_CONFIG,
+                                 JSONLD_CONTEXT_URL_CONFIG)
+from ckanext.dcat.processors import RDFSerializer
+from ckanext.dcat.profiles import DCAT, DCT
+from ckanext.dcat.tests import example_dataset_dict, example_dataset_dicts
+
+eq_ = nose.tools.eq_
+
+
+def _parse(output, context=None):
+    if context:
+        # Remote contexts can not be fetched here
+        document = json.loads(output)
+        for node in (document if isinstance(document, list) else [document]):
+            eq_(node['@context'], context)
+            node['@context'] = CONTEXT
+        output = json.dumps(document)
+    return Graph().parse(data=output, format='json-ld')
+
+
+class TestJSONLDWriter(object):
+
+    def test_compact(self):
+
+        g = Graph()
+        dataset = URIRef('http://example.org/datasets/1')
+        publisher = BNode()
+        g.add((dataset, RDF.type, DCAT.Dataset))
+        g.add((dataset, DCT.title, Literal('Title')))
+        g.add((dataset, DCT.description, Literal('Desc', lang='en')))
+        g.add((dataset, DCT.publisher, publisher))
+        g.add((dataset, URIRef('http://example.org/ns#other'),
+               URIRef('http://example.org/other')))
+        g.add((publisher, DCT.title, Literal('Publisher')))
+
+        writer = JSONLDWriter()
+        document = json.loads(writer.document(g, [dataset]))
+
+        eq_(document['@context'], CONTEXT)
+        eq_(document['@id'], 'http://example.org/datasets/1')
+        eq_(document['@type'], 'dcat:Dataset')
+        eq_(document['dct:title'], 'Title')
+        eq_(document['dct:description'],
+            {'@value': 'Desc', '@language': 'en'})
+        eq_(document['dct:publisher'], {'dct:title': 'Publisher'})
+        eq_(document['http://example.org/ns#other'],
+            {'@id': 'http://example.org/other'})
+
+        assert isomorphic(_parse(writer.document(g, [dataset])), g)
+
+    def test_flat(self):
+
+        g = Graph()
+        dataset = URIRef('http://example.org/datasets/1')
+        publisher = BNode()
+        g.add((dataset, DCT.publisher, publisher))
+        g.add((publisher, DCT.title, Literal('Publisher')))
+
+        writer = JSONLDWriter(frame=False)
+        output = writer.document(g, [dataset])
+
+        eq_(len(json.loads(output)), 2)
+        assert isomorphic(_parse(output), g)
+
+    def test_context_document(self):
+
+        eq_(json.loads(context_document()), {'@context': CONTEXT})
+
+
+class TestJSONLDSerializer(object):
+
+    def setup(self):
+        self.original_config = config.copy()
+        # The JSON-LD parser adds a trailing slash to bare host IRIs
+        config['ckanext.dcat.base_uri'] = 'http://test.ckan.net/catalog'
+
+    def teardown(self):
+        config.clear()
+        config.update(self.original_config)
+
+    def _expected_graph(self, dataset_dicts=None, dataset_dict=None,
+                        pagination_info=None):
+        s = RDFSerializer()
+        if dataset_dict:
+            output = s.serialize_dataset(dataset_dict, _format='nt')
+        else:
+            output = s.serialize_catalog({}, dataset_dicts, _format='nt',
+                                         pagination_info=pagination_info)
+        return Graph().parse(data=output, format='nt')
+
+    def test_serialize_dataset(self):
+
+        dataset_dict = example_dataset_dict()
+
+        output = RDFSerializer().serialize_dataset(dataset_dict,
+                                                   _format='jsonld')
+
+        document = json.loads(output)
+        eq_(document['@type'], 'dcat:Dataset')
+        assert 'dcat:distribution' in document
+
+        assert isomorphic(_parse(output),
+                          self._expected_graph(dataset_dict=dataset_dict))
+
+    def test_serialize_catalog(self):
+
+        pagination_info = {'count': 3, 'current': 'http://example.com/catalog?page=1'}
+
+        for frame in ('true', 'false'):
+            config[JSONLD_FRAME_CONFIG] = frame
+
+            output = RDFSerializer().serialize_catalog(
+                {}, example_dataset_dicts(), _format='jsonld',
+                pagination_info=pagination_info)
+            chunks = [chunk for chunk in
+                      RDFSerializer().serialize_catalog_stream(
+                          {}, example_dataset_dicts(), _format='jsonld',
+                          pagination_info=pagination_info)]
+
+            assert len(chunks) > 3
+
+            expected = self._expected_graph(example_dataset_dicts(),
+                                            pagination_info=pagination_info)
+            for value in (output, ''.join(chunks)):
+                assert isomorphic(_parse(value), expected)
+
+        config[JSONLD_FRAME_CONFIG] = 'true'
+        document = json.loads(RDFSerializer().serialize_catalog(
+            {}, example_dataset_dicts(), _format='jsonld'))
+
+        eq_(len(document), 1)
+        catalog = document[0]
+        eq_(catalog['@type'], 'dcat:Catalog')
+        eq_(len(catalog['dcat:dataset']), 3)
+        assert 'dcat:distribution' in catalog['dcat:dataset'][0]
+
+    def test_serialize_catalog_context_url(self):
+
+        context_url = 'http://example.com/dcat/context.jsonld'
+        config[JSONLD_CONTEXT_URL_CONFIG] = context_url
+
+        output = RDFSerializer().serialize_catalog({}, example_dataset_dicts(),
+                                                   _format='jsonld')
+
+        assert isomorphic(_parse(output, context_url),
+                          self._expected_graph(example_dataset_dicts()))
@@ -10,7 +10,14 @@ try:
 except ImportError:
     from ckan.new_tests import helpers
 
-from ckanext.dcat.logic import _pagination_info
+from ckanext.dcat.logic import (dcat_dataset_show,
+                                dcat_catalog_show,
+                                catalog_page_modified,
+                                _pagination_info,
+                                _search_ckan_datasets,
+                                _encode_cursor,
+                                _decode_cursor,
+                                _cursor_filter)
 
 eq_ = nose.tools.eq_
 assert_raises = nose.tools.assert_raises
@@ -222,3 +229,188 @@ class TestPagination(object):
 
         assert_raises(toolkit.ValidationError,
                       _pagination_info, query, data_dict)
+
+
+class TestCursorPagination(object):
+
+    def _datasets(self, num):
+        return [{'id': 'dataset-{0}'.format(i),
+                 'metadata_modified': '2016-01-01T10:00:0{0}.123456'.format(i)}
+                for i in xrange(num)]
+
+    def test_cursor_roundtrip(self):
+
+        dataset = self._datasets(1)[0]
+
+        cursor = _encode_cursor(dataset)
+
+        assert '=' not in cursor
+        eq_(_decode_cursor(cursor),
+            (dataset['metadata_modified'], dataset['id']))
+
+    def test_wrong_cursor(self):
+
+        for cursor in ('wrong', _encode_cursor({'id': 'a',
+                                                'metadata_modified': 'b'}),
+                       u'\xf1'):
+            assert_raises(toolkit.ValidationError, _decode_cursor, cursor)
+
+    def test_cursor_filter(self):
+
+        cursor = _encode_cursor({'id': 'dataset"1',
+                                 'metadata_modified': '2016-01-01T10:00:00'})
+
+        eq_(_cursor_filter(cursor),
+            'metadata_modified:{2016-01-01T10:00:00Z TO *] OR '
+            '(metadata_modified:"2016-01-01T10:00:00Z" AND '
+            'id:{"dataset\\"1" TO *])')
+
+    @helpers.change_config('ckanext.dcat.datasets_per_page', 2)
+    @mock.patch('ckan.plugins.toolkit.get_action')
+    def test_search_cursor(self, mock_get_action):
+
+        datasets = self._datasets(3)
+        mock_package_search = mock_get_action.return_value
+
+        # First page
+        mock_package_search.return_value = {
+            'count': 3, 'results': datasets[:2]}
+
+        query = _search_ckan_datasets({}, {'cursor': '*', 'page': 4})
+
+        search_data_dict = mock_package_search.call_args[0][1]
+        eq_(search_data_dict['sort'], 'metadata_modified asc, id asc')
+        eq_(search_data_dict['start'], 0)
+        eq_(search_data_dict['fq_list'],
+            ['-dataset_type:harvest', '-dataset_type:showcase'])
+
+        eq_(query['next_cursor'], _encode_cursor(datasets[1]))
+
+        # Last page
+        mock_package_search.return_value = {
+            'count': 1, 'results': datasets[2:]}
+
+        query = _search_ckan_datasets({}, {'cursor': query['next_cursor']})
+
+        search_data_dict = mock_package_search.call_args[0][1]
+        eq_(search_data_dict['fq_list'][-1],
+            _cursor_filter(_encode_cursor(datasets[1])))
+
+        eq_(query['next_cursor'], None)
+
+    @helpers.change_config('ckanext.dcat.datasets_per_page', 3)
+    @mock.patch('ckan.plugins.toolkit.get_action')
+    def test_page_modified_cursor(self, mock_get_action):
+
+        datasets = self._datasets(5)
+        mock_package_search = mock_get_action.return_value
+
+        def package_search(context, data_dict):
+            start, rows = data_dict['start'], data_dict['rows']
+            return {'count': len(datasets),
+                    'results': datasets[start:start + rows]}
+
+        mock_package_search.side_effect = package_search
+
+        modified = catalog_page_modified({}, {'cursor': '*'},
+                                         include_catalog=False)
+
+        # Datasets are sorted oldest first, so the last one on the page is
+        # the most recent
+        eq_(modified['page_modified'], datasets[2]['metadata_modified'])
+        eq_(mock_package_search.call_args[0][1]['start'], 2)
+
+        # A change on a dataset other than the first one changes the value
+        datasets[2] = dict(datasets[2],
+                           metadata_modified='2016-01-01T10:00:02.999999')
+        eq_(catalog_page_modified({}, {'cursor': '*'},
+                                  include_catalog=False)['page_modified'],
+            '2016-01-01T10:00:02.999999')
+
+    @helpers.change_config('ckanext.dcat.datasets_per_page', 2)
+    @mock.patch('ckan.plugins.toolkit.request')
+    def test_pagination_cursor(self, mock_request):
+
+        mock_request.params = {'a': 1, 'cursor': '*'}
+        mock_request.path_url = 'http://example.com'
+
+        next_cursor = _encode_cursor(self._datasets(2)[1])
+        query = {
+            'count': 3,
+            'results': self._datasets(2),
+            'next_cursor': next_cursor,
+        }
+
+        pagination = _pagination_info(query, {'cursor': '*'})
+
+        eq_(pagination['count'], 3)
+        eq_(pagination['items_per_page'], 2)
+        eq_(pagination['current'], 'http://example.com?a=1&cursor=*')
+        eq_(pagination['first'], 'http://example.com?a=1&cursor=*')
+        eq_(pagination['next'],
+            'http://example.com?a=1&cursor={0}'.format(next_cursor))
+        assert 'last' not in pagination
+        assert 'previous' not in pagination
+
+        # Following pages don't include the total count
+        mock_request.params = {'a': 1, 'cursor': next_cursor}
+        query = {
+            'count': 1,
+            'results': self._datasets(1),
+            'next_cursor': None,
+        }
+
+        pagination = _pagination_info(query, {'cursor': next_cursor})
+
+        eq_(pagination['current'],
+            'http://example.com?a=1&cursor={0}'.format(next_cursor))
+        assert 'count' not in pagination
+        assert 'next' not in pagination
+
+
+class TestDatasetShow(object):
+
+    @mock.patch('ckan.plugins.toolkit.check_access')
+    @mock.patch('ckan.plugins.toolkit.get_action')
+    def test_dataset_dict_in_context(self, mock_get_action,
+                                     mock_check_access):
+
+        dataset_dict = {
+            'id': 'dataset-1',
+            'name': 'dataset-1',
+            'title': 'Test dataset',
+        }
+
+        output = dcat_dataset_show({'dataset_dict': dataset_dict},
+                                   {'id': 'dataset-1', 'format': 'nt'})
+
+        # The dataset is not retrieved again
+        eq_(mock_get_action.call_count, 0)
+        assert 'Test dataset' in output
+
+
+class TestCatalogShow(object):
+
+    @mock.patch('ckan.plugins.toolkit.check_access')
+    @mock.patch('ckanext.dcat.logic._pagination_info')
+    @mock.patch('ckanext.dcat.logic._search_ckan_datasets')
+    @mock.patch('ckanext.dcat.logic.RDFSerializer')
+    def test_endpoint_workers(self, mock_serializer, mock_search,
+                              mock_pagination_info, mock_check_access):
+
+        mock_search.return_value = {'count': 0, 'results': []}
+
+        dcat_catalog_show({}, {'format': 'ttl'})
+
+        # Worker processes are not used by default
+        eq_(mock_serializer.call_args[1]['workers'], 0)
+
+        original_config = config.copy()
+        config['ckanext.dcat.serializer.endpoint_workers'] = '4'
+        try:
+            dcat_catalog_show({}, {'format': 'ttl'})
+        finally:
+            config.clear()
+            config.update(original_config)
+
+        eq_(mock_serializer.call_args[1]['workers'], 4)
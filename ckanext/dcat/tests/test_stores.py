@@ -0,0 +1,163 @@
+import os
+
+import nose
+
+from pylons import config
+
+from rdflib import Graph, URIRef, BNode, Literal
+from rdflib.namespace import RDF, XSD
+from rdflib.compare import isomorphic
+
+from ckanext.dcat.processors import RDFParser, RDFSerializer
+from ckanext.dcat.profiles import DCAT, DCT
+from ckanext.dcat.stores import (CompactMemoryStore, SQLiteStore, new_graph,
+                                 get_store, RDF_STORE_CONFIG)
+from ckanext.dcat.tests import example_path, sorted_parsed_datasets
+
+eq_ = nose.tools.eq_
+
+
+class BaseStoreTest(object):
+
+    store_class = None
+
+    def _graph(self):
+        return Graph(store=self.store_class())
+
+    def test_add_and_lookups(self):
+
+        g = self._graph()
+        dataset = URIRef('http://example.org/datasets/1')
+        distribution = BNode()
+
+        g.add((dataset, RDF.type, DCAT.Dataset))
+        g.add((dataset, DCT.title, Literal('Dataset 1', lang='en')))
+        g.add((dataset, DCT.title, Literal('Conjunt 1', lang='ca')))
+        g.add((dataset, DCAT.distribution, distribution))
+        g.add((distribution, DCAT.byteSize,
+               Literal('1024', datatype=XSD.integer)))
+        # Duplicates are ignored
+        g.add((dataset, RDF.type, DCAT.Dataset))
+
+        eq_(len(g), 5)
+
+        eq_(list(g.subjects(RDF.type, DCAT.Dataset)), [dataset])
+        eq_(sorted(g.objects(dataset, DCT.title)),
+            sorted([Literal('Dataset 1', lang='en'),
+                    Literal('Conjunt 1', lang='ca')]))
+        eq_(g.value(dataset, DCAT.distribution), distribution)
+        eq_(g.value(distribution, DCAT.byteSize),
+            Literal('1024', datatype=XSD.integer))
+        eq_(len(list(g.predicate_objects(dataset))), 4)
+        eq_(len(list(g.triples((None, DCT.title, None)))), 2)
+        eq_(list(g.subjects(DCT.title, Literal('Dataset 1', lang='en'))),
+            [dataset])
+        assert (dataset, DCAT.distribution, distribution) in g
+        assert (dataset, DCAT.distribution, BNode()) not in g
+        eq_(list(g.objects(URIRef('http://missing'), DCT.title)), [])
+
+    def test_remove(self):
+
+        g = self._graph()
+        dataset = URIRef('http://example.org/datasets/1')
+
+        g.add((dataset, RDF.type, DCAT.Dataset))
+        g.add((dataset, DCT.title, Literal('Dataset 1')))
+        g.add((dataset, DCT.title, Literal('Dataset one')))
+
+        g.remove((dataset, DCT.title, Literal('Dataset one')))
+
+        eq_(len(g), 2)
+        eq_(list(g.objects(dataset, DCT.title)), [Literal('Dataset 1')])
+
+        g.remove((dataset, None, None))
+
+        eq_(len(g), 0)
+        eq_(list(g.subjects(RDF.type, DCAT.Dataset)), [])
+
+    def test_parse_and_serialize(self):
+
+        g = self._graph()
+        g.parse(example_path('catalog.rdf'))
+
+        reference = Graph()
+        reference.parse(example_path('catalog.rdf'))
+
+        eq_(len(g), len(reference))
+        assert isomorphic(g, reference)
+
+        data = g.serialize(format='turtle')
+        assert isomorphic(Graph().parse(data=data, format='turtle'),
+                          reference)
+
+
+class TestCompactMemoryStore(BaseStoreTest):
+
+    store_class = CompactMemoryStore
+
+
+class TestSQLiteStore(BaseStoreTest):
+
+    store_class = SQLiteStore
+
+    def test_close(self):
+
+        store = SQLiteStore()
+        path = store.path
+        assert os.path.exists(path)
+
+        g = Graph(store=store)
+        g.add((URIRef('http://example.org'), DCT.title, Literal('Test')))
+        g.close()
+
+        assert not os.path.exists(path)
+
+
+class TestStoreConfig(object):
+
+    def setup(self):
+        self.original_config = config.copy()
+
+    def teardown(self):
+        config.clear()
+        config.update(self.original_config)
+
+    def test_get_store(self):
+
+        eq_(get_store(), None)
+        assert isinstance(get_store('compact'), CompactMemoryStore)
+
+        config[RDF_STORE_CONFIG] = 'sqlite'
+        store = get_store()
+        assert isinstance(store, SQLiteStore)
+        store.close()
+
+    def test_processors(self):
+
+        with open(example_path('catalog.rdf'), 'r') as f:
+            data = f.read()
+
+        p = RDFParser()
+        p.parse(data)
+        datasets = sorted_parsed_datasets(p)
+
+        for store in ('compact', 'sqlite'):
+            config[RDF_STORE_CONFIG] = store
+
+            p = RDFParser()
+            p.parse(data)
+
+            assert isinstance(p.g.store, (CompactMemoryStore, SQLiteStore))
+            eq_(sorted_parsed_datasets(p), datasets)
+
+            s = RDFSerializer()
+            s.graph_from_catalog({'title': 'Catalog'})
+            assert isinstance(s.g.store, (CompactMemoryStore, SQLiteStore))
+            eq_(len(list(s.g.subjects(RDF.type, DCAT.Catalog))), 1)
+
+    def test_new_graph(self):
+
+        g = new_graph('compact')
+        g.bind('dcat', DCAT)
+
+        eq_(dict(g.namespaces())['dcat'], URIRef(DCAT))
@@ -0,0 +1,208 @@
+import os
+import json
+import tempfile
+
+import nose
+
+from pylons import config
+
+from rdflib import Graph
+
+from ckanext.dcat.processors import RDFParser, RDFParserException
+from ckanext.dcat.streaming import (split_statement, PartitionedTriples,
+                                    use_streaming_parse,
+                                    STREAMING_PARSE_CONFIG)
+
+eq_ = nose.tools.eq_
+
+# Examples without multiple values for single valued properties, which
+# could lead to different (but valid) datasets being parsed
+EXAMPLES = ['catalog.rdf', 'dataset.rdf', 'dataset_afs.ttl',
+            'dataset_deri.ttl']
+
+
+def _examples_graph():
+    g = Graph()
+    for name in EXAMPLES:
+        path = os.path.join(os.path.dirname(__file__), '..', '..', '..',
+                            'examples', name)
+        g.parse(path, format='turtle' if name.endswith('.ttl') else 'xml')
+    return g
+
+
+def _normalize(value):
+    # Lists on the parsed datasets follow the graph ordering
+    if isinstance(value, dict):
+        return dict((k, _normalize(v)) for k, v in value.iteritems())
+    elif isinstance(value, list):
+        return sorted([_normalize(v) for v in value],
+                      key=lambda v: json.dumps(v, sort_keys=True))
+    elif isinstance(value, basestring) and value.startswith('['):
+        # JSON encoded lists on extras
+        return _normalize(json.loads(value))
+    return value
+
+
+def _datasets(data, _format, streaming):
+    p = RDFParser()
+    p.parse(data, _format=_format, streaming=streaming)
+    return _normalize([d for d in p.datasets()])
+
+
+class TestSplitStatement(object):
+
+    def test_split(self):
+
+        eq_(split_statement('<http://s> <http://p> <http://o> .\n'),
+            ('<http://s>', '<http://p>', '<http://o>'))
+        eq_(split_statement('_:b1 <http://p> "Some \\"text\\" . "@en-GB .'),
+            ('_:b1', '<http://p>', '"Some \\"text\\" . "@en-GB'))
+        eq_(split_statement(
+            '<http://s> <http://p> "1"^^<http://www.w3.org/2001/XMLSchema#int>'
+            ' . # comment\r\n'),
+            ('<http://s>', '<http://p>',
+             '"1"^^<http://www.w3.org/2001/XMLSchema#int>'))
+
+        eq_(split_statement('  \n'), None)
+        eq_(split_statement('# comment\n'), None)
+
+    def test_split_nquads(self):
+
+        eq_(split_statement('<http://s> <http://p> "o" <http://g> .',
+                            nquads=True),
+            ('<http://s>', '<http://p>', '"o"'))
+        eq_(split_statement('<http://s> <http://p> "o" .', nquads=True),
+            ('<http://s>', '<http://p>', '"o"'))
+
+    def test_invalid(self):
+
+        for line in ('<http://s> <http://p> .',
+                     '<http://s> "p" <http://o> .',
+                     '"s" <http://p> <http://o> .',
+                     '<http://s> <http://p> <http://o>',
+                     '<http://s> <http://p> <http://o> <http://g> .',
+                     'Wrong data'):
+            nose.tools.assert_raises(ValueError, split_statement, line)
+
+
+class TestUseStreamingParse(object):
+
+    def setup(self):
+        self.original_config = config.copy()
+
+    def teardown(self):
+        config.clear()
+        config.update(self.original_config)
+
+    def test_disabled_by_default(self):
+
+        size = 100 * 1024 * 1024
+
+        eq_(use_streaming_parse('nt', size), False)
+        eq_(use_streaming_parse('nt', size, enabled=True), True)
+
+    def test_enabled(self):
+
+        size = 100 * 1024 * 1024
+        config[STREAMING_PARSE_CONFIG] = 'true'
+
+        eq_(use_streaming_parse('nt', size), True)
+        eq_(use_streaming_parse('nquads', size), True)
+        eq_(use_streaming_parse('xml', size), False)
+        eq_(use_streaming_parse('nt', 1024), False)
+        eq_(use_streaming_parse('nt', size, enabled=False), False)
+
+
+class TestPartitionedTriples(object):
+
+    def test_closure(self):
+
+        lines = [
+            '<http://catalog> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/ns/dcat#Catalog> .',
+            '<http://catalog> <http://www.w3.org/ns/dcat#dataset> <http://dataset/1> .',
+            '<http://dataset/1> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/ns/dcat#Dataset> .',
+            '<http://dataset/1> <http://www.w3.org/ns/dcat#distribution> _:d1 .',
+            '<http://dataset/1> <http://purl.org/dc/terms/relation> <http://dataset/2> .',
+            '<http://dataset/1> <http://purl.org/dc/terms/isPartOf> <http://catalog> .',
+            '<http://dataset/1> <http://purl.org/dc/terms/publisher> <http://org/1> .',
+            '<http://org/1> <http://xmlns.com/foaf/0.1/name> "Org 1" .',
+            '<http://org/1> <http://xmlns.com/foaf/0.1/member> <http://person/1> .',
+            '<http://person/1> <http://xmlns.com/foaf/0.1/name> "Person 1" .',
+            '_:d1 <http://purl.org/dc/terms/format> _:f1 .',
+            '_:f1 <http://www.w3.org/2000/01/rdf-schema#label> "CSV" .',
+            '<http://dataset/2> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/ns/dcat#Dataset> .',
+            '<http://dataset/2> <http://purl.org/dc/terms/title> "Dataset 2" .',
+        ]
+        # Subjects not related to the datasets, spread across partitions
+        lines.extend('<http://other/{0}> <http://p> "{0}" .'.format(i)
+                     for i in xrange(200))
+
+        partitions = PartitionedTriples(partitions=3)
+        try:
+            partitions.add('\n'.join(lines + lines[:2]))
+
+            eq_(partitions.datasets, ['<http://dataset/1>', '<http://dataset/2>'])
+
+            eq_(len(partitions.statements('<http://dataset/1>')), 5)
+            eq_(partitions.statements('<http://other/150>'),
+                ['<http://other/150> <http://p> "150" .\n'])
+            eq_(partitions.statements('<http://missing>'), [])
+
+            closure = partitions.closure('<http://dataset/1>')
+            eq_(len(closure), 9)
+            assert not [l for l in closure
+                        if l.startswith('<http://dataset/2>')]
+            assert not [l for l in closure
+                        if l.startswith('<http://person/1>')]
+
+            # Blank nodes are always followed
+            eq_(len(partitions.closure('<http://dataset/1>', uri_depth=0)), 7)
+            eq_(len(partitions.closure('<http://dataset/1>', uri_depth=2)), 10)
+
+            path = partitions.path
+        finally:
+            partitions.close()
+
+        assert not os.path.exists(path)
+
+
+class TestStreamingParse(object):
+
+    def test_parse_ntriples(self):
+
+        data = _examples_graph().serialize(format='nt')
+
+        datasets = _datasets(data, 'nt', streaming=True)
+
+        eq_(len(datasets), 5)
+        eq_(datasets, _datasets(data, 'nt', streaming=False))
+
+    def test_parse_nquads(self):
+
+        g = _examples_graph()
+        data = g.serialize(format='nt')
+        nquads = '\n'.join(line[:-1] + '<http://graph> .'
+                           for line in data.splitlines() if line.strip())
+
+        eq_(_datasets(nquads, 'nquads', streaming=True),
+            _datasets(data, 'nt', streaming=False))
+
+    def test_parse_file(self):
+
+        data = _examples_graph().serialize(format='nt')
+
+        with tempfile.TemporaryFile() as f:
+            f.write(data)
+            f.seek(0)
+
+            eq_(_datasets(f, 'nt', streaming=True),
+                _datasets(data, 'nt', streaming=False))
+
+    def test_parse_errors(self):
+
+        p = RDFParser()
+
+        nose.tools.assert_raises(RDFParserException, p.parse, 'Wrong data',
+                                 _format='nt', streaming=True)
+        nose.tools.assert_raises(RDFParserException, p.parse, '',
+                                 _format='xml', streaming=True)
@@ -0,0 +1,177 @@
+import nose
+
+from pylons import config
+
+from rdflib import Graph, URIRef, BNode, Literal
+from rdflib.namespace import RDF
+
+from ckanext.dcat.processors import RDFParser
+from ckanext.dcat.subgraph import (dataset_subgraph, graph_hash,
+                                   parse_dataset_subgraph,
+                                   SUBGRAPHS_CONFIG, SUBGRAPH_URI_DEPTH_CONFIG)
+from ckanext.dcat.profiles import DCAT, DCT, FOAF
+from ckanext.dcat.tests import example_contents, sorted_parsed_datasets
+
+eq_ = nose.tools.eq_
+
+
+def _graph():
+    g = Graph()
+
+    catalog = URIRef('http://catalog')
+    dataset1 = URIRef('http://dataset/1')
+    dataset2 = URIRef('http://dataset/2')
+    distribution = URIRef('http://distribution/1')
+    publisher = URIRef('http://org/1')
+    temporal = BNode()
+
+    g.add((catalog, RDF.type, DCAT.Catalog))
+    g.add((catalog, DCAT.dataset, dataset1))
+    g.add((catalog, DCAT.dataset, dataset2))
+
+    g.add((dataset1, RDF.type, DCAT.Dataset))
+    g.add((dataset1, DCT.title, Literal('Dataset 1')))
+    g.add((dataset1, DCAT.distribution, distribution))
+    g.add((dataset1, DCT.publisher, publisher))
+    g.add((dataset1, DCT.temporal, temporal))
+    g.add((dataset1, DCT.relation, dataset2))
+    g.add((dataset1, DCT.isPartOf, catalog))
+
+    g.add((temporal, RDF.type, DCT.PeriodOfTime))
+    g.add((distribution, RDF.type, DCAT.Distribution))
+    g.add((distribution, DCT['format'], URIRef('http://format/csv')))
+    g.add((URIRef('http://format/csv'), DCT.title, Literal('CSV')))
+    g.add((publisher, FOAF.name, Literal('Org 1')))
+    g.add((publisher, FOAF.member, URIRef('http://person/1')))
+    g.add((URIRef('http://person/1'), FOAF.name, Literal('Person 1')))
+
+    g.add((dataset2, RDF.type, DCAT.Dataset))
+    g.add((dataset2, DCT.title, Literal('Dataset 2')))
+
+    return g
+
+
+class TestDatasetSubgraph(object):
+
+    def setup(self):
+        self.original_config = config.copy()
+
+    def teardown(self):
+        config.clear()
+        config.update(self.original_config)
+
+    def test_subgraph(self):
+
+        g = _graph()
+
+        subgraph = dataset_subgraph(g, URIRef('http://dataset/1'))
+
+        eq_(len(subgraph), 13)
+        eq_(sorted(set(unicode(s) for s in subgraph.subjects()
+                       if isinstance(s, URIRef))),
+            ['http://dataset/1', 'http://distribution/1', 'http://format/csv',
+             'http://org/1'])
+
+    def test_subgraph_uri_depth(self):
+
+        g = _graph()
+        dataset_ref = URIRef('http://dataset/1')
+
+        # Blank nodes and distributions are always followed
+        eq_(len(dataset_subgraph(g, dataset_ref, uri_depth=0)), 10)
+        eq_(len(dataset_subgraph(g, dataset_ref, uri_depth=2)), 14)
+
+        config[SUBGRAPH_URI_DEPTH_CONFIG] = '0'
+        eq_(len(dataset_subgraph(g, dataset_ref)), 10)
+
+    def test_parse_dataset_subgraph(self):
+
+        g = Graph()
+        dataset_ref = BNode()
+        part_ref = BNode()
+        g.add((dataset_ref, RDF.type, DCAT.Dataset))
+        g.add((dataset_ref, DCT.hasPart, part_ref))
+        g.add((part_ref, RDF.type, DCAT.Dataset))
+        g.add((part_ref, DCT.title, Literal('Part')))
+
+        data = dataset_subgraph(g, dataset_ref).serialize(format='nt')
+
+        parsed_ref, subgraph = parse_dataset_subgraph(dataset_ref.n3(), data)
+
+        # Blank node labels are not kept, but the dataset one is found
+        assert isinstance(parsed_ref, BNode)
+        eq_(len(subgraph), 4)
+        eq_(subgraph.value(parsed_ref, RDF.type), DCAT.Dataset)
+        eq_(subgraph.value(subgraph.value(parsed_ref, DCT.hasPart),
+                           DCT.title), Literal('Part'))
+
+    def test_graph_hash(self):
+
+        data = example_contents('dataset.rdf')
+
+        g1 = Graph().parse(data=data)
+        g2 = Graph().parse(data=data)
+
+        eq_(graph_hash(g1), graph_hash(g2))
+
+        g2.remove((None, DCT.title, None))
+
+        assert graph_hash(g1) != graph_hash(g2)
+
+    def test_graph_hash_subgraphs(self):
+
+        # Datasets get the same hash on different sources if they have not
+        # changed
+        data = example_contents('catalog.rdf')
+        dataset1 = URIRef('https://data.some.org/catalog/datasets/1')
+        dataset2 = URIRef('https://data.some.org/catalog/datasets/2')
+
+        g1 = Graph().parse(data=data)
+        g2 = Graph().parse(data=data)
+        g2.remove((None, DCAT.dataset, dataset1))
+        g2.remove((dataset1, None, None))
+
+        eq_(graph_hash(dataset_subgraph(g1, dataset2)),
+            graph_hash(dataset_subgraph(g2, dataset2)))
+
+        assert (graph_hash(dataset_subgraph(g1, dataset1)) !=
+                graph_hash(dataset_subgraph(g1, dataset2)))
+
+
+class TestParserSubgraphs(object):
+
+    def setup(self):
+        self.original_config = config.copy()
+
+    def teardown(self):
+        config.clear()
+        config.update(self.original_config)
+
+    def test_dataset_subgraphs(self):
+
+        p = RDFParser()
+        p.g = _graph()
+
+        subgraphs = dict(p.dataset_subgraphs())
+
+        eq_(sorted(subgraphs.keys()),
+            [URIRef('http://dataset/1'), URIRef('http://dataset/2')])
+        eq_(len(subgraphs[URIRef('http://dataset/2')]), 2)
+
+    def test_datasets_subgraphs(self):
+
+        data = example_contents('catalog.rdf')
+
+        p = RDFParser()
+        p.parse(data)
+        datasets = sorted_parsed_datasets(p)
+
+        config[SUBGRAPHS_CONFIG] = 'true'
+
+        p = RDFParser()
+        p.parse(data)
+        graph = p.g
+        eq_(sorted_parsed_datasets(p), datasets)
+
+        # The class graph is restored
+        assert p.g is graph
@@ -1,6 +1,15 @@
+import datetime
+
 import nose
+import mock
+
+from dateutil.parser import parse as dateutil_parse
+
+from pylons import config
 
-from ckanext.dcat.utils import parse_accept_header
+from ckanext.dcat import utils
+from ckanext.dcat.utils import (parse_accept_header, make_etag, http_date,
+                                parse_http_date, etag_matches)
 
 eq_ = nose.tools.eq_
 
@@ -126,3 +135,139 @@ class TestAcceptHeaders(object):
         _format = parse_accept_header(header)
 
         eq_(_format, None)
+
+
+class TestConditionalRequests(object):
+
+    def test_make_etag(self):
+
+        etag = make_etag('dataset-id', '2016-08-10T09:52:34.123456', 'ttl')
+
+        assert etag.startswith('"') and etag.endswith('"')
+        eq_(etag, make_etag('dataset-id', '2016-08-10T09:52:34.123456',
+                            'ttl'))
+        assert etag != make_etag('dataset-id', '2016-08-10T09:52:34.123456',
+                                 'rdf')
+
+    def test_http_date(self):
+
+        eq_(http_date('2016-08-10T09:52:34.123456'),
+            'Wed, 10 Aug 2016 09:52:34 GMT')
+        eq_(http_date('2016-08-10T09:52:34'),
+            'Wed, 10 Aug 2016 09:52:34 GMT')
+
+    def test_parse_http_date(self):
+
+        eq_(parse_http_date('Wed, 10 Aug 2016 09:52:34 GMT'),
+            datetime.datetime(2016, 8, 10, 9, 52, 34))
+        eq_(parse_http_date('Wed, 10 Aug 2016 11:52:34 +0200'),
+            datetime.datetime(2016, 8, 10, 9, 52, 34))
+        eq_(parse_http_date('wrong date'), None)
+        eq_(parse_http_date(None), None)
+
+    def test_etag_matches(self):
+
+        etag = '"abc"'
+
+        assert etag_matches(etag, '"abc"')
+        assert etag_matches(etag, '"xyz", "abc"')
+        assert etag_matches(etag, 'W/"abc"')
+        assert etag_matches(etag, '*')
+        assert not etag_matches(etag, '"xyz"')
+        assert not etag_matches(etag, None)
+
+
+class TestURIs(object):
+
+    def setup(self):
+        self.original_config = config.copy()
+        utils._resource_dataset_ids.clear()
+
+    def teardown(self):
+        config.clear()
+        config.update(self.original_config)
+        utils._resource_dataset_ids.clear()
+
+    def test_catalog_uri(self):
+
+        config['ckanext.dcat.base_uri'] = 'http://example.com/catalog/'
+
+        eq_(utils.catalog_uri(), 'http://example.com/catalog/')
+        eq_(utils.dataset_uri({'id': 'a'}),
+            'http://example.com/catalog/dataset/a')
+
+        config['ckanext.dcat.base_uri'] = 'http://example.org'
+
+        eq_(utils.catalog_uri(), 'http://example.org')
+
+    def test_catalog_uri_random_is_stable(self):
+
+        for key in ('ckanext.dcat.base_uri', 'ckan.site_url',
+                    'app_instance_uuid'):
+            config.pop(key, None)
+
+        uri = utils.catalog_uri()
+
+        assert uri.startswith('http://')
+        eq_(utils.catalog_uri(), uri)
+        eq_(utils.dataset_uri({'id': 'a'}), uri + '/dataset/a')
+
+    @mock.patch('ckanext.dcat.utils.model')
+    def test_resource_uri_prefetch(self, mock_model):
+
+        config['ckanext.dcat.base_uri'] = 'http://example.com'
+
+        mock_model.Session.query.return_value.filter.return_value.all.\
+            return_value = [('r3', 'b')]
+        del mock_model.ResourceGroup
+
+        utils.prefetch_dataset_ids([
+            {'id': 'a', 'resources': [{'id': 'r1'}, {'id': 'r2'}]},
+            {'resources': [{'id': 'r3'}]},
+        ])
+
+        eq_(mock_model.Session.query.call_count, 1)
+
+        eq_(utils.resource_uri({'id': 'r1'}),
+            'http://example.com/dataset/a/resource/r1')
+        eq_(utils.resource_uri({'id': 'r3'}),
+            'http://example.com/dataset/b/resource/r3')
+
+        eq_(mock_model.Resource.get.call_count, 0)
+
+
+class TestParseDate(object):
+
+    def test_iso_dates(self):
+
+        default = datetime.datetime(1, 1, 1, 0, 0, 0)
+
+        for value in ('2015-06-26T15:21:09.075774', '2015-06-26T15:21:09.5',
+                      '2015-06-26T15:21:09', '2015-06-26 15:21',
+                      '2015-06-26', '2015-06', '1904'):
+            eq_(utils.parse_date(value), dateutil_parse(value,
+                                                        default=default))
+
+    def test_other_dates(self):
+
+        eq_(utils.parse_date('2015-06-26T15:21:09Z').isoformat(),
+            '2015-06-26T15:21:09+00:00')
+        eq_(utils.parse_date('26 June 2015'),
+            datetime.datetime(2015, 6, 26))
+
+    def test_wrong_date(self):
+
+        for i in xrange(2):
+            nose.tools.assert_raises(ValueError, utils.parse_date,
+                                     'not a date')
+
+    @mock.patch('ckanext.dcat.utils.dateutil_parse')
+    def test_cached(self, mock_parse):
+
+        mock_parse.return_value = datetime.datetime(2015, 6, 26)
+
+        utils.parse_date('2015-06-26T15:21:09')
+        utils.parse_date('June 26th, 2015')
+        utils.parse_date('June 26th, 2015')
+
+        eq_(mock_parse.call_count, 1)
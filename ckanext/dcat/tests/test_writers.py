@@ -0,0 +1,158 @@
+import nose
+
+from rdflib import Graph, URIRef, BNode, Literal
+from rdflib.compare import isomorphic
+from rdflib.namespace import RDF, XSD
+
+from ckanext.dcat.processors import RDFSerializer
+from ckanext.dcat.profiles import DCAT, DCT
+from ckanext.dcat.tests import example_dataset_dicts
+from ckanext.dcat.writers import NTriplesWriter, TurtleWriter
+
+eq_ = nose.tools.eq_
+
+
+def _triples():
+    dataset = URIRef('http://example.org/datasets/1')
+    publisher = BNode()
+    return [
+        (dataset, RDF.type, DCAT.Dataset),
+        (dataset, DCT.title, Literal(u'Test dataset \xf1')),
+        (dataset, DCT.description, Literal(u'Some "quoted"\nmultiline text')),
+        (dataset, DCAT.keyword, Literal('Tag 1')),
+        (dataset, DCAT.keyword, Literal('Tag 2')),
+        (dataset, DCAT.keyword, Literal('Tag 2')),
+        (dataset, DCT.issued, Literal('2016-01-01T10:00:00',
+                                      datatype=XSD.dateTime)),
+        (dataset, DCT.language, Literal('Castellano', lang='es')),
+        (dataset, DCT.publisher, publisher),
+        (publisher, RDF.type, URIRef('http://xmlns.com/foaf/0.1/Agent')),
+        (dataset, URIRef('http://purl.org/dc/terms/with#hash'),
+         Literal('Not a valid local name')),
+    ]
+
+
+def _graph(triples):
+    g = Graph()
+    for triple in triples:
+        g.add(triple)
+    return g
+
+
+class TestNTriplesWriter(object):
+
+    def test_add(self):
+
+        triples = _triples()
+
+        writer = NTriplesWriter()
+        for triple in triples:
+            writer.add(triple)
+
+        g = Graph()
+        g.parse(data=writer.getvalue(), format='nt')
+
+        assert isomorphic(g, _graph(triples))
+
+        # Same statements as the rdflib serializer, but duplicates are not
+        # removed
+        eq_(len(writer), len(triples))
+        eq_(sorted(set(writer.getvalue().strip().splitlines())),
+            sorted(_graph(triples).serialize(
+                format='nt').strip().splitlines()))
+
+    def test_drain(self):
+
+        writer = NTriplesWriter()
+        triples = _triples()
+
+        writer.add(triples[0])
+        first = writer.drain()
+        writer.add(triples[1])
+        second = writer.drain()
+
+        eq_(len(first.splitlines()), 1)
+        eq_(len(second.splitlines()), 1)
+        eq_(writer.getvalue(), '')
+
+
+class TestTurtleWriter(object):
+
+    def test_add(self):
+
+        triples = _triples()
+
+        writer = TurtleWriter()
+        writer.bind('dcat', DCAT)
+        writer.bind('dct', DCT)
+        for triple in triples:
+            writer.add(triple)
+
+        output = writer.getvalue()
+
+        g = Graph()
+        g.parse(data=output, format='turtle')
+
+        assert isomorphic(g, _graph(triples))
+
+        assert '@prefix dcat: <http://www.w3.org/ns/dcat#> .' in output
+        assert '<http://example.org/datasets/1> a dcat:Dataset ;' in output
+
+        # Duplicated triples on the same statement are skipped
+        eq_(len(writer), len(triples) - 1)
+
+    def test_bind_after_triples(self):
+
+        triples = _triples()
+
+        writer = TurtleWriter()
+        writer.add(triples[0])
+        writer.bind('dct', DCT)
+        writer.add(triples[1])
+
+        g = Graph()
+        g.parse(data=writer.getvalue(), format='turtle')
+
+        assert isomorphic(g, _graph(triples[:2]))
+
+
+class TestSerializerWriteOnlyGraph(object):
+
+    def _datasets(self):
+
+        datasets = example_dataset_dicts()
+        for dataset_dict in datasets:
+            dataset_dict['resources'] = []
+        return datasets
+
+    def test_serialize_catalog(self):
+
+        pagination_info = {'count': 3, 'current': 'http://example.com?page=1'}
+
+        for _format, rdflib_format in (('nt', 'nt'), ('ttl', 'turtle')):
+
+            s = RDFSerializer()
+            expected = s.serialize_catalog(
+                {}, self._datasets(), _format=_format,
+                pagination_info=pagination_info)
+
+            s = RDFSerializer()
+            s.write_only_graph = True
+            output = s.serialize_catalog(
+                {}, self._datasets(), _format=_format,
+                pagination_info=pagination_info)
+
+            s = RDFSerializer()
+            s.write_only_graph = True
+            chunks = [chunk for chunk in s.serialize_catalog_stream(
+                {}, self._datasets(), _format=_format,
+                pagination_info=pagination_info)]
+
+            eq_(len(chunks), 5)
+
+            expected_graph = Graph().parse(data=expected,
+                                           format=rdflib_format)
+            for value in (output, ''.join(chunks)):
+                g = Graph().parse(data=value, format=rdflib_format)
+                eq_(len(g), len(expected_graph))
+                assert isomorphic(g, expected_graph)
@@ -1,7 +1,12 @@
 import logging
 import uuid
+import hashlib
+import datetime
+import email.utils
+import calendar
 
 from pylons import config
+from dateutil.parser import parse as dateutil_parse
 
 from ckan import model
 
@@ -13,10 +18,20 @@ CONTENT_TYPES = {
     'xml': 'application/rdf+xml',
     'n3': 'text/n3',
     'ttl': 'text/turtle',
+    'nt': 'application/n-triples',
     'jsonld': 'application/ld+json',
 }
 
 
+# Resolved catalog URIs, keyed by the values of the config options used
+_catalog_uris = {}
+
+# Dataset ids of resources, for resource dicts without `package_id`
+_resource_dataset_ids = {}
+
+RESOURCE_DATASET_IDS_MAX_ITEMS = 10000
+
+
 def catalog_uri():
     '''
     Returns an URI for the whole catalog
@@ -33,14 +48,37 @@ def catalog_uri():
 
     A warning is emited if the third option is used.
 
+    The value is only resolved once for the same configuration, so the
+    random id used if none of the options are set is stable for the whole
+    process.
+
     Returns a string with the catalog URI.
     '''
+    return _resolve_catalog_uri()[0]
+
+
+def _catalog_base_uri():
+    '''
+    Returns the catalog URI without trailing slashes, used as the base of
+    the dataset, resource and publisher URIs
+    '''
+    return _resolve_catalog_uri()[1]
+
 
-    uri = config.get('ckanext.dcat.base_uri')
+def _resolve_catalog_uri():
+
+    key = (config.get('ckanext.dcat.base_uri'),
+           config.get('ckan.site_url'),
+           config.get('app_instance_uuid'))
+
+    resolved = _catalog_uris.get(key)
+    if resolved is not None:
+        return resolved
+
+    uri, site_url, app_uuid = key
     if not uri:
-        uri = config.get('ckan.site_url')
+        uri = site_url
     if not uri:
-        app_uuid = config.get('app_instance_uuid')
         if app_uuid:
             uri = 'http://' + app_uuid.replace('{', '').replace('}', '')
             log.critical('Using app id as catalog URI, you should set the ' +
@@ -51,7 +89,16 @@ def catalog_uri():
                          'the `ckanext.dcat.base_uri` or `ckan.site_url` ' +
                          'option')
 
-    return uri
+    resolved = (uri, uri.rstrip('/'))
+    _catalog_uris[key] = resolved
+
+    return resolved
+
+
+def _extra_value(_dict, key):
+    for extra in _dict.get('extras', []):
+        if extra['key'] == key:
+            return extra['value']
 
 
 def dataset_uri(dataset_dict):
@@ -73,17 +120,12 @@ def dataset_uri(dataset_dict):
     Returns a string with the dataset URI.
     '''
 
-    uri = dataset_dict.get('uri')
-    if not uri:
-        for extra in dataset_dict.get('extras', []):
-            if extra['key'] == 'uri':
-                uri = extra['value']
-                break
+    uri = dataset_dict.get('uri') or _extra_value(dataset_dict, 'uri')
     if not uri and dataset_dict.get('id'):
-        uri = '{0}/dataset/{1}'.format(catalog_uri().rstrip('/'),
+        uri = '{0}/dataset/{1}'.format(_catalog_base_uri(),
                                        dataset_dict['id'])
     if not uri:
-        uri = '{0}/dataset/{1}'.format(catalog_uri().rstrip('/'),
+        uri = '{0}/dataset/{1}'.format(_catalog_base_uri(),
                                        str(uuid.uuid4()))
         log.warning('Using a random id for dataset URI')
 
@@ -112,7 +154,7 @@ def resource_uri(resource_dict):
     if not uri:
         dataset_id = dataset_id_from_resource(resource_dict)
 
-        uri = '{0}/dataset/{1}/resource/{2}'.format(catalog_uri().rstrip('/'),
+        uri = '{0}/dataset/{1}/resource/{2}'.format(_catalog_base_uri(),
                                                     dataset_id,
                                                     resource_dict['id'])
 
@@ -139,14 +181,10 @@ def publisher_uri_from_dataset_dict(dataset_dict):
     generated.
     '''
 
-    uri = dataset_dict.get('pubisher_uri')
-    if not uri:
-        for extra in dataset_dict.get('extras', []):
-            if extra['key'] == 'publisher_uri':
-                uri = extra['value']
-                break
+    uri = (dataset_dict.get('pubisher_uri') or
+           _extra_value(dataset_dict, 'publisher_uri'))
     if not uri and dataset_dict.get('organization'):
-        uri = '{0}/organization/{1}'.format(catalog_uri().rstrip('/'),
+        uri = '{0}/organization/{1}'.format(_catalog_base_uri(),
                                             dataset_dict['organization']['id'])
 
     return uri
@@ -155,15 +193,77 @@ def publisher_uri_from_dataset_dict(dataset_dict):
 def dataset_id_from_resource(resource_dict):
     '''
     Finds the id for a dataset if not present on the resource dict
+
+    Ids found previously (see `prefetch_dataset_ids`) are reused.
     '''
     dataset_id = resource_dict.get('package_id')
     if dataset_id:
         return dataset_id
 
+    dataset_id = _resource_dataset_ids.get(resource_dict['id'])
+    if dataset_id:
+        return dataset_id
+
     # CKAN < 2.3
     resource = model.Resource.get(resource_dict['id'])
     if resource:
-        return resource.get_package_id()
+        dataset_id = resource.get_package_id()
+        _store_dataset_id(resource_dict['id'], dataset_id)
+        return dataset_id
+
+
+def prefetch_dataset_ids(dataset_dicts):
+    '''
+    Finds in advance the dataset ids of the resources of a list of datasets
+
+    On CKAN < 2.3 resource dicts don't include the `package_id` field, so
+    `resource_uri` would need to query the database once per resource.
+    This function stores the dataset ids of all the resources on the
+    provided datasets, taking them from the parent dataset dicts when
+    possible and otherwise querying the database once for all the
+    remaining resources.
+    '''
+    missing = []
+    for dataset_dict in dataset_dicts:
+        for resource_dict in dataset_dict.get('resources', []):
+            resource_id = resource_dict.get('id')
+            if (not resource_id or resource_dict.get('package_id') or
+                    resource_id in _resource_dataset_ids):
+                continue
+            if dataset_dict.get('id'):
+                _store_dataset_id(resource_id, dataset_dict['id'])
+            else:
+                missing.append(resource_id)
+
+    if missing:
+        for resource_id, dataset_id in _query_dataset_ids(missing):
+            _store_dataset_id(resource_id, dataset_id)
+
+
+def _query_dataset_ids(resource_ids):
+    '''
+    Returns a list of (resource id, dataset id) tuples for the provided
+    resource ids, using a single query
+    '''
+    if hasattr(model, 'ResourceGroup'):
+        # CKAN < 2.3
+        query = model.Session.query(
+            model.Resource.id, model.ResourceGroup.package_id).join(
+            model.ResourceGroup,
+            model.Resource.resource_group_id == model.ResourceGroup.id)
+    else:
+        query = model.Session.query(model.Resource.id,
+                                    model.Resource.package_id)
+
+    return query.filter(model.Resource.id.in_(resource_ids)).all()
+
+
+def _store_dataset_id(resource_id, dataset_id):
+    if not dataset_id:
+        return
+    if len(_resource_dataset_ids) >= RESOURCE_DATASET_IDS_MAX_ITEMS:
+        _resource_dataset_ids.clear()
+    _resource_dataset_ids[resource_id] = dataset_id
 
 
 def url_to_rdflib_format(_format):
@@ -246,3 +346,146 @@ def parse_accept_header(accept_header=''):
                 return accepted_media_types_wildcard[_type]
 
     return None
+
+
+def make_etag(*values):
+    '''
+    Returns a strong ETag header value computed from the provided values
+    '''
+    value = u'|'.join([unicode(v) for v in values])
+    return '"{0}"'.format(hashlib.sha1(value.encode('utf8')).hexdigest())
+
+
+def http_date(value):
+    '''
+    Formats a date as used on HTTP headers like Last-Modified
+
+    `value` is a datetime object or an ISO-8601 string like the ones used by
+    CKAN on `metadata_modified`, which are assumed to be in UTC.
+
+    Returns a string like 'Wed, 10 Aug 2016 09:52:34 GMT'
+    '''
+    if not isinstance(value, datetime.datetime):
+        value = parse_iso_datetime(value)
+    return email.utils.formatdate(calendar.timegm(value.utctimetuple()),
+                                  usegmt=True)
+
+
+def parse_http_date(value):
+    '''
+    Parses an HTTP date header value like the If-Modified-Since one
+
+    Returns a naive datetime object in UTC, or None if the value could not be
+    parsed
+    '''
+    if not value:
+        return None
+    parsed = email.utils.parsedate_tz(value)
+    if not parsed:
+        return None
+    try:
+        timestamp = email.utils.mktime_tz(parsed)
+    except (OverflowError, ValueError):
+        return None
+    return datetime.datetime.utcfromtimestamp(timestamp)
+
+
+def parse_iso_datetime(value):
+    '''
+    Parses the ISO-8601 dates stored by CKAN, eg `metadata_modified`
+
+    Returns a naive datetime object
+    '''
+    if '.' in value:
+        return datetime.datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%f')
+    return datetime.datetime.strptime(value, '%Y-%m-%dT%H:%M:%S')
+
+
+def etag_matches(etag, if_none_match):
+    '''
+    Checks if an ETag matches the value of an If-None-Match header
+
+    The header can contain a list of comma separated ETags, weak ETags
+    (prefixed with `W/`) or the `*` wildcard.
+    '''
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    for value in if_none_match.split(','):
+        value = value.strip()
+        if value.startswith('W/'):
+            value = value[2:]
+        if value == etag:
+            return True
+    return False
+
+
+# Strict ISO-8601 dates, with optional month, day and time parts and
+# without timezone information
+iso_date_re = re.compile(
+    r'^(\d{4})(?:-(\d{2})(?:-(\d{2})(?:[T ](\d{2}):(\d{2})'
+    r'(?::(\d{2})(?:\.(\d{1,6}))?)?)?)?)?$')
+
+# Parsed dates (or the errors raised), keyed by the original string
+_parsed_dates = {}
+
+PARSED_DATES_MAX_ITEMS = 10000
+
+_default_datetime = datetime.datetime(1, 1, 1, 0, 0, 0)
+
+
+def parse_date(value):
+    '''
+    Parses a date string into a datetime object
+
+    Missing parts are filled with the first month, day or time value, eg
+    '1904' -> 1904-01-01T00:00:00.
+
+    Strict ISO-8601 values (like the CKAN timestamps) are parsed directly,
+    other values are parsed with dateutil. Results for string values are
+    cached.
+
+    Raises ValueError if the value could not be parsed.
+    '''
+    if not isinstance(value, basestring):
+        return dateutil_parse(value, default=_default_datetime)
+
+    result = _parsed_dates.get(value)
+    if result is None:
+        try:
+            result = _parse_iso_date(value)
+            if result is None:
+                result = dateutil_parse(value, default=_default_datetime)
+        except ValueError, e:
+            result = e
+
+        if len(_parsed_dates) >= PARSED_DATES_MAX_ITEMS:
+            _parsed_dates.clear()
+        _parsed_dates[value] = result
+
+    if isinstance(result, ValueError):
+        raise result
+    return result
+
+
+def _parse_iso_date(value):
+    '''
+    Parses strict ISO-8601 values
+
+    Returns a datetime object, or None if the value does not match the
+    supported format or is not a valid date.
+    '''
+    match = iso_date_re.match(value)
+    if not match:
+        return None
+
+    year, month, day, hour, minute, second, fraction = match.groups()
+    try:
+        return datetime.datetime(
+            int(year), int(month or 1), int(day or 1),
+            int(hour or 0), int(minute or 0), int(second or 0),
+            int(fraction.ljust(6, '0')) if fraction else 0)
+    except ValueError:
+        # Leave it to dateutil
+        return None
@@ -0,0 +1,190 @@
+import re
+from cStringIO import StringIO
+
+from rdflib import URIRef
+from rdflib.namespace import RDF
+from rdflib.plugins.serializers.nt import _nt_row
+
+# Conservative subset of the Turtle PN_LOCAL production, local names not
+# matching it are written as full URIs
+local_name_re = re.compile(r'^[A-Za-z_][A-Za-z0-9_\-]*$')
+
+
+class WriteOnlyGraph(object):
+    '''
+    Base class for graph-like objects that serialize triples as they are
+    added
+
+    They support the `add` and `bind` methods used by profiles when creating
+    graphs, but triples are not stored anywhere and can not be queried
+    afterwards. This avoids the cost of indexing every triple on an
+    `rdflib.Graph` when the graph is only built to be serialized once.
+
+    Output is written to `stream` (an in-memory buffer by default). If the
+    default buffer is used, the output can be retrieved with `getvalue` or
+    `drain`.
+    '''
+
+    def __init__(self, stream=None):
+        self.stream = stream if stream is not None else StringIO()
+        self._namespaces = {}
+        self._count = 0
+
+    def bind(self, prefix, namespace, override=True):
+        namespace = unicode(namespace)
+        if self._namespaces.get(prefix) == namespace:
+            return
+        if prefix in self._namespaces and not override:
+            return
+        self._namespaces[prefix] = namespace
+
+    def namespaces(self):
+        for prefix, namespace in self._namespaces.iteritems():
+            yield prefix, URIRef(namespace)
+
+    def add(self, triple):
+        if self._write_triple(triple) is not False:
+            self._count += 1
+
+    def write(self, data):
+        '''
+        Appends an already serialized chunk (eg a cached fragment) to the
+        output, which must be in the same format as the one of the writer
+        '''
+        self.close()
+        self.stream.write(data)
+
+    def close(self):
+        '''
+        Finishes any pending statement
+        '''
+        pass
+
+    def getvalue(self):
+        self.close()
+        return self.stream.getvalue()
+
+    def drain(self):
+        '''
+        Returns the output written since the last call and clears the buffer
+        '''
+        value = self.getvalue()
+        self.stream.seek(0)
+        self.stream.truncate()
+        return value
+
+    def __len__(self):
+        return self._count
+
+    def _write_triple(self, triple):
+        '''
+        Writes a triple to the stream
+
+        Returns False if the triple was skipped as a duplicate
+        '''
+        raise NotImplementedError
+
+
+class NTriplesWriter(WriteOnlyGraph):
+    '''
+    Writes triples as N-Triples, one line per triple
+
+    The output for each triple is the same as the one from the rdflib
+    N-Triples serializer.
+    '''
+
+    def _write_triple(self, triple):
+        self.stream.write(_nt_row(triple).encode('utf8', 'replace'))
+
+
+class TurtleWriter(WriteOnlyGraph):
+    '''
+    Writes triples as Turtle, grouping consecutive triples that share the
+    same subject
+
+    Namespace prefixes are declared as soon as they are bound, and used to
+    shorten URIs. Triples for a subject that was already written are started
+    on a new statement, which is valid Turtle. Duplicated triples are only
+    removed within the same statement.
+    '''
+
+    def __init__(self, stream=None):
+        super(TurtleWriter, self).__init__(stream)
+        self._subject = None
+        self._predicate = None
+        self._written = set()
+        self._uris = {}
+
+    def bind(self, prefix, namespace, override=True):
+        namespace = unicode(namespace)
+        if self._namespaces.get(prefix) == namespace or \
+                (prefix in self._namespaces and not override):
+            return
+        super(TurtleWriter, self).bind(prefix, namespace, override)
+        self._uris = {}
+
+        # Directives are allowed between statements
+        self.close()
+        self.stream.write(
+            u'@prefix {0}: <{1}> .\n'.format(prefix, namespace).encode('utf8'))
+
+    def close(self):
+        if self._subject is not None:
+            self.stream.write(' .\n')
+            self._subject = None
+            self._predicate = None
+            self._written = set()
+
+    def _write_triple(self, triple):
+        s, p, o = triple
+
+        if s != self._subject:
+            self.close()
+            self.stream.write(self._term(s))
+            self.stream.write(' ')
+            self._subject = s
+        elif (p, o) in self._written:
+            return False
+        elif p == self._predicate:
+            self.stream.write(' ,\n        ')
+            self.stream.write(self._term(o))
+            self._written.add((p, o))
+            return
+        else:
+            self.stream.write(' ;\n    ')
+
+        self.stream.write('a' if p == RDF.type else self._term(p))
+        self.stream.write(' ')
+        self.stream.write(self._term(o))
+        self._predicate = p
+        self._written.add((p, o))
+
+    def _term(self, term):
+        if isinstance(term, URIRef):
+            return self._uri(term)
+        # Literals and blank nodes
+        return term.n3().encode('utf8')
+
+    def _uri(self, uri):
+        value = self._uris.get(uri)
+        if value is None:
+            value = uri.n3()
+            matched_namespace = u''
+            for prefix, namespace in self._namespaces.iteritems():
+                if (uri.startswith(namespace) and
+                        len(namespace) > len(matched_namespace)):
+                    local_name = uri[len(namespace):]
+                    if local_name_re.match(local_name):
+                        value = u'{0}:{1}'.format(prefix, local_name)
+                        matched_namespace = namespace
+            value = value.encode('utf8')
+            if len(self._uris) < 10000:
+                self._uris[uri] = value
+        return value
+
+
+WRITE_ONLY_GRAPHS = {
+    'nt': NTriplesWriter,
+    'turtle': TurtleWriter,
+    'n3': TurtleWriter,
+}